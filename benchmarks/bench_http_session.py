@@ -0,0 +1,72 @@
+# benchmarks/bench_http_session.py
+# Compare requests.get (une connexion TCP par appel) et la session poolée de FreeboxClient
+# contre une Freebox factice locale (keep-alive HTTP/1.1, latence de connexion simulée).
+#
+#   python benchmarks/bench_http_session.py [nombre_appels] [latence_connexion_ms]
+
+import sys, os, json, time, socket, threading, requests
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_client import FreeboxClient
+
+CONNECT_DELAY = 0.0
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        # Coût d'établissement de connexion (handshake, CPU de la box)
+        time.sleep(CONNECT_DELAY)
+        super().setup()
+        # En-têtes et corps sont écrits séparément : pas d'attente Nagle / ACK retardé
+        self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def _reply(self, payload):
+        body = json.dumps({"success": True, "result": payload}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.endswith("/login/"):
+            return self._reply({"challenge": "bench", "logged_in": False})
+        self._reply({"state": "up", "rate_down": 1000, "rate_up": 100})
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self._reply({"session_token": "bench-token", "expires": 3600})
+
+    def log_message(self, *args):
+        pass
+
+def run(n, connect_ms):
+    global CONNECT_DELAY
+    CONNECT_DELAY = connect_ms / 1000
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_base = f"http://127.0.0.1:{server.server_address[1]}/api/v15"
+
+    start = time.perf_counter()
+    for _ in range(n):
+        requests.get(f"{api_base}/connection/", headers={"X-Fbx-App-Auth": "bench-token"}, timeout=5).json()
+    plain = time.perf_counter() - start
+
+    client = FreeboxClient(api_base, "bench", "token")
+    client.get_json("/connection/")  # ouverture de session hors mesure
+    start = time.perf_counter()
+    for _ in range(n):
+        client.get_json("/connection/")
+    pooled = time.perf_counter() - start
+    client.close()
+    server.shutdown()
+
+    print(f"{n} appels, latence de connexion {connect_ms} ms")
+    print(f"  requests.get      : {plain * 1000 / n:7.2f} ms/appel")
+    print(f"  session poolée    : {pooled * 1000 / n:7.2f} ms/appel  (x{plain / pooled:.1f})")
+
+if __name__ == "__main__":
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 200,
+        float(sys.argv[2]) if len(sys.argv) > 2 else 5)
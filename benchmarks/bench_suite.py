@@ -0,0 +1,282 @@
+# benchmarks/bench_suite.py
+# Benchmarks de bout en bout contre la Freebox simulée (freebox_simulator.py) :
+#   poll     débit des polls (client poolé + traitement complet : stockage, agrégats, règles)
+#   auth     renouvellement de session sous contention (N threads, sessions révoquées par la box)
+#   history  latence de /history selon la taille de l'historique (jeux synthétiques de plusieurs mois)
+#   fanout   diffusion Socket.IO d'un "update" vers N clients websocket
+#
+# Chaque exécution écrit un rapport JSON dans benchmarks/results/ (environnement, paramètres,
+# résultats) ; --compare affiche chaque mesure à côté de celle d'un rapport précédent.
+#
+#   python benchmarks/bench_suite.py [poll auth history fanout] [--quick] [--label nom] [--compare rapport.json]
+
+import sys, os, copy, json, time, shutil, asyncio, logging, argparse, platform, tempfile, threading, subprocess
+from concurrent.futures import ThreadPoolExecutor
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+sys.path.insert(0, ROOT)
+
+from freebox_client import FreeboxClient
+from freebox_simulator import FreeboxSimulator
+from freebox_storage import store_from_config, day_of
+from freebox_rollups import RollupManager, TIERS
+from freebox_dashboard_app import create_app, create_dashboard, generate_jwt, load_config
+
+RESULTS_DIR = os.path.join(ROOT, "benchmarks", "results")
+
+# ---------------- Outils ----------------
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+def latencies(values):
+    """Secondes -> p50 / p95 / max en ms."""
+    return {"p50_ms": round(percentile(values, 50) * 1000, 3), "p95_ms": round(percentile(values, 95) * 1000, 3),
+            "max_ms": round(max(values) * 1000, 3)}
+
+def make_config(root, simulator=None):
+    config = copy.deepcopy(load_config())
+    config["data_dir"] = root
+    config["polling"]["lock_file"] = os.path.join(root, "poller.lock")
+    if simulator is not None:
+        config["freebox_url"] = simulator.url
+    return config
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                                text=True, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {"python": platform.python_version(), "platform": platform.platform(), "cpus": os.cpu_count(),
+            "commit": commit}
+
+# ---------------- poll ----------------
+def bench_poll(quick):
+    params = {"polls": 60 if quick else 300, "latency_ms": 2, "concurrency": [1, 8], "error_rate": 0.05}
+    cases = {}
+    for concurrency, error_rate in [(c, 0) for c in params["concurrency"]] + [(8, params["error_rate"])]:
+        root = tempfile.mkdtemp(prefix="bench-poll-")
+        with FreeboxSimulator(latency=params["latency_ms"] / 1000, error_rate=error_rate, errors=(500, 503),
+                              seed=1) as sim:
+            fb = create_dashboard(make_config(root, sim))
+            names = [job.name for job in fb.jobs]
+            fb.poller.run(names[0])  # ouverture de session hors mesure
+            durations, failures = [], 0
+
+            def poll(i):
+                started = time.perf_counter()
+                ok = fb.poller.run(names[i % len(names)]) is not None
+                return time.perf_counter() - started, ok
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as pool:
+                for seconds, ok in pool.map(poll, range(params["polls"])):
+                    durations.append(seconds)
+                    failures += not ok
+            elapsed = time.perf_counter() - started
+            fb.store.close()
+        shutil.rmtree(root, ignore_errors=True)
+        name = f"c{concurrency}" + (f"_err{int(error_rate * 100)}" if error_rate else "")
+        cases[name] = dict(polls_per_s=round(params["polls"] / elapsed, 1), failures=failures, **latencies(durations))
+    return params, cases
+
+# ---------------- auth ----------------
+def bench_auth(quick):
+    params = {"threads": 8 if quick else 32, "seconds": 1.5 if quick else 5, "login_latency_ms": 200,
+              "revoke_every_s": 0.5}
+    with FreeboxSimulator(app_token="bench", login_latency=params["login_latency_ms"] / 1000, seed=1) as sim:
+        client = FreeboxClient(sim.api_base(), "bench", "bench", pool_size=params["threads"])
+        durations, errors = [], []
+        deadline = time.monotonic() + params["seconds"]
+
+        def worker():
+            while time.monotonic() < deadline:
+                started = time.perf_counter()
+                try:
+                    client.get_json("/connection/")
+                    durations.append(time.perf_counter() - started)
+                except Exception as e:
+                    errors.append(e)
+
+        threads = [threading.Thread(target=worker) for _ in range(params["threads"])]
+        for t in threads:
+            t.start()
+        revocations = 0
+        while time.monotonic() < deadline - params["revoke_every_s"]:
+            time.sleep(params["revoke_every_s"])
+            sim.revoke()
+            revocations += 1
+        for t in threads:
+            t.join()
+        client.close()
+        stats = dict(sim.stats)
+    case = dict(requests_per_s=round(len(durations) / params["seconds"], 1), errors=len(errors),
+                revocations=revocations, logins=stats["logins"], auth_required=stats["auth_required"],
+                logins_per_revocation=round((stats["logins"] - 1) / max(revocations, 1), 2), **latencies(durations))
+    return params, {f"t{params['threads']}": case}
+
+# ---------------- history ----------------
+def synthetic_status(root, config, days, interval):
+    """Historique status de `days` jours au pas `interval` (s), agrégats compris."""
+    store = store_from_config(root, config)
+    end = int(time.time())
+    start = end - days * 86400
+    bytes_down = bytes_up = 0
+    by_day, count = {}, 0
+    for ts in range(start - start % interval, end, interval):
+        rate_down = 1_000_000 + (ts // interval * 7919) % 4_000_000
+        rate_up = 100_000 + (ts // interval * 104729) % 400_000
+        bytes_down += rate_down * interval
+        bytes_up += rate_up * interval
+        by_day.setdefault(day_of(ts), []).append((ts, {"success": True, "result": {
+            "type": "ethernet", "state": "up", "media": "ftth", "ipv4": "82.65.220.152",
+            "bandwidth_down": 5_000_000_000, "bandwidth_up": 900_000_000, "rate_down": rate_down,
+            "rate_up": rate_up, "bytes_down": bytes_down, "bytes_up": bytes_up}}))
+        count += 1
+    for day in sorted(by_day):
+        store.append_many("status", by_day[day])
+    # Reconstruction des paliers 1m / 5m / 1h depuis les données brutes
+    rollups = RollupManager(store)
+    list(rollups.query("status", TIERS[0], start=end))
+    store.close()
+    return count
+
+def timed_get(client, url):
+    """(premier octet, total) en secondes, octets reçus."""
+    started = time.perf_counter()
+    response = client.get(url, buffered=False)
+    chunks = iter(response.response)
+    size = len(next(chunks, b""))
+    first = time.perf_counter() - started
+    for chunk in chunks:
+        size += len(chunk)
+    total = time.perf_counter() - started
+    response.close()
+    return first, total, size
+
+def bench_history(quick):
+    params = {"days": [1, 7] if quick else [7, 30, 90], "interval_s": 30, "repeats": 2 if quick else 5}
+    cases = {}
+    for days in params["days"]:
+        root = tempfile.mkdtemp(prefix="bench-history-")
+        config = make_config(root)
+        started = time.perf_counter()
+        count = synthetic_status(root, config, days, params["interval_s"])
+        build = time.perf_counter() - started
+        size = sum(os.path.getsize(os.path.join(d, f)) for d, _, files in os.walk(root) for f in files)
+        cases[f"{days}d_dataset"] = {"records": count, "build_s": round(build, 2), "disk_bytes": size}
+        app = create_app(config, async_mode="threading")
+        client = app.test_client()
+        client.set_cookie("jwt", generate_jwt("admin", config))
+        queries = {"auto": f"/history/status?period={days}d",
+                   "raw_1h": "/history/status?period=1h",
+                   "raw_all": f"/history/status?period={days}d&step=30s&format=ndjson&fields=rate_down"}
+        for name, url in queries.items():
+            timed_get(client, url)  # reprise des agrégats et caches hors mesure
+            runs = [timed_get(client, url) for _ in range(params["repeats"])]
+            cases[f"{days}d_{name}"] = {"first_byte_ms": round(percentile([r[0] for r in runs], 50) * 1000, 3),
+                                        "total_ms": round(percentile([r[1] for r in runs], 50) * 1000, 3),
+                                        "bytes": runs[0][2]}
+        app.extensions["freebox"].store.close()
+        shutil.rmtree(root, ignore_errors=True)
+    return params, cases
+
+# ---------------- fanout ----------------
+def bench_fanout(quick):
+    import socketio as sio
+    from werkzeug.serving import make_server
+    params = {"clients": [10, 50] if quick else [10, 100, 250], "rounds": 10 if quick else 30}
+    cases = {}
+    for count in params["clients"]:
+        root = tempfile.mkdtemp(prefix="bench-fanout-")
+        app = create_app(make_config(root), async_mode="threading")
+        fb = app.extensions["freebox"]
+        server = make_server("127.0.0.1", 0, app, threaded=True)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        url = f"http://127.0.0.1:{server.server_port}"
+
+        async def run():
+            received = {}
+            clients = []
+            started = time.perf_counter()
+            for _ in range(count):
+                client = sio.AsyncClient()
+                client.on("update", lambda data: received.setdefault(data["status"]["ts"], []).append(time.perf_counter()))
+                await client.connect(url, transports=["websocket"])
+                clients.append(client)
+            connect = time.perf_counter() - started
+            loop = asyncio.get_running_loop()
+            delays, rounds = [], []
+            started = time.perf_counter()
+            for seq in range(1, params["rounds"] + 1):
+                sent = time.perf_counter()
+                await loop.run_in_executor(None, fb.broadcaster.flush, [("status", seq, {"rate_down": seq, "rate_up": 0})])
+                while len(received.get(seq, ())) < count and time.perf_counter() - sent < 10:
+                    await asyncio.sleep(0.0005)
+                times = received.get(seq, [])
+                delays.extend(t - sent for t in times)
+                rounds.append(max(times) - sent if times else 10)
+            elapsed = time.perf_counter() - started
+            for client in clients:
+                await client.disconnect()
+            return dict(connect_s=round(connect, 3), deliveries_per_s=round(len(delays) / elapsed, 1),
+                        lost=count * params["rounds"] - len(delays),
+                        round_p50_ms=round(percentile(rounds, 50) * 1000, 3), **latencies(delays))
+
+        cases[f"n{count}"] = asyncio.run(run())
+        server.shutdown()
+        shutil.rmtree(root, ignore_errors=True)
+    return params, cases
+
+SCENARIOS = {"poll": bench_poll, "auth": bench_auth, "history": bench_history, "fanout": bench_fanout}
+
+# ---------------- Rapports ----------------
+def print_report(report, previous=None):
+    print(f"\n{'scénario':<9} {'cas':<16} {'mesure':<22} {'valeur':>12}" + (f" {'précédent':>12} {'écart':>8}" if previous else ""))
+    for scenario, result in report["results"].items():
+        before = (previous or {}).get("results", {}).get(scenario, {})
+        if previous and before and before.get("params") != result["params"]:
+            print(f"{scenario:<9} (paramètres différents du rapport précédent)")
+        for case, metrics in result["cases"].items():
+            for metric, value in metrics.items():
+                line = f"{scenario:<9} {case:<16} {metric:<22} {value:>12}"
+                old = before.get("cases", {}).get(case, {}).get(metric) if previous else None
+                if previous:
+                    delta = f"{(value - old) / old * 100:+.1f}%" if isinstance(old, (int, float)) and old else ""
+                    line += f" {'' if old is None else old:>12} {delta:>8}"
+                print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks Freebox Dashboard")
+    parser.add_argument("scenarios", nargs="*", help=f"parmi {', '.join(SCENARIOS)} (défaut : tous)")
+    parser.add_argument("--quick", action="store_true", help="tailles réduites (vérification rapide)")
+    parser.add_argument("--label", default="run", help="nom du rapport")
+    parser.add_argument("--compare", help="rapport JSON précédent")
+    args = parser.parse_args()
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"scénario inconnu : {', '.join(sorted(unknown))}")
+    logging.basicConfig(level=logging.WARNING)
+
+    report = {"label": args.label, "created": time.strftime("%Y-%m-%dT%H:%M:%S"), "quick": args.quick,
+              "environment": environment(), "results": {}}
+    for name in args.scenarios or list(SCENARIOS):
+        print(f"{name}...", flush=True)
+        params, cases = SCENARIOS[name](args.quick)
+        report["results"][name] = {"params": params, "cases": cases}
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{args.label}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    previous = None
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            previous = json.load(f)
+    print_report(report, previous)
+    print(f"\nRapport : {path}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+# benchmarks/bench_writer.py
+# Débit d'écriture avec de nombreux producteurs en parallèle : écriture directe dans le
+# TimeSeriesStore (un write + flush par enregistrement, sous le verrou de la série) contre
+# l'écriture groupée de BufferedStore (un lot par commit), avec et sans fsync.
+#
+#   python benchmarks/bench_writer.py [producteurs] [enregistrements_par_producteur]
+
+import sys, os, time, shutil, tempfile, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_storage import TimeSeriesStore
+from freebox_writer import BufferedStore
+
+def sample(i):
+    return {"success": True, "result": {"state": "up", "rate_down": i * 1000, "rate_up": i * 100,
+                                        "bytes_down": i * 10 ** 6, "bytes_up": i * 10 ** 5}}
+
+def producers(store, count, per_producer, sync):
+    ts = int(time.time())
+    def produce(p):
+        for n in range(per_producer):
+            if sync:
+                store.append_many("status", [(ts, sample(n))], sync=True)
+            else:
+                store.append("status", sample(n), ts=ts)
+    threads = [threading.Thread(target=produce, args=(p,)) for p in range(count)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+def run(label, make_store, count, per_producer, sync=False):
+    root = tempfile.mkdtemp(prefix="bench-writer-")
+    try:
+        store = make_store(root)
+        start = time.perf_counter()
+        producers(store, count, per_producer, sync)
+        produced = time.perf_counter() - start
+        store.close()
+        total = time.perf_counter() - start
+        assert TimeSeriesStore(root).count("status") == count * per_producer
+        records = count * per_producer
+        print(f"{label:<34} {records / total:>10.0f} enr/s   producteurs bloqués {produced * 1000:>8.1f} ms"
+              f"   total {total * 1000:>8.1f} ms")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    per_producer = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    print(f"{count} producteurs x {per_producer} enregistrements (série status, format JSON)")
+    run("direct", lambda root: TimeSeriesStore(root), count, per_producer)
+    run("groupé (flush 50 ms)", lambda root: BufferedStore(TimeSeriesStore(root), flush_interval=0.05,
+                                                           fsync="never"), count, per_producer)
+    run("direct + fsync par enregistrement", lambda root: TimeSeriesStore(root), count, per_producer, sync=True)
+    run("groupé + fsync par lot", lambda root: BufferedStore(TimeSeriesStore(root), flush_interval=0.05,
+                                                             fsync="batch"), count, per_producer)
@@ -0,0 +1,201 @@
+# freebox_alerts.py - envoi des alertes en arrière-plan (mail, Discord)
+#
+# Les pollers ne font que déposer le message : chaque canal a sa file et son thread.
+# Les alertes levées pendant batch_seconds sont regroupées en un seul message, la connexion
+# SMTP (STARTTLS + login) est gardée ouverte entre deux envois et fermée après
+# smtp_idle_seconds d'inactivité, et un envoi en échec est retenté avec un backoff
+# exponentiel. L'anti-spam (cooldown par clé d'alerte) est géré ici, sous verrou.
+
+import time, queue, logging, smtplib, threading, requests
+from email.mime.text import MIMEText
+
+logger = logging.getLogger("freebox.alerts")
+
+
+class _Channel:
+    name = None
+
+    def __init__(self, dispatcher):
+        self.dispatcher = dispatcher
+        self.queue = queue.Queue()
+        self._thread = None
+
+    @property
+    def conf(self):
+        return self.dispatcher.conf.get(self.name, {})
+
+    def enabled(self):
+        return self.conf.get("enabled", False)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name=f"freebox-alerts-{self.name}", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout):
+        self.queue.put(None)
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        d = self.dispatcher
+        stopping = False
+        while not stopping:
+            try:
+                message = self.queue.get(timeout=d.idle_seconds)
+            except queue.Empty:
+                self.close()
+                continue
+            if message is None:
+                break
+            # Regroupement des alertes arrivées pendant la fenêtre (None : arrêt demandé)
+            batch = [message]
+            deadline = time.monotonic() + d.batch_seconds
+            while True:
+                try:
+                    message = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                if message is None:
+                    stopping = True
+                    break
+                batch.append(message)
+            self._send(batch)
+        self.close()
+
+    def _send(self, batch):
+        d = self.dispatcher
+        subject, text = digest(batch)
+        for attempt in range(d.retries + 1):
+            try:
+                self.deliver(subject, text)
+                logger.info(f"Alert sent via {self.name}: {text}")
+                d._result(self.name, True, len(batch))
+                return
+            except Exception as e:
+                self.close()
+                logger.error(f"Erreur alerte {self.name} (essai {attempt + 1}/{d.retries + 1}): {e}")
+                if attempt < d.retries:
+                    d._stopping.wait(d.backoff_seconds * 2 ** attempt)
+        d._result(self.name, False, len(batch))
+
+    def deliver(self, subject, text):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+class MailChannel(_Channel):
+    name = "mail"
+
+    def __init__(self, dispatcher, smtp_factory=smtplib.SMTP):
+        super().__init__(dispatcher)
+        self.smtp_factory = smtp_factory
+        self._server = None
+
+    def _connect(self):
+        conf = self.conf
+        server = self.smtp_factory(conf["server"], conf["port"], timeout=30)
+        if conf.get("tls", False):
+            server.starttls()
+        if conf.get("username"):
+            server.login(conf["username"], conf["password"])
+        return server
+
+    def deliver(self, subject, text):
+        conf = self.conf
+        msg = MIMEText(text)
+        msg["Subject"] = subject
+        msg["From"] = conf["from"]
+        msg["To"] = ",".join(conf["to"])
+        if self._server is None:
+            self._server = self._connect()
+        self._server.send_message(msg)
+
+    def close(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
+
+
+class DiscordChannel(_Channel):
+    name = "discord"
+
+    def __init__(self, dispatcher):
+        super().__init__(dispatcher)
+        self._session = requests.Session()
+
+    def deliver(self, subject, text):
+        r = self._session.post(self.conf["webhook"], json={"content": f"🚨 {subject}\n{text}"}, timeout=5)
+        r.raise_for_status()
+
+
+def digest(messages):
+    """(sujet, texte) d'un lot d'alertes."""
+    if len(messages) == 1:
+        return "Freebox Alert", messages[0]
+    return f"Freebox Alert ({len(messages)})", "\n".join(f"- {m}" for m in messages)
+
+
+class AlertDispatcher:
+    def __init__(self, conf, batch_seconds=10, retries=3, backoff_seconds=5, idle_seconds=60,
+                 on_result=None, smtp_factory=smtplib.SMTP):
+        # conf : section "alerts" de config.json, relue à chaque alerte (modifiable depuis /settings)
+        self.conf = conf
+        self.batch_seconds = batch_seconds
+        self.retries = retries
+        self.backoff_seconds = backoff_seconds
+        self.idle_seconds = idle_seconds
+        # on_result(canal, succès, nombre d'alertes) : métriques
+        self.on_result = on_result
+        self.channels = [MailChannel(self, smtp_factory), DiscordChannel(self)]
+        self._last = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+
+    @classmethod
+    def from_config(cls, conf, on_result=None):
+        dispatch = conf.get("dispatch", {})
+        return cls(conf, batch_seconds=dispatch.get("batch_seconds", 10), retries=dispatch.get("retries", 3),
+                   backoff_seconds=dispatch.get("backoff_seconds", 5),
+                   idle_seconds=dispatch.get("smtp_idle_seconds", 60), on_result=on_result)
+
+    # ---- Cycle de vie ----
+    def start(self):
+        for channel in self.channels:
+            channel.start()
+
+    def stop(self, timeout=10):
+        """Envoie ce qui est en file (sans attendre la fin des fenêtres) puis arrête les threads."""
+        self._stopping.set()
+        for channel in self.channels:
+            channel.stop(timeout)
+
+    # ---- Anti-spam ----
+    def can_send(self, key):
+        cooldown = self.conf.get("cooldown_seconds", 300)
+        now = time.time()
+        with self._lock:
+            if now - self._last.get(key, 0) >= cooldown:
+                self._last[key] = now
+                return True
+            return False
+
+    # ---- Producteurs ----
+    def send(self, message, key=None):
+        """Dépose l'alerte dans la file de chaque canal actif ; ne bloque jamais."""
+        if not self.conf.get("enabled", False):
+            return False
+        if key is not None and not self.can_send(key):
+            return False
+        for channel in self.channels:
+            if channel.enabled():
+                channel.queue.put(message)
+        return True
+
+    def _result(self, channel, ok, count):
+        if self.on_result is not None:
+            self.on_result(channel, ok, count)
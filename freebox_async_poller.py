@@ -0,0 +1,129 @@
+# freebox_async_poller.py - moteur de polling asyncio (optionnel)
+# Nécessite l'installation de 'aiohttp': pip install aiohttp
+#
+# Activé par "async_polling": {"enabled": true} dans config.json. Tous les jobs du
+# registre (freebox_poller.py) sont interrogés depuis une seule boucle asyncio (un seul
+# thread) : à chaque tick, les endpoints arrivés à échéance partent en parallèle, avec un nombre de requêtes
+# simultanées borné, sur une session HTTP keep-alive unique authentifiée par le même
+# FreeboxAuth que le reste de l'application. Les réponses sont remises au handler
+# (save_data / émission Socket.IO) sur un unique thread d'exécution.
+
+import time, asyncio, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("freebox.async")
+
+DEFAULT_ENDPOINTS = [
+    {"name": "status", "path": "/connection/", "interval": 30},
+    {"name": "wifi", "path": "/wifi/config/", "interval": 300},
+    {"name": "dhcp", "path": "/dhcp/config/", "interval": 300},
+]
+
+
+class AsyncFreeboxPoller:
+    """Interroge un ensemble d'endpoints Freebox en parallèle depuis une boucle asyncio."""
+
+    def __init__(self, api_base, auth, endpoints, handler, max_concurrency=8, timeout=5, observer=None):
+        self.api_base = api_base
+        self.auth = auth
+        self.endpoints = [dict(e) for e in endpoints]
+        self.handler = handler
+        # observer(nom, durée en s, succès) : latence de chaque requête (métriques)
+        self.observer = observer
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="freebox-async-handler")
+        self._loop = None
+        self._thread = None
+        self._stopping = None
+
+    @classmethod
+    def from_config(cls, api_base, auth, config, handler, observer=None):
+        conf = config.get("async_polling", {})
+        endpoints = config.get("polling", {}).get("jobs") or conf.get("endpoints", DEFAULT_ENDPOINTS)
+        return cls(api_base, auth, endpoints, handler,
+                   max_concurrency=conf.get("max_concurrency", 8),
+                   timeout=config.get("http", {}).get("timeout", 5), observer=observer)
+
+    # ---- Cycle de vie ----
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="freebox-async-poller", daemon=True)
+        self._thread.start()
+        logger.info(f"Polling asyncio démarré ({len(self.endpoints)} endpoints)")
+
+    def stop(self, timeout=10):
+        if self._loop and self._stopping:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self.run())
+        finally:
+            self._loop.close()
+
+    # ---- Boucle ----
+    async def run(self):
+        import aiohttp
+
+        self._stopping = asyncio.Event()
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        connector = aiohttp.TCPConnector(limit=self.max_concurrency, keepalive_timeout=60)
+        timeout = aiohttp.ClientTimeout(total=self.timeout)
+        now = time.monotonic()
+        for endpoint in self.endpoints:
+            endpoint["next"] = now
+        async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+            while not self._stopping.is_set():
+                now = time.monotonic()
+                due = [e for e in self.endpoints if e["next"] <= now]
+                if due:
+                    headers = await self._headers()
+                    if headers is not None:
+                        await asyncio.gather(*(self._poll(session, semaphore, e, headers) for e in due))
+                    for endpoint in due:
+                        endpoint["next"] = now + endpoint["interval"]
+                delay = max(0, min(e["next"] for e in self.endpoints) - time.monotonic())
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+        logger.info("Polling asyncio arrêté")
+
+    async def _headers(self):
+        # Le renouvellement de session (bloquant) se fait hors de la boucle
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._executor, self.auth.headers)
+        except Exception as e:
+            logger.error(f"async poll auth error: {e}")
+            return None
+
+    async def _poll(self, session, semaphore, endpoint, headers):
+        name = endpoint["name"]
+        started = None
+        try:
+            async with semaphore:
+                started = time.monotonic()
+                async with session.get(f"{self.api_base}{endpoint['path']}", headers=headers) as r:
+                    if r.status == 403:
+                        body = await r.json(content_type=None)
+                        if body.get("error_code") == "auth_required":
+                            # Reconnexion au prochain tick
+                            self.auth.invalidate(headers["X-Fbx-App-Auth"])
+                    r.raise_for_status()
+                    data = await r.json(content_type=None)
+            self._observe(name, started, True)
+            started = None   # une erreur du handler n'est pas un échec de poll
+            await asyncio.get_running_loop().run_in_executor(self._executor, self.handler, name, data)
+        except Exception as e:
+            if started is not None:
+                self._observe(name, started, False)
+            logger.error(f"async poll {name} error: {e}")
+
+    def _observe(self, name, started, ok):
+        if self.observer is not None:
+            self.observer(name, time.monotonic() - started, ok)
@@ -0,0 +1,177 @@
+# freebox_broadcast.py - diffusion Socket.IO groupée et limitée en débit
+#
+# Les pollers déposent chaque échantillon dans une file bornée sans attendre. Un thread
+# dédié regroupe ce qui est arrivé depuis le dernier envoi (seul le dernier échantillon de
+# chaque série est gardé), ne garde que les champs affichés par les graphiques et n'envoie
+# que ceux qui ont changé, au plus max_rate fois par seconde, en un seul événement "update"
+# encodé une fois pour tous les clients. Si la file est pleine, les plus anciens
+# échantillons sont abandonnés.
+#
+# RecentWindow garde en plus, pour chaque série, la dernière heure déjà sous-échantillonnée :
+# un nouveau dashboard reçoit ses graphiques initiaux en un seul petit message.
+
+import time, queue, logging, threading
+from collections import deque
+from freebox_rollups import extract
+
+logger = logging.getLogger("freebox.broadcast")
+
+# Champs utilisés par les graphiques de dashboard.html
+CHART_FIELDS = {
+    "status": ("rate_down", "rate_up"),
+    "wifi": ("stations",),
+    "dhcp_leases": ("leases",),
+}
+
+
+def chart_point(series, data):
+    """Valeurs affichées pour un échantillon brut, None si la série n'a pas de graphique."""
+    fields = CHART_FIELDS.get(series)
+    if fields is None:
+        return None
+    values = extract(series, data)
+    return {k: values[k] for k in fields if k in values}
+
+
+class Broadcaster:
+    def __init__(self, emit, max_rate=2, queue_size=256, event="update"):
+        self.emit = emit
+        self.interval = 1.0 / max_rate if max_rate else 0
+        self.event = event
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._state = {}            # série -> dernières valeurs envoyées
+        self._state_ts = {}
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._thread = None
+        self._last_flush = 0
+        self.stats = {"published": 0, "dropped": 0, "coalesced": 0, "sent": 0}
+
+    @classmethod
+    def from_config(cls, emit, conf):
+        return cls(emit, max_rate=conf.get("max_rate", 2), queue_size=conf.get("queue_size", 256))
+
+    # ---- Cycle de vie ----
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="freebox-broadcast", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5):
+        self._stopping.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    # ---- Producteurs ----
+    def publish(self, series, ts, data):
+        """Appelé par les pollers : ne bloque jamais."""
+        values = chart_point(series, data)
+        if values is None:
+            return
+        item = (series, ts, values)
+        self.stats["published"] += 1
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return
+            except queue.Full:
+                try:
+                    self._queue.get_nowait()
+                    self.stats["dropped"] += 1
+                except queue.Empty:
+                    pass
+
+    def state(self):
+        """Dernières valeurs complètes de chaque série (base des deltas pour un nouveau client)."""
+        with self._lock:
+            return {s: dict(values, ts=self._state_ts[s]) for s, values in self._state.items()}
+
+    # ---- Envoi ----
+    def _run(self):
+        while not self._stopping.is_set():
+            try:
+                item = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            wait = self._last_flush + self.interval - time.monotonic()
+            if wait > 0:
+                self._stopping.wait(wait)
+            pending = {item[0]: item}
+            while True:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item[0] in pending:
+                    self.stats["coalesced"] += 1
+                pending[item[0]] = item
+            self._last_flush = time.monotonic()
+            try:
+                self.flush(pending.values())
+            except Exception as e:
+                logger.error(f"Diffusion Socket.IO échouée : {e}")
+
+    def flush(self, items):
+        batch = {}
+        with self._lock:
+            for series, ts, values in items:
+                previous = self._state.get(series, {})
+                delta = {k: v for k, v in values.items() if previous.get(k) != v}
+                delta["ts"] = ts
+                batch[series] = delta
+                self._state[series] = values
+                self._state_ts[series] = ts
+        if batch:
+            self.emit(self.event, batch)
+            self.stats["sent"] += 1
+        return batch
+
+
+class RecentWindow:
+    """Fenêtre glissante de points moyennés par pas de window/points secondes, par série."""
+
+    def __init__(self, window=3600, points=60):
+        self.window = window
+        self.step = max(1, window // points)
+        self._series = {}           # série -> deque de [début du pas, nb, sommes]
+        self._lock = threading.Lock()
+        self._cache = None
+
+    @classmethod
+    def from_config(cls, conf):
+        return cls(window=conf.get("window", 3600), points=conf.get("points", 60))
+
+    def add(self, series, ts, data):
+        values = chart_point(series, data)
+        if values is None:
+            return
+        start = int(ts) - int(ts) % self.step
+        with self._lock:
+            buckets = self._series.setdefault(series, deque())
+            if buckets and start < buckets[-1][0]:
+                return
+            if buckets and start == buckets[-1][0]:
+                bucket = buckets[-1]
+                bucket[1] += 1
+                for key, value in values.items():
+                    bucket[2][key] = bucket[2].get(key, 0) + value
+            else:
+                buckets.append([start, 1, dict(values)])
+                while buckets[0][0] <= start - self.window:
+                    buckets.popleft()
+            self._cache = None
+
+    def seed(self, series, records):
+        """Amorçage au démarrage depuis le stockage ({"ts", "data"} dans l'ordre)."""
+        for record in records:
+            self.add(series, record["ts"], record["data"])
+
+    def snapshot(self):
+        """{série: [{"ts", champs...}]}, recalculé seulement après un nouvel échantillon."""
+        with self._lock:
+            if self._cache is None:
+                self._cache = {
+                    series: [dict({k: v / count if count > 1 else v for k, v in sums.items()}, ts=start)
+                             for start, count, sums in buckets]
+                    for series, buckets in self._series.items()
+                }
+            return self._cache
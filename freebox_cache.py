@@ -0,0 +1,94 @@
+# freebox_cache.py - cache TTL des réponses Freebox pour les pages /category
+#
+# - TTL par clé (ex: dhcp 300 s, downloads 5 s) et taille bornée avec éviction LRU
+# - stale-while-revalidate : une entrée expirée depuis moins de stale_ttl est servie
+#   immédiatement pendant qu'un seul rafraîchissement tourne en arrière-plan
+# - coalescence : des requêtes simultanées sur une clé absente ne déclenchent qu'un
+#   seul appel à la Freebox, les autres attendent son résultat
+
+import time, logging, threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+
+logger = logging.getLogger("freebox.cache")
+
+
+class TTLCache:
+    def __init__(self, max_entries=64, ttl=30, stale_ttl=300, ttls=None, refresh_workers=2):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.ttls = ttls or {}
+        self._entries = OrderedDict()   # clé -> (valeur, date de récupération)
+        self._inflight = {}             # clé -> Future du chargement en cours
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=refresh_workers, thread_name_prefix="freebox-cache")
+        self.stats = {"hit": 0, "miss": 0, "stale": 0, "coalesced": 0, "evictions": 0, "errors": 0}
+
+    @classmethod
+    def from_config(cls, conf):
+        return cls(max_entries=conf.get("max_entries", 64), ttl=conf.get("ttl", 30),
+                   stale_ttl=conf.get("stale_ttl", 300), ttls=conf.get("ttls"))
+
+    def ttl_for(self, key):
+        return self.ttls.get(key, self.ttl)
+
+    def get(self, key, loader):
+        """Valeur en cache pour key, sinon chargée par loader() (une seule fois pour tous)."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                value, fetched = entry
+                age = now - fetched
+                if age < self.ttl_for(key):
+                    self._entries.move_to_end(key)
+                    self.stats["hit"] += 1
+                    return value
+                if age < self.ttl_for(key) + self.stale_ttl:
+                    self._entries.move_to_end(key)
+                    self.stats["stale"] += 1
+                    if key not in self._inflight:
+                        self._inflight[key] = future = Future()
+                        self._executor.submit(self._load, key, loader, future)
+                    return value
+            future = self._inflight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                leader = False
+            else:
+                self._inflight[key] = future = Future()
+                self.stats["miss"] += 1
+                leader = True
+        if leader:
+            self._load(key, loader, future)
+        return future.result()
+
+    def _load(self, key, loader, future):
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self._inflight.pop(key, None)
+                self.stats["errors"] += 1
+            logger.warning(f"Chargement cache {key} échoué : {e}")
+            future.set_exception(e)
+            return
+        with self._lock:
+            self._entries[key] = (value, time.time())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats["evictions"] += 1
+            self._inflight.pop(key, None)
+        future.set_result(value)
+
+    def invalidate(self, key=None):
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
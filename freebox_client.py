@@ -0,0 +1,231 @@
+# freebox_client.py - client HTTP partagé pour l'API Freebox OS
+#
+# Une seule requests.Session (pool de connexions keep-alive) est utilisée pour tous les
+# appels : polls, pages /category et ouverture de session. Les GET (idempotents) sont
+# rejoués avec backoff en cas d'erreur réseau ou 5xx, et chaque endpoint peut avoir son
+# propre timeout (section "http" de config.json). Une réponse 403 auth_required
+# déclenche une reconnexion puis un rejeu unique de la requête.
+
+import time, hmac, hashlib, logging, threading, requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger("freebox")
+
+
+# ---------------- Freebox Auth ----------------
+class FreeboxAuthError(RuntimeError):
+    """Session Freebox indisponible (échec d'ouverture ou backoff en cours)."""
+
+
+class FreeboxAuth:
+    """Session Freebox partagée entre threads.
+
+    Un seul renouvellement à la fois (single-flight) : pendant qu'un thread se reconnecte,
+    les autres réutilisent l'ancien token s'il est encore valide, sinon attendent (polls)
+    ou échouent immédiatement (requêtes web, wait=False). Après un échec, aucun thread ne
+    dort : les appels échouent tout de suite jusqu'à la prochaine tentative autorisée.
+    """
+
+    def __init__(self, client, app_id, app_token, refresh_margin=120):
+        self.client = client
+        self.app_id = app_id
+        self.app_token = app_token
+        self.session_token = None
+        self.expire = 0
+        self.retry_delay = 5
+        self.max_retry_delay = 300
+        self.next_attempt = 0
+        self.refresh_margin = refresh_margin
+        self.renewals = 0
+        self._renewing = False
+        self._cond = threading.Condition()
+        self._refresher = None
+        self._stop = threading.Event()
+
+    def _open(self):
+        r = self.client.request("GET", "/login/", auth=False)
+        r.raise_for_status()
+        data = r.json()
+        if "result" not in data or "challenge" not in data["result"]:
+            raise RuntimeError("Challenge Freebox manquant")
+        challenge = data["result"]["challenge"]
+        pwd = hmac.new(
+            self.app_token.encode(),
+            challenge.encode(),
+            hashlib.sha1
+        ).hexdigest()
+        r = self.client.request(
+            "POST", "/login/session/", auth=False,
+            json={"app_id": self.app_id, "password": pwd}
+        )
+        r.raise_for_status()
+        result = r.json()["result"]
+        if "session_token" not in result:
+            raise RuntimeError("session_token manquant")
+        return result["session_token"], time.time() + result.get("expires", 3600)
+
+    def _renew(self):
+        """Ouvre une session ; appelé par le seul thread qui détient le renouvellement."""
+        try:
+            token, expire = self._open()
+        except Exception as e:
+            logger.error(f"Freebox auth failed: {e}")
+            with self._cond:
+                self.next_attempt = time.time() + self.retry_delay
+                self.retry_delay = min(self.retry_delay * 2, self.max_retry_delay)
+                self._renewing = False
+                self._cond.notify_all()
+            raise FreeboxAuthError(f"Ouverture de session Freebox impossible : {e}") from e
+        with self._cond:
+            self.session_token, self.expire = token, expire
+            self.retry_delay = 5
+            self.next_attempt = 0
+            self.renewals += 1
+            self._renewing = False
+            self._cond.notify_all()
+        logger.info("🔐 Session Freebox établie")
+
+    def _valid(self, margin=30):
+        return self.session_token is not None and time.time() < self.expire - margin
+
+    def headers(self, wait=True):
+        return {"X-Fbx-App-Auth": self.token(wait)}
+
+    def token(self, wait=True):
+        if self._valid():
+            return self.session_token
+        with self._cond:
+            while not self._valid():
+                if self._renewing or time.time() < self.next_attempt:
+                    # L'ancien token est encore accepté par la box : on le réutilise
+                    if self._valid(margin=0):
+                        return self.session_token
+                    if not self._renewing:
+                        raise FreeboxAuthError(
+                            f"Session Freebox indisponible, nouvelle tentative dans {self.next_attempt - time.time():.0f}s")
+                    if not wait:
+                        raise FreeboxAuthError("Ouverture de session Freebox en cours")
+                    self._cond.wait()
+                    continue
+                self._renewing = True
+                break
+            else:
+                return self.session_token
+        self._renew()
+        return self.session_token
+
+    def invalidate(self, token):
+        """Oublie un token refusé par la box (403 auth_required), sauf s'il a déjà été remplacé."""
+        with self._cond:
+            if self.session_token == token:
+                self.session_token = None
+                self.expire = 0
+
+    def refresh(self):
+        """Renouvelle la session par anticipation, sauf si un renouvellement est déjà en cours."""
+        with self._cond:
+            if self._renewing or time.time() < self.next_attempt:
+                return
+            self._renewing = True
+        try:
+            self._renew()
+        except FreeboxAuthError:
+            pass
+
+    # ---- Rafraîchissement en arrière-plan ----
+    def start_refresh(self):
+        if self._refresher is None:
+            self._refresher = threading.Thread(target=self._refresh_loop, name="freebox-auth-refresh", daemon=True)
+            self._refresher.start()
+
+    def stop_refresh(self):
+        self._stop.set()
+
+    def _refresh_loop(self):
+        while not self._stop.is_set():
+            now = time.time()
+            delay = max(self.expire - self.refresh_margin - now, self.next_attempt - now)
+            if delay > 0:
+                self._stop.wait(min(delay, 60))
+                continue
+            self.refresh()
+            self._stop.wait(1)
+
+
+def is_auth_required(r):
+    if r.status_code != 403:
+        return False
+    try:
+        return r.json().get("error_code") == "auth_required"
+    except ValueError:
+        return False
+
+
+# ---------------- Client ----------------
+class FreeboxClient:
+    """Client Freebox : session HTTP poolée + authentification."""
+
+    def __init__(self, api_base, app_id, app_token, pool_size=10, retries=3, backoff_factor=0.5,
+                 timeout=5, timeouts=None):
+        self.api_base = api_base
+        self.timeout = timeout
+        # Timeouts spécifiques par préfixe d'endpoint, ex: {"/storage/": 10}
+        self.timeouts = sorted((timeouts or {}).items(), key=lambda item: -len(item[0]))
+        self.session = requests.Session()
+        retry = Retry(total=retries, connect=retries, read=retries, backoff_factor=backoff_factor,
+                      status_forcelist=(500, 502, 503, 504), allowed_methods=frozenset(["GET"]),
+                      raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.auth = FreeboxAuth(self, app_id, app_token)
+
+    @classmethod
+    def from_config(cls, config, app_token):
+        http = config.get("http", {})
+        return cls(
+            f"{config['freebox_url']}/api/{config['api_version']}",
+            config["app_id"],
+            app_token,
+            pool_size=http.get("pool_size", 10),
+            retries=http.get("retries", 3),
+            backoff_factor=http.get("backoff_factor", 0.5),
+            timeout=http.get("timeout", 5),
+            timeouts=http.get("timeouts"),
+        )
+
+    def timeout_for(self, path):
+        for prefix, timeout in self.timeouts:
+            if path.startswith(prefix):
+                return timeout
+        return self.timeout
+
+    def request(self, method, path, auth=True, wait=True, **kwargs):
+        """wait=False : échoue immédiatement (FreeboxAuthError) si la session est en cours
+        d'ouverture, au lieu de bloquer le thread (requêtes web)."""
+        kwargs.setdefault("timeout", self.timeout_for(path))
+        extra = kwargs.pop("headers", {})
+        for attempt in range(2):
+            headers = dict(extra)
+            if auth:
+                token = self.auth.token(wait)
+                headers["X-Fbx-App-Auth"] = token
+            r = self.session.request(method, f"{self.api_base}{path}", headers=headers, **kwargs)
+            if auth and attempt == 0 and is_auth_required(r):
+                # Session expirée côté box : nouvelle ouverture puis un seul rejeu
+                logger.info("Session Freebox refusée (auth_required), reconnexion")
+                self.auth.invalidate(token)
+                continue
+            return r
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def get_json(self, path, **kwargs):
+        r = self.get(path, **kwargs)
+        r.raise_for_status()
+        return r.json()
+
+    def close(self):
+        self.session.close()
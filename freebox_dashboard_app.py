@@ -7,139 +7,592 @@
 
 
 # freebox_dashboard_app.py - version finale complète
-import os, json, logging, requests, jwt, hmac, hashlib, time, smtplib
-from functools import wraps
-from flask import Flask, request, redirect, url_for, make_response, render_template
-from apscheduler.schedulers.background import BackgroundScheduler
+#
+# Fabrique d'application : l'import ne lit aucun fichier et ne démarre rien. create_app(config)
+# construit l'application Flask et l'état partagé (Dashboard) ; le client Freebox
+# (app_token.json), le scheduler et le poller ne sont créés qu'au premier usage, et les tâches
+# de fond (polling, diffusion, alertes, compaction) ne tournent qu'après Dashboard.start(),
+# qui crée aussi les dossiers et amorce la fenêtre récente depuis le stockage.
+# Plusieurs workers web peuvent ainsi être lancés sans que chacun ne polle la Freebox.
+#
+# En production (freebox_prod.py), un worker web est créé avec owner_url : la session
+# Freebox et l'état en direct (snapshots, fenêtre récente, dernières valeurs) restent dans le
+# processus propriétaire, interrogé à la connexion Socket.IO d'un dashboard.
+# Avec un poller dédié (poll_freebox_scheduler.py, ou une application web en attente du
+# verrou), le processus qui polle sert ces mêmes routes sur polling.owner_port : l'application
+# web qui ne détient pas le verrou les lui relaie, et reçoit ses mises à jour par la file de
+# messages Socket.IO (polling.message_queue).
+
+import os, re, glob, json, logging, requests, jwt, time
+from functools import wraps, cached_property
+from urllib.parse import urlencode
+from logging.handlers import RotatingFileHandler
+from flask import (Flask, Blueprint, Response, current_app, request, redirect, url_for, make_response,
+                   render_template, stream_with_context)
 from flask_socketio import SocketIO, emit
-from email.mime.text import MIMEText
+from freebox_storage import store_from_config, apply_retention, migrate_legacy
+from freebox_writer import BufferedStore
+from freebox_client import FreeboxClient, FreeboxAuthError
+from freebox_poller import Poller, jobs_from_config
+from freebox_events import EventSubscriber
+from freebox_cache import TTLCache
+from freebox_snapshots import SnapshotRegistry
+from freebox_metrics import MetricsRegistry
+from freebox_broadcast import Broadcaster, RecentWindow, CHART_FIELDS
+from freebox_alerts import AlertDispatcher
+from freebox_rules import RuleEngine, rules_from_config
+from freebox_usage import UsageTracker
+from freebox_inventory import HostInventory
+from freebox_sync import CallLog, DownloadTasks
+from freebox_rollups import RollupManager, parse_duration, select_tier, merge_buckets
+from freebox_prod import OWNER_ROUTES
 
 # ---------------- Paths & Config ----------------
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CONFIG_FILE = os.path.join(BASE_DIR, "config.json")
 APP_TOKEN_FILE = os.path.join(BASE_DIR, "app_token.json")
-DATA_DIR = os.path.join(BASE_DIR, "data")
-ALERT_DIR = os.path.join(BASE_DIR, "alerts")
+LOG_FILE = os.path.join(BASE_DIR, "freebox.log")
+
+# Routes de l'état en direct, relayées au processus qui polle ; une requête relayée porte
+# PROXY_HEADER et n'est jamais relayée une seconde fois
+OWNER_ROUTES_RE = re.compile(OWNER_ROUTES)
+PROXY_HEADER = "X-Freebox-Relayed"
 
-os.makedirs(DATA_DIR, exist_ok=True)
-os.makedirs(ALERT_DIR, exist_ok=True)
+# Séries dérivées d'une série pollée (règles à surveiller pour le polling adaptatif)
+DERIVED_SERIES = {"status": ("throughput",)}
 
-with open(CONFIG_FILE, "r", encoding="utf-8") as f:
-    CONFIG = json.load(f)
+logger = logging.getLogger("freebox")
 
-FREEBOX_URL = CONFIG["freebox_url"]
-API_BASE = f"{FREEBOX_URL}/api/{CONFIG['api_version']}"
+def load_config(path=CONFIG_FILE):
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
 # ---------------- Logging ----------------
-LOG_FILE = os.path.join(BASE_DIR, "freebox.log")
-logging.basicConfig(level=logging.INFO,
-                    format="%(asctime)s [%(levelname)s] %(message)s",
-                    handlers=[logging.FileHandler(LOG_FILE, encoding="utf-8"), logging.StreamHandler()])
-logger = logging.getLogger("freebox")
+def configure_logging(config, log_file=LOG_FILE):
+    # Une seule configuration par processus (fichier tournant + console)
+    if any(isinstance(h, RotatingFileHandler) for h in logging.getLogger().handlers):
+        return
+    retention = config.get("retention", {})
+    log_handler = RotatingFileHandler(log_file, maxBytes=retention.get("log_max_bytes", 1_000_000),
+                                      backupCount=retention.get("log_backups", 3), encoding="utf-8")
+    logging.basicConfig(level=logging.INFO,
+                        format="%(asctime)s [%(levelname)s] %(message)s",
+                        handlers=[log_handler, logging.StreamHandler()])
 
-# ---------------- Flask & WebSocket ----------------
-app = Flask(__name__)
-socketio = SocketIO(app)
+# ---------------- Métriques ----------------
+class DashboardMetrics(MetricsRegistry):
+    """Métriques mises à jour par les pollers ; /metrics ne fait que formater l'état courant."""
 
-# ---------------- Anti-spam alertes ----------------
-LAST_ALERTS = {}
-def can_send_alert(key):
-    cooldown = CONFIG.get("alerts", {}).get("cooldown_seconds", 300)
-    now = time.time()
-    last = LAST_ALERTS.get(key, 0)
-    if now - last >= cooldown:
-        LAST_ALERTS[key] = now
-        return True
-    return False
-
-# ---------------- Freebox Auth ----------------
-class FreeboxAuth:
     def __init__(self):
-        with open(APP_TOKEN_FILE, "r") as f:
-            self.app_token = json.load(f)["app_token"]
-        self.session_token = None
-        self.expire = 0
-        self.retry_delay = 5
-        self.max_retry_delay = 300
-
-    def _open(self):
+        super().__init__()
+        self.rate = self.gauge("freebox_rate_bytes", "Débit instantané en octets/s", ("direction",))
+        self.bytes = self.counter("freebox_bytes_total", "Octets transférés depuis le démarrage de la box", ("direction",))
+        self.throughput = self.gauge("freebox_throughput_bytes", "Débit moyen depuis le poll précédent (compteurs d'octets), octets/s", ("direction",))
+        self.usage = self.gauge("freebox_usage_bytes", "Volume du jour / du mois en cours (UTC)", ("direction", "period"))
+        self.link_up = self.gauge("freebox_link_up", "Connexion WAN active (1) ou non (0)")
+        self.wifi_clients = self.gauge("freebox_wifi_clients", "Nombre de clients WiFi")
+        self.wifi_enabled = self.gauge("freebox_wifi_enabled", "WiFi activé (1) ou non (0)")
+        self.dhcp_clients = self.gauge("freebox_dhcp_clients", "Nombre de clients DHCP actifs")
+        self.lan_devices = self.gauge("freebox_lan_devices", "Appareils du réseau local (présents, connus)", ("state",))
+        self.lan_device_changes = self.counter("freebox_lan_device_changes_total", "Changements de l'inventaire des appareils", ("change",))
+        self.sync_items = self.gauge("freebox_sync_items", "Eléments de la copie locale (journal d'appels, téléchargements)", ("list",))
+        self.poll_duration = self.histogram("freebox_poll_duration_seconds", "Durée des appels de polling", ("job",))
+        self.poll_failures = self.counter("freebox_poll_failures_total", "Polls en échec", ("job",))
+        self.last_poll = self.gauge("freebox_last_poll_timestamp_seconds", "Date du dernier poll réussi", ("job",))
+        self.poll_interval = self.gauge("freebox_poll_interval_seconds", "Intervalle de polling courant (mode adaptatif)", ("job",))
+        self.poll_unchanged = self.counter("freebox_poll_unchanged_total", "Réponses identiques à la précédente, non stockées", ("job",))
+        self.auth_renewals = self.counter("freebox_auth_renewals_total", "Ouvertures de session Freebox")
+        self.alerts_sent = self.counter("freebox_alerts_sent_total", "Alertes envoyées", ("channel",))
+        self.alert_failures = self.counter("freebox_alert_failures_total", "Alertes en échec", ("channel",))
+        self.cache_requests = self.counter("freebox_category_cache_requests_total", "Accès au cache des pages /category", ("result",))
+        self.cache_evictions = self.counter("freebox_category_cache_evictions_total", "Entrées évincées (LRU)")
+        self.cache_errors = self.counter("freebox_category_cache_errors_total", "Echecs de chargement depuis la Freebox")
+        self.cache_entries = self.gauge("freebox_category_cache_entries", "Entrées en cache")
+        self.rules_firing = self.gauge("freebox_alert_rule_firing", "Règle d'alerte active (1) ou non (0)", ("rule",))
+        self.storage_writes = self.counter("freebox_storage_writes_total", "Ecritures groupées du stockage (enregistrements, lots, fsync, erreurs)", ("result",))
+        self.storage_pending = self.gauge("freebox_storage_pending_records", "Enregistrements en attente d'écriture")
+        self.events = self.counter("freebox_events_total", "Evénements poussés par la Freebox (WebSocket)", ("source", "event"))
+        self.events_connected = self.gauge("freebox_events_connected", "WebSocket d'événements ouverte (1) ou non (0)")
+        self.events_connects = self.counter("freebox_events_connects_total", "Connexions à la WebSocket d'événements")
+        self.broadcasts = self.counter("freebox_broadcast_total", "Diffusion Socket.IO (échantillons publiés, abandonnés, fusionnés ; événements envoyés)", ("result",))
+
+# ---------------- Etat partagé ----------------
+class Dashboard:
+    def __init__(self, config, config_file=None, base_dir=BASE_DIR, emit=None, owner_url=None):
+        self.config = config
+        # config_file : fichier réécrit par /settings (None : configuration en mémoire)
+        self.config_file = config_file
+        self.base_dir = base_dir
+        # owner_url : worker web sans session Freebox, état en direct lu chez le propriétaire
+        self.owner_url = owner_url
+        self.data_dir = os.path.join(base_dir, config.get("data_dir", "data"))
+
+        store = store_from_config(self.data_dir, config)
+        # Ecritures groupées par série (storage.writer), fichiers gardés ouverts
+        writer = config.get("storage", {}).get("writer", {})
+        self.store = BufferedStore.from_config(store, writer) if writer.get("enabled", False) else store
+        # Paliers d'agrégats écrits uniquement par le processus qui polle
+        self.rollups = RollupManager(self.store, writable=self.owns_store)
+        self.usage = UsageTracker(self.store)
+        # Appareils du réseau local indexés par MAC, reconstruits depuis la série devices.changes
+        self.inventory = HostInventory.from_config(self.store, config.get("inventory", {}))
+        # Copies locales de /calllog/ et /downloads/ servies par les pages /category
+        self.calls = CallLog(self.store)
+        self.downloads = DownloadTasks(self.store)
+        self.snapshots = SnapshotRegistry(fallback=self.store.last)
+        # Registre des jobs de polling et chemin Freebox de chaque série (status -> /connection/, ...)
+        self.jobs = jobs_from_config(config)
+        self.snapshot_paths = {job.series: job.path for job in self.jobs}
+        self.category_cache = TTLCache.from_config(config.get("category_cache", {}))
+
+        self.metrics = DashboardMetrics()
+        self.metrics.collector(self.collect_metrics)
+        # emit(événement, données) : diffusion Socket.IO (aucune hors application web)
+        self.emit = emit or (lambda event, data: None)
+        self.broadcaster = Broadcaster.from_config(self.emit, config.get("broadcast", {}))
+        self.recent = RecentWindow.from_config(config.get("bootstrap", {}))
+
+        # File et threads d'envoi par canal : les pollers ne sont jamais bloqués par SMTP / Discord
+        self.alert_dispatcher = AlertDispatcher.from_config(config["alerts"], on_result=self.alert_result)
+        # Règles de config.json + règles dérivées des seuils de /settings, évaluées à chaque échantillon
+        self.rule_engine = RuleEngine.from_config(config["alerts"], self.rule_event)
+        self.handlers = {"status": self.handle_status, "wifi": self.handle_wifi, "dhcp": self.handle_dhcp}
+        # Traitement par chemin Freebox, quel que soit le nom du job (/lan/browser/pub/, /lan/browser/wifi/...)
+        self.path_handlers = {"/lan/browser/": self.handle_lan_hosts, "/dhcp/dynamic_lease/": self.handle_leases,
+                              "/calllog/": self.handle_sync, "/downloads/": self.handle_sync}
+        # Abonnement aux événements de la box, ouvert par le processus qui polle (section "events")
+        self.events = None
+        self.started = False
+
+    def _seed_recent(self):
+        # Fenêtre des graphiques initiaux amorcée une fois depuis le stockage
+        for series in CHART_FIELDS:
+            try:
+                if self.store.has_series(series):
+                    self.recent.seed(series, self.store.query(series, start=int(time.time()) - self.recent.window))
+            except Exception as e:
+                logger.error(f"Amorçage fenêtre récente {series} : {e}")
+
+    # ---- Construits au premier usage ----
+    @cached_property
+    def client(self):
+        if self.owner_url:
+            raise FreeboxAuthError(f"Session Freebox gérée par le processus propriétaire ({self.owner_url})")
+        with open(os.path.join(self.base_dir, "app_token.json"), "r") as f:
+            return FreeboxClient.from_config(self.config, json.load(f)["app_token"])
+
+    @cached_property
+    def scheduler(self):
+        from apscheduler.schedulers.background import BackgroundScheduler
+        return BackgroundScheduler()
+
+    @cached_property
+    def poller(self):
+        # Un seul processus polle la Freebox (verrou de fichier) : application web ou poll_freebox_scheduler.py
+        lock_file = self.config.get("polling", {}).get("lock_file", "data/poller.lock")
+        return Poller.from_config(self.client, self.config, self.handle_result, os.path.join(self.base_dir, lock_file),
+                                  observer=self.observe_poll, jobs=self.jobs, near=self.rules_near,
+                                  on_unchanged=self.handle_unchanged, on_lead=self.on_lead)
+
+    def owns_store(self):
+        """Processus qui écrit le stockage : détenteur du verrou du poller (jamais un worker web)."""
+        return self.owner_url is None and "poller" in self.__dict__ and self.poller.lock.held
+
+    def live_owner(self):
+        """URL du processus qui détient l'état en direct, None si c'est celui-ci.
+
+        Worker de production : owner_url. Processus démarré sans le verrou du poller
+        (polling.embedded false, ou en attente) : processus qui polle, sur polling.owner_port."""
+        if self.owner_url:
+            return self.owner_url
+        port = self.config.get("polling", {}).get("owner_port")
+        if not port or not self.started or self.owns_store():
+            return None
+        return f"http://127.0.0.1:{port}"
+
+    # ---- Cycle de vie ----
+    def start(self, poll=None):
+        """Démarre les tâches de fond ; poll (défaut : polling.embedded) lance aussi le poller.
+
+        Un worker (owner_url) n'a ni session Freebox ni poller : poll est ignoré."""
+        if self.started:
+            return
+        if self.owner_url and poll:
+            logger.warning(f"Worker web : polling laissé au processus propriétaire ({self.owner_url})")
+        self.started = True
+        os.makedirs(self.data_dir, exist_ok=True)
+        os.makedirs(os.path.join(self.base_dir, "alerts"), exist_ok=True)
+        # Avant le premier poll : les échantillons écrits ensuite complètent la fenêtre
+        self._seed_recent()
+        if poll is None:
+            poll = self.config.get("polling", {}).get("embedded", True)
+        if poll and not self.owner_url:
+            self.poller.start(self.scheduler)
+        self.scheduler.add_job(self.compact_data, 'interval', id="compact_data", coalesce=True,
+                               hours=self.config.get("retention", {}).get("compaction_interval_hours", 6))
+        self.scheduler.start()
+        self.broadcaster.start()
+        self.alert_dispatcher.start()
+        if not self.owner_url:
+            self.client.auth.start_refresh()
+        logger.info("Scheduler Freebox démarré")
+
+    def stop(self):
+        if not self.started:
+            return
+        self.started = False
+        if self.events is not None:
+            self.events.stop()
+            self.events = None
+        if "poller" in self.__dict__:
+            self.poller.stop()
+        self.scheduler.shutdown(wait=False)
+        self.broadcaster.stop()
+        self.alert_dispatcher.stop()
+        if "client" in self.__dict__:
+            self.client.auth.stop_refresh()
+        # Ecrit ce qui reste en file et ferme les segments ouverts
+        self.store.close()
+
+    # ---- Métriques ----
+    def collect_metrics(self):
+        # Compteurs tenus par le client et le cache, recopiés à chaque scrape
+        m = self.metrics
+        if "client" in self.__dict__:
+            m.auth_renewals.set(self.client.auth.renewals)
+        stats = self.category_cache.stats
+        for result in ("hit", "miss", "stale", "coalesced"):
+            m.cache_requests.set(stats[result], result=result)
+        m.cache_evictions.set(stats["evictions"])
+        m.cache_errors.set(stats["errors"])
+        m.cache_entries.set(len(self.category_cache))
+        for result, value in self.broadcaster.stats.items():
+            m.broadcasts.set(value, result=result)
+        # Les règles retirées depuis /settings disparaissent de l'export
+        m.rules_firing.replace({(rule.name,): 1 if rule.firing else 0 for rule in self.rule_engine.rules})
+        if isinstance(self.store, BufferedStore):
+            stats = self.store.stats
+            for result in ("records", "commits", "fsyncs", "errors"):
+                m.storage_writes.set(stats[result], result=result)
+            m.storage_pending.set(stats["pending"])
+        if self.events is not None:
+            m.events_connected.set(1 if self.events.connected else 0)
+            m.events_connects.set(self.events.stats["connects"])
+        counts = self.inventory.counts()
+        m.lan_devices.set(counts["active"], state="active")
+        m.lan_devices.set(counts["known"], state="known")
+        m.sync_items.set(len(self.calls), list="calls")
+        m.sync_items.set(len(self.downloads), list="downloads")
+        for job in self.jobs:
+            m.poll_interval.set(job.current, job=job.name)
+            m.poll_unchanged.set(job.unchanged, job=job.name)
+
+    def observe_poll(self, name, seconds, ok):
+        self.metrics.poll_duration.observe(seconds, job=name)
+        if ok:
+            self.metrics.last_poll.set(time.time(), job=name)
+        else:
+            self.metrics.poll_failures.inc(job=name)
+
+    # ---- Données ----
+    def save_data(self, name, data):
+        ts = self.store.append(name, data)
+        self.snapshots.put(name, data, ts)
+        self.observe_sample(name, ts, data)
+
+    def observe_sample(self, name, ts, data):
+        # Agrégats, graphiques, règles et volumes à partir d'un échantillon déjà stocké
+        self.rollups.ingest(name, ts, data)
+        self.recent.add(name, ts, data)
+        self.broadcaster.publish(name, ts, data)
+        self.rule_engine.observe(name, ts, data)
+        derived = self.usage.ingest(name, ts, data)
+        if derived:
+            self.save_throughput(ts, derived)
+
+    def save_throughput(self, ts, record):
+        # Série dérivée des compteurs d'octets, déjà écrite par UsageTracker
+        m = self.metrics
+        self.rollups.ingest("throughput", ts, record)
+        self.rule_engine.observe("throughput", ts, record)
+        m.throughput.set(record["result"]["rate_down"], direction="down")
+        m.throughput.set(record["result"]["rate_up"], direction="up")
+        for period in ("day", "month"):
+            m.usage.set(record["totals"][f"{period}_down"], direction="down", period=period)
+            m.usage.set(record["totals"][f"{period}_up"], direction="up", period=period)
+
+    def handle_status(self, data):
+        self.save_data("status", data)
+        m = self.metrics
+        result = data["result"]
+        m.rate.set(result.get("rate_down", 0), direction="down")
+        m.rate.set(result.get("rate_up", 0), direction="up")
+        if "bytes_down" in result:
+            m.bytes.set(result["bytes_down"], direction="down")
+            m.bytes.set(result.get("bytes_up", 0), direction="up")
+        m.link_up.set(1 if result.get("state") == "up" else 0)
+        down = result.get("rate_down", 0)/1_000_000
+        up = result.get("rate_up", 0)/1_000_000
+        logger.info(f"Poll status OK ↓{down:.2f} ↑{up:.2f}")
+
+    def handle_wifi(self, data):
+        self.save_data("wifi", data)
+        clients = data["result"].get("stations_count", 0)
+        self.metrics.wifi_clients.set(clients)
+        self.metrics.wifi_enabled.set(1 if data["result"].get("enabled") else 0)
+        logger.info("Poll WiFi OK")
+
+    def handle_dhcp(self, data):
+        # Configuration DHCP (/dhcp/config/) : pas de baux, comptés par handle_leases
+        self.save_data("dhcp", data)
+        logger.info("Poll DHCP OK")
+
+    def handle_lan_hosts(self, name, path, data):
+        # Liste complète des appareils gardée en mémoire ; seuls les changements sont écrits
+        ts = int(time.time())
+        self.snapshots.put(name, data, ts)
+        interface = path.strip("/").split("/")[-1]
+        self.record_changes(ts, self.inventory.observe_hosts(interface, data.get("result") or [], ts))
+
+    def handle_leases(self, name, path, data):
+        ts = int(time.time())
+        self.snapshots.put(name, data, ts)
+        leases = data.get("result") or []
+        changes = self.inventory.observe_leases(leases, ts)
+        # Stockage d'un compteur par poll (série dhcp_leases), pas de la liste des baux
+        sample = {"success": True, "result": {"leases": len(leases),
+                                              "static": sum(1 for lease in leases if lease.get("is_static"))}}
+        self.store.append(name, sample, ts=ts)
+        self.observe_sample(name, ts, sample)
+        self.metrics.dhcp_clients.set(len(leases))
+        self.record_changes(ts, changes)
+
+    def handle_sync(self, name, path, data):
+        # Liste complète reçue : seuls les appels nouveaux / tâches modifiées sont écrits
+        local = self.calls if path == "/calllog/" else self.downloads
+        changes = local.sync(data.get("result") or [], time.time())
+        if changes:
+            logger.info(f"Poll {name} : {len(changes)} éléments nouveaux ou modifiés")
+
+    def record_changes(self, ts, changes):
+        # Changements déjà écrits par l'inventaire : métriques, journal et diffusion
+        if not changes:
+            return
+        for change in changes:
+            self.metrics.lan_device_changes.inc(change=change["change"])
+        logger.info("Appareils : " + ", ".join(f"{c['mac']} {c['change']}" for c in changes))
+        self.emit("devices", {"ts": ts, "changes": changes})
+
+    def path_handler(self, name):
+        path = self.snapshot_paths.get(name, "")
+        return next(((prefix, handler) for prefix, handler in self.path_handlers.items() if path.startswith(prefix)),
+                    (None, None))
+
+    def handle_result(self, name, data):
+        # Point d'entrée commun (scheduler et moteur asyncio) ; les autres endpoints sont juste stockés
+        handler = self.handlers.get(name)
+        path_handler = self.path_handler(name)[1]
+        if handler:
+            handler(data)
+        elif path_handler:
+            path_handler(name, self.snapshot_paths[name], data)
+        else:
+            self.save_data(name, data)
+
+    def handle_unchanged(self, name):
+        # Polling adaptatif : réponse identique à la précédente, rien n'est réécrit
+        self.snapshots.touch(name)
+        if self.path_handler(name)[0] == "/lan/browser/":
+            self.inventory.touch(self.snapshot_paths[name].strip("/").split("/")[-1], time.time())
+
+    # ---- Evénements poussés ----
+    def on_lead(self):
+        """Ce processus vient de prendre le verrou du poller."""
+        self.migrate_data()
+        self.start_events()
+
+    def start_events(self):
+        conf = self.config.get("events", {})
+        if not conf.get("enabled", False) or self.events is not None:
+            return
+        self.events = EventSubscriber.from_config(self.client.api_base, self.client.auth, conf, self.handle_event,
+                                                  on_state=self.events_state)
+        self.events.start()
+
+    def event_jobs(self, source=None):
+        """Jobs de polling dont la box pousse les changements (events.jobs : source -> jobs)."""
+        jobs = self.config.get("events", {}).get("jobs", {"lan_host": ["lan_hosts"]})
+        names = [name for key, names in jobs.items() if source in (None, key) for name in names]
+        return [name for name in names if name in self.poller.jobs]
+
+    def events_state(self, connected):
+        # Connexion ouverte : les polls ne servent plus qu'à la réconciliation. Ils rattrapent
+        # tout de suite ce qui a pu changer pendant la coupure.
+        interval = self.config.get("events", {}).get("reconcile_interval", 1800) if connected else None
+        for name in self.event_jobs():
+            self.poller.reconcile(name, interval)
+            if connected and self.poller.lock.held:
+                self.poller.run(name)
+
+    def handle_event(self, source, event, result):
+        """Notification de la box : stockée, appliquée au dernier état connu et diffusée aussitôt."""
+        self.save_data("events", {"success": True, "source": source, "event": event, "result": result})
+        self.metrics.events.inc(source=source, event=event)
+        for name in self.event_jobs(source):
+            self.patch_snapshot(self.poller.jobs[name].series, result)
+        if source == "lan_host" and isinstance(result, dict):
+            ts = int(time.time())
+            self.record_changes(ts, self.inventory.observe_host(result, ts))
+        self.emit("event", {"source": source, "event": event, "ts": int(time.time()), "result": result})
+
+    def patch_snapshot(self, series, item):
+        # Liste d'objets avec "id" (appareils du réseau local...) : l'objet notifié remplace le sien
+        snapshot = self.snapshots.get(series)
+        if snapshot is None or not isinstance(item, dict) or "id" not in item:
+            return
+        data = snapshot[1]
+        items = data.get("result") if isinstance(data, dict) else None
+        if not isinstance(items, list):
+            return
+        known = any(isinstance(i, dict) and i.get("id") == item["id"] for i in items)
+        items = [item if isinstance(i, dict) and i.get("id") == item["id"] else i for i in items]
+        self.snapshots.put(series, dict(data, result=items if known else items + [item]))
+
+    def rules_near(self, name):
+        margin = self.config.get("polling", {}).get("adaptive", {}).get("near_margin", 0.1)
+        return any(self.rule_engine.near(series, margin) for series in (name,) + DERIVED_SERIES.get(name, ()))
+
+    def compact_data(self):
+        # Compression des segments clos et purge selon la section "retention" de config.json,
+        # uniquement dans le processus qui détient le verrou du poller
+        if "poller" not in self.__dict__ or not self.poller.lock.held:
+            return
         try:
-            r = requests.get(f"{API_BASE}/login/", timeout=5)
-            r.raise_for_status()
-            data = r.json()
-            if "result" not in data or "challenge" not in data["result"]:
-                raise RuntimeError("Challenge Freebox manquant")
-            challenge = data["result"]["challenge"]
-            pwd = hmac.new(
-                self.app_token.encode(),
-                challenge.encode(),
-                hashlib.sha1
-            ).hexdigest()
-            r = requests.post(
-                f"{API_BASE}/login/session/",
-                json={"app_id": CONFIG["app_id"], "password": pwd},
-                timeout=5
-            )
-            r.raise_for_status()
-            result = r.json()["result"]
-            if "session_token" not in result:
-                raise RuntimeError("session_token manquant")
-            self.session_token = result["session_token"]
-            self.expire = time.time() + result.get("expires", 3600)
-            self.retry_delay = 5
-            logger.info("🔐 Session Freebox établie")
+            report = apply_retention(self.store, self.config.get("retention", {}),
+                                     tiers=[tier[0] for tier in self.rollups.tiers],
+                                     checkpoints={self.downloads.series: self.downloads.checkpoint})
+            logger.info(f"Compaction des données OK {report}")
         except Exception as e:
-            logger.error(f"Freebox auth failed: {e}")
-            time.sleep(self.retry_delay)
-            self.retry_delay = min(self.retry_delay * 2, self.max_retry_delay)
-            raise
-
-    def headers(self):
+            logger.error(f"compact_data error: {e}")
+
+    def migrate_data(self):
+        # Import unique des anciens fichiers data_<nom>.json (renommés en .migrated), uniquement
+        # dans le processus qui détient le verrou du poller
+        if "poller" not in self.__dict__ or not self.poller.lock.held:
+            return
+        if not glob.glob(os.path.join(self.data_dir, "data_*.json")):
+            return
         try:
-            if not self.session_token or time.time() > self.expire - 30:
-                self._open()
+            # Fusion directe dans les segments du store, écritures groupées vidées d'abord
+            store = self.store
+            if isinstance(store, BufferedStore):
+                store.flush()
+                store = store.store
+            migrated = migrate_legacy(self.data_dir, store)
+            logger.info(f"Migration des anciens fichiers de données OK {migrated}")
         except Exception as e:
-            logger.error(f"Freebox auth error: {e}")
-            raise
-        return {"X-Fbx-App-Auth": self.session_token}
+            logger.error(f"migrate_data error: {e}")
+
+    # ---- Alertes ----
+    def alert_result(self, channel, ok, count):
+        (self.metrics.alerts_sent if ok else self.metrics.alert_failures).inc(count, channel=channel)
+
+    def send_alert(self, message, key=None):
+        # key : anti-spam, une alerte de même clé n'est renvoyée qu'après cooldown_seconds
+        return self.alert_dispatcher.send(message, key)
+
+    def rule_event(self, rule, event):
+        # Le cooldown est propre à chaque règle : pas de clé anti-spam côté dispatcher
+        if event == "firing":
+            logger.warning(f"Règle {rule.name} déclenchée : {rule.format()}")
+            self.send_alert(rule.format())
+        else:
+            logger.info(f"Règle {rule.name} résolue ({rule.last_value})")
+            if rule.notify_resolved:
+                self.send_alert(f"✅ Résolu : {rule.format()}")
+
+    # ---- Etat en direct ----
+    def live_state(self):
+        """(fenêtre récente, dernières valeurs) : locales, ou lues chez le processus propriétaire."""
+        owner = self.live_owner()
+        if owner is None:
+            return {"step": self.recent.step, "series": self.recent.snapshot()}, self.broadcaster.state()
+        r = requests.get(f"{owner}/api/bootstrap", timeout=5, headers={PROXY_HEADER: "1"},
+                         cookies={"jwt": generate_jwt("worker", self.config)})
+        r.raise_for_status()
+        live = r.json()
+        return {"step": live["step"], "series": live["series"]}, live["state"]
 
-freebox = FreeboxAuth()
+    # ---- Configuration ----
+    def save_config(self):
+        if self.config_file:
+            with open(self.config_file, "w", encoding="utf-8") as f:
+                json.dump(self.config, f, indent=4)
+
+# ---------------- Flask & WebSocket ----------------
+socketio = SocketIO()
+bp = Blueprint("freebox", __name__)
+
+def services():
+    """Etat partagé de l'application courante."""
+    return current_app.extensions["freebox"]
 
 # ---------------- JWT ----------------
-def generate_jwt(user):
-    payload = {"user": user, "exp": int(time.time()) + CONFIG["jwt_exp"]}
-    return jwt.encode(payload, CONFIG["jwt_secret"], algorithm="HS256")
+def generate_jwt(user, config=None):
+    config = config or services().config
+    payload = {"user": user, "exp": int(time.time()) + config["jwt_exp"]}
+    return jwt.encode(payload, config["jwt_secret"], algorithm="HS256")
 
 def jwt_required(f):
     @wraps(f)
     def wrapper(*args, **kwargs):
         token = request.cookies.get("jwt")
         if not token:
-            return redirect(url_for("login"))
+            return redirect(url_for(".login"))
         try:
-            jwt.decode(token, CONFIG["jwt_secret"], algorithms=["HS256"])
+            jwt.decode(token, services().config["jwt_secret"], algorithms=["HS256"])
         except jwt.InvalidTokenError:
-            return redirect(url_for("login"))
+            return redirect(url_for(".login"))
         return f(*args, **kwargs)
     return wrapper
 
 # ---------------- Routes ----------------
-@app.route('/')
+@bp.before_app_request
+def relay_owner_routes():
+    # Application web qui ne polle pas : état en direct, inventaire, copies locales et réglages
+    # relayés au processus qui polle (en production, nginx envoie ces routes au propriétaire)
+    fb = services()
+    owner = fb.live_owner()
+    if owner is None or fb.owner_url or request.headers.get(PROXY_HEADER) or not OWNER_ROUTES_RE.match(request.path):
+        return None
+    headers = {k: v for k, v in request.headers if k.lower() not in ("host", "content-length")}
+    headers[PROXY_HEADER] = "1"
+    try:
+        r = requests.request(request.method, owner + request.full_path, headers=headers, data=request.get_data(),
+                             allow_redirects=False, timeout=10)
+    except requests.RequestException as e:
+        logger.error(f"Processus de polling injoignable ({owner}) : {e}")
+        return "Processus de polling injoignable", 502
+    excluded = ("content-encoding", "content-length", "transfer-encoding", "connection")
+    return Response(r.content, r.status_code, [(k, v) for k, v in r.headers.items() if k.lower() not in excluded])
+
+@bp.route('/')
 def index():
-    return redirect(url_for("dashboard") if request.cookies.get("jwt") else url_for("login"))
+    return redirect(url_for(".dashboard") if request.cookies.get("jwt") else url_for(".login"))
 
-@app.route('/login', methods=["GET","POST"])
+@bp.route('/login', methods=["GET","POST"])
 def login():
     if request.method == "GET":
         return render_template("login.html")
-    if request.form["username"] == CONFIG["local_user"] and request.form["password"] == CONFIG["local_password"]:
+    config = services().config
+    if request.form["username"] == config["local_user"] and request.form["password"] == config["local_password"]:
         token = generate_jwt(request.form["username"])
         resp = make_response(render_template("login_success.html", user=request.form["username"], token=token))
         resp.set_cookie("jwt", token)
         return resp
     return render_template("login.html", error=True), 401
 
-@app.route('/dashboard')
+@bp.route('/dashboard')
 @jwt_required
 def dashboard():
     buttons = [
@@ -154,194 +607,327 @@ def dashboard():
     ]
     return render_template("dashboard.html", buttons=buttons)
 
-@app.route('/category/<name>')
+@bp.route('/category/<name>')
 @jwt_required
 def category(name):
     endpoints = {
-        "dhcp": f"{API_BASE}/dhcp/config/",
-        "config": f"{API_BASE}/system/",
-        "downloads": f"{API_BASE}/downloads/",
-        "filesystem": f"{API_BASE}/fs/",
-        "airmedia": f"{API_BASE}/airmedia/",
-        "calls": f"{API_BASE}/calllog/",
-        "storage": f"{API_BASE}/storage/",
-        "parental": f"{API_BASE}/parental/"
+        "dhcp": "/dhcp/config/",
+        "config": "/system/",
+        "downloads": "/downloads/",
+        "filesystem": "/fs/",
+        "airmedia": "/airmedia/",
+        "calls": "/calllog/",
+        "storage": "/storage/",
+        "parental": "/parental/"
     }
-    url = endpoints.get(name)
-    if not url:
+    path = endpoints.get(name)
+    if not path:
         return "Catégorie inconnue", 404
-    r = requests.get(url, headers=freebox.headers(), timeout=5)
-    data = r.json()
+    fb = services()
+    if name in LOCAL_VIEWS and path in fb.snapshot_paths.values():
+        # Journal d'appels / téléchargements synchronisés par le poller : page lue localement
+        return render_local(name)
+    # Dernière réponse des pollers pour ce même endpoint, si assez récente
+    max_age = request.args.get("max_age", fb.config.get("snapshots", {}).get("max_age", 600), type=float)
+    series = next((s for s, p in fb.snapshot_paths.items() if p == path), None)
+    snapshot = fb.snapshots.get(series, max_age) if series else None
+    if snapshot is not None:
+        return render_template("category.html", title=name.capitalize(), data=snapshot[1])
+    try:
+        # Pas d'attente dans un thread web si la session Freebox est en cours d'ouverture
+        data = fb.category_cache.get(name, lambda: fb.client.get_json(path, wait=False))
+    except FreeboxAuthError as e:
+        logger.warning(f"category {name} : {e}")
+        return "Freebox momentanément indisponible", 503
+    except requests.RequestException as e:
+        logger.error(f"category {name} error: {e}")
+        return "Erreur de communication avec la Freebox", 502
     return render_template("category.html", title=name.capitalize(), data=data)
 
-from datetime import datetime, timedelta
+# Pages servies depuis les copies locales (freebox_sync.py) : colonnes affichées et filtres
+LOCAL_VIEWS = {
+    "calls": {"columns": ("datetime", "type", "number", "name", "duration"), "filters": ("type", "number", "period"),
+              "choices": {"type": ("missed", "accepted", "outgoing")}},
+    "downloads": {"columns": ("name", "status", "rx_pct", "size", "rx_rate", "tx_rate", "created_ts"),
+                  "filters": ("status", "name"),
+                  "choices": {"status": ("downloading", "seeding", "done", "stopped", "queued", "error", "removed")}},
+}
+
+def local_page(name):
+    """Page demandée (page, per_page, filtres de LOCAL_VIEWS) de la copie locale."""
+    fb = services()
+    args = {k: request.args.get(k) for k in LOCAL_VIEWS[name]["filters"]}
+    period = parse_duration(args.pop("period", None))
+    if period:
+        args["since"] = int(time.time()) - period
+    default = fb.config.get("sync", {}).get("per_page", 50)
+    per_page = min(max(1, request.args.get("per_page", default, type=int)), 500)
+    return getattr(fb, name).page(request.args.get("page", 1, type=int), per_page, **args)
+
+def render_local(name):
+    view = LOCAL_VIEWS[name]
+    result = local_page(name)
+    for item in result["items"]:
+        for key in ("datetime", "created_ts"):
+            if item.get(key):
+                item[key] = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(item[key]))
+        if "rx_pct" in item:
+            item["rx_pct"] = f"{item['rx_pct'] / 100:.1f} %"
+        if item.get("removed"):
+            item["status"] = "removed"
+    filters = {k: request.args.get(k, "") for k in view["filters"]}
+    # Filtres repris dans les liens de pagination
+    query = urlencode({k: v for k, v in filters.items() if v})
+    return render_template("local_list.html", title=name.capitalize(), columns=view["columns"], filters=filters,
+                           choices=view["choices"], query=query, result=result)
+
+@bp.route("/api/calls")
+@jwt_required
+def api_calls():
+    # page, per_page ; type : missed / accepted / outgoing ; number : numéro ou nom ; period : 7d...
+    return local_page("calls")
+
+@bp.route("/api/downloads")
+@jwt_required
+def api_downloads():
+    # page, per_page ; status : downloading, seeding, ..., removed ; name : nom (partiel)
+    return local_page("downloads")
+
+@bp.route("/api/snapshot")
+@jwt_required
+def api_snapshots():
+    snapshots = services().snapshots
+    now = time.time()
+    result = {}
+    for name in snapshots.names():
+        ts, _ = snapshots.get(name)
+        result[name] = {"ts": ts, "age": now - ts}
+    return {"snapshots": result}
 
-@app.route("/history/<datatype>")
+@bp.route("/api/snapshot/<name>")
+@jwt_required
+def api_snapshot(name):
+    fb = services()
+    # max_age (s) : âge maximal accepté, sinon nouvel appel à la Freebox si l'endpoint est connu
+    max_age = request.args.get("max_age", type=float)
+    snapshot = fb.snapshots.get(name, max_age)
+    path = fb.snapshot_paths.get(name)
+    if snapshot is None and path:
+        try:
+            fb.snapshots.put(name, fb.client.get_json(path, wait=False))
+        except FreeboxAuthError as e:
+            return {"error": str(e)}, 503
+        except requests.RequestException as e:
+            return {"error": str(e)}, 502
+        snapshot = fb.snapshots.get(name)
+    stale = snapshot is None
+    if stale:
+        snapshot = fb.snapshots.get(name)
+        if snapshot is None:
+            return {"error": "no data"}, 404
+    ts, data = snapshot
+    return {"name": name, "ts": ts, "age": time.time() - ts, "stale": stale, "data": data}
+
+def project(entry, fields):
+    """Ne garde que les champs demandés : {"ts": ..., "<champ>": ...}."""
+    data = entry["data"]
+    source = data.get("result", data) if isinstance(data, dict) else {}
+    row = {"ts": entry["ts"]}
+    for field in fields:
+        if isinstance(source, dict) and field in source:
+            row[field] = source[field]
+    return row
+
+def stream_history(entries, fmt, fields, meta):
+    """Sérialise l'historique au fil de la lecture (tableau JSON découpé ou NDJSON)."""
+    if fmt == "ndjson":
+        for entry in entries:
+            yield json.dumps(project(entry, fields) if fields else entry) + "\n"
+        return
+    yield '{"data": ['
+    first = True
+    for entry in entries:
+        yield ("" if first else ",") + json.dumps(project(entry, fields) if fields else entry)
+        first = False
+    yield "]" + "".join(f", {json.dumps(k)}: {json.dumps(v)}" for k, v in meta.items()) + "}"
+
+@bp.route("/history/<datatype>")
 @jwt_required
 def history(datatype):
-    period = request.args.get("period", "24h")
-    file_path = os.path.join(DATA_DIR, f"data_{datatype}.json")
-    if not os.path.exists(file_path):
+    fb = services()
+    # period : 30m, 24h, 7d, 2w... ; step : pas souhaité (ex: 5m) ; points : nombre de points visé
+    # format : json (défaut) ou ndjson ; fields : projection (ex: rate_down,rate_up)
+    period = parse_duration(request.args.get("period", "24h"), 24 * 3600)
+    step = parse_duration(request.args.get("step"))
+    points = request.args.get("points", fb.config.get("history", {}).get("points", 300), type=int)
+    fmt = request.args.get("format", "json")
+    fields = [f for f in request.args.get("fields", "").split(",") if f]
+    if fmt not in ("json", "ndjson"):
+        return {"error":"format inconnu"}, 400
+    if not fb.store.has_series(datatype):
         return {"error":"no data"}, 404
 
-    now = datetime.now()
-    if period=="24h":
-        cutoff = now - timedelta(hours=24)
-    elif period=="7d":
-        cutoff = now - timedelta(days=7)
+    start = int(time.time()) - period
+    tier, step = select_tier(period, step, points)
+    if tier is None or not fb.rollups.supports(datatype):
+        # L'index du store positionne directement la lecture sur le premier échantillon
+        entries, meta = fb.store.query(datatype, start=start), {}
     else:
-        cutoff = now - timedelta(hours=24)
-
-    history_data = []
-    with open(file_path,"r") as f:
-        for line in f:
-            entry = json.loads(line)
-            ts = datetime.fromtimestamp(entry["ts"])
-            if ts >= cutoff:
-                history_data.append(entry)
-    return {"data": history_data}
-
-@app.route("/metrics")
-def prometheus_metrics():
-    def safe_count(file):
-        try:
-            with open(file,"r") as f:
-                return sum(1 for _ in f)
-        except:
-            return 0
+        entries = fb.rollups.query(datatype, tier, start=start - start % tier[1])
+        if step > tier[1]:
+            entries = merge_buckets(entries, step)
+        meta = {"tier": tier[0], "step": step}
 
-    metrics = ""
-    metrics += f"# HELP freebox_dhcp_clients Nombre de clients DHCP actifs\n"
-    metrics += f"# TYPE freebox_dhcp_clients gauge\n"
-    metrics += f"freebox_dhcp_clients {safe_count(os.path.join(DATA_DIR,'data_dhcp.json'))}\n"
+    mimetype = "application/x-ndjson" if fmt == "ndjson" else "application/json"
+    return Response(stream_with_context(stream_history(entries, fmt, fields, meta)), mimetype=mimetype)
 
-    metrics += f"# HELP freebox_wifi_clients Nombre de clients WiFi\n"
-    metrics += f"# TYPE freebox_wifi_clients gauge\n"
-    metrics += f"freebox_wifi_clients {safe_count(os.path.join(DATA_DIR,'data_wifi.json'))}\n"
+@bp.route("/api/bootstrap")
+@jwt_required
+def api_bootstrap():
+    # Fenêtre récente déjà sous-échantillonnée : graphiques initiaux sans lecture de l'historique
+    fb = services()
+    recent = fb.recent
+    return {"window": recent.window, "step": recent.step, "series": recent.snapshot(), "state": fb.broadcaster.state()}
+
+@bp.route("/api/usage/<period>")
+@jwt_required
+def api_usage(period):
+    # Volumes par jour ou par mois, tenus au fil de l'eau ; since : 90d, 12w...
+    if period not in ("day", "month"):
+        return {"error":"période inconnue"}, 400
+    since = parse_duration(request.args.get("since"))
+    start = int(time.time()) - since if since else None
+    return {"period": period, "data": services().usage.report(period, start)}
+
+@bp.route("/api/devices")
+@jwt_required
+def api_devices():
+    # Inventaire en mémoire ; state : active, inactive (défaut : tous les appareils connus)
+    state = request.args.get("state")
+    if state not in (None, "active", "inactive"):
+        return {"error":"état inconnu"}, 400
+    inventory = services().inventory
+    return {"counts": inventory.counts(),
+            "devices": inventory.devices(active=None if state is None else state == "active")}
+
+@bp.route("/api/devices/changes")
+@jwt_required
+def api_device_changes():
+    # Changements (joined / left / ip_changed) sur la période demandée (défaut : 24h)
+    period = parse_duration(request.args.get("period", "24h"), 24 * 3600)
+    return {"changes": services().inventory.changes(start=int(time.time()) - period)}
 
-    return metrics, 200, {"Content-Type":"text/plain; version=0.0.4"}
+@bp.route("/api/devices/<mac>")
+@jwt_required
+def api_device(mac):
+    # Appareil et sessions de présence sur la période demandée (défaut : 7d)
+    period = parse_duration(request.args.get("period", "7d"), 7 * 86400)
+    device = services().inventory.device(mac, start=int(time.time()) - period)
+    if device is None:
+        return {"error":"appareil inconnu"}, 404
+    return device
+
+@bp.route("/metrics")
+def prometheus_metrics():
+    return services().metrics.render(), 200, {"Content-Type":"text/plain; version=0.0.4"}
 
-@app.route("/settings")
+@bp.route("/settings")
 @jwt_required
 def settings():
-    return render_template("settings.html", config=CONFIG)
+    return render_template("settings.html", config=services().config)
 
-@app.route("/save_settings", methods=["POST"])
+@bp.route("/save_settings", methods=["POST"])
 @jwt_required
 def save_settings():
+    fb = services()
+    alerts = fb.config["alerts"]
     # Alertes activées
-    CONFIG["alerts"]["enabled"] = "alerts_enabled" in request.form
-    CONFIG["alerts"]["cooldown_seconds"] = int(request.form.get("cooldown_seconds", 300))
+    alerts["enabled"] = "alerts_enabled" in request.form
+    alerts["cooldown_seconds"] = int(request.form.get("cooldown_seconds", 300))
 
     # Seuils
-    CONFIG["alerts"]["thresholds"]["download_min_mbps"] = float(request.form.get("download_min_mbps", 5))
-    CONFIG["alerts"]["thresholds"]["upload_min_mbps"] = float(request.form.get("upload_min_mbps", 1))
-    CONFIG["alerts"]["thresholds"]["wifi_enabled_required"] = "wifi_enabled_required" in request.form
-
-    # Sauvegarder dans config.json
-    with open(CONFIG_FILE, "w", encoding="utf-8") as f:
-        json.dump(CONFIG, f, indent=4)
-
-    return redirect(url_for("settings"))
-
-# ---------------- Scheduler & Data ----------------
-def save_data(name, data):
-    path = os.path.join(DATA_DIR, f"data_{name}.json")
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps({"ts": int(time.time()), "data": data}) + "\n")
-    socketio.emit("realtime", {"type": name, "timestamp": int(time.time()), "data": data})
-
-# ---- Tâches ----
-def poll_status():
-    try:
-        r = requests.get(f"{API_BASE}/connection/", headers=freebox.headers(), timeout=5)
-        r.raise_for_status()
-        data = r.json()
-        save_data("status", data)
-        down = data["result"].get("rate_down", 0)/1_000_000
-        up = data["result"].get("rate_up", 0)/1_000_000
-        t = CONFIG["alerts"]["thresholds"]
-        if down < t["download_min_mbps"] and can_send_alert("low_download"):
-            send_alert(f"Débit descendant faible : {down:.2f} Mbps")
-        if up < t["upload_min_mbps"] and can_send_alert("low_upload"):
-            send_alert(f"Débit montant faible : {up:.2f} Mbps")
-        logger.info(f"Poll status OK ↓{down:.2f} ↑{up:.2f}")
-    except Exception as e:
-        logger.error(f"poll_status error: {e}")
-
-def poll_wifi():
+    alerts["thresholds"]["download_min_mbps"] = float(request.form.get("download_min_mbps", 5))
+    alerts["thresholds"]["upload_min_mbps"] = float(request.form.get("upload_min_mbps", 1))
+    alerts["thresholds"]["wifi_enabled_required"] = "wifi_enabled_required" in request.form
     try:
-        r = requests.get(f"{API_BASE}/wifi/config/", headers=freebox.headers(), timeout=5)
-        r.raise_for_status()
-        data = r.json()
-        save_data("wifi", data)
-        clients = data["result"].get("stations_count", 0)
-        socketio.emit("wifi_stats", {"timestamp": int(time.time()), "clients": clients, "enabled": data["result"].get("enabled", False)})
-        if CONFIG["alerts"]["thresholds"]["wifi_enabled_required"] and not data["result"].get("enabled"):
-            if can_send_alert("wifi_down"):
-                send_alert("🚨 WiFi désactivé ou indisponible")
-        logger.info("Poll WiFi OK")
-    except Exception as e:
-        logger.error(f"poll_wifi error: {e}")
-
-def poll_dhcp():
-    try:
-        r = requests.get(f"{API_BASE}/dhcp/config/", headers=freebox.headers(), timeout=5)
-        r.raise_for_status()
-        data = r.json()
-        save_data("dhcp", data)
-        # Nombre de clients DHCP actifs
-        clients = len(data["result"].get("leases", []))
-        socketio.emit("dhcp_stats", {"timestamp": int(time.time()), "clients": clients})
-        logger.info("Poll DHCP OK")
-    except Exception as e:
-        logger.error(f"poll_dhcp error: {e}")
+        fb.rule_engine.load(rules_from_config(alerts))
+    except (KeyError, ValueError) as e:
+        logger.error(f"Règles d'alerte invalides : {e}")
 
-# ---------------- Alertes ----------------
-def send_alert(message):
-    if not CONFIG.get("alerts", {}).get("enabled", False):
-        return
-    alerts = CONFIG["alerts"]
-    # Mail
-    if alerts.get("mail", {}).get("enabled", False):
-        try:
-            msg = MIMEText(message)
-            msg["Subject"] = "Freebox Alert"
-            msg["From"] = alerts["mail"]["from"]
-            msg["To"] = ",".join(alerts["mail"]["to"])
-            server = smtplib.SMTP(alerts["mail"]["server"], alerts["mail"]["port"])
-            if alerts["mail"].get("tls", False):
-                server.starttls()
-            if alerts["mail"].get("username"):
-                server.login(alerts["mail"]["username"], alerts["mail"]["password"])
-            server.send_message(msg)
-            server.quit()
-            logger.info(f"Alert sent via mail: {message}")
-        except Exception as e:
-            logger.error(f"Erreur alerte mail: {e}")
-    # Discord
-    if alerts.get("discord", {}).get("enabled", False):
-        try:
-            requests.post(alerts["discord"]["webhook"], json={"content": f"🚨 Freebox Alert\n{message}"}, timeout=5)
-            logger.info(f"Alert sent via Discord: {message}")
-        except Exception as e:
-            logger.error(f"Erreur alerte Discord: {e}")
+    # Sauvegarder dans config.json
+    fb.save_config()
 
-# ---------------- Scheduler ----------------
-scheduler = BackgroundScheduler()
-scheduler.add_job(poll_status, 'interval', seconds=30)
-scheduler.add_job(poll_wifi, 'interval', minutes=5)
-scheduler.add_job(poll_dhcp, 'interval', minutes=5)
-scheduler.start()
-logger.info("Scheduler Freebox démarré")
+    return redirect(url_for(".settings"))
 
 # ---------------- WebSocket ----------------
 @socketio.on('connect')
 def ws_connect():
+    try:
+        bootstrap, state = services().live_state()
+    except requests.RequestException as e:
+        logger.error(f"Etat en direct indisponible : {e}")
+        bootstrap, state = None, {}
+    # Graphiques initiaux, puis dernières valeurs complètes : les "update" suivants ne portent que les changements
+    if bootstrap is not None:
+        emit("bootstrap", bootstrap)
+    emit("state", state)
     logger.info('Client WebSocket connecté')
 
+# ---------------- Fabrique ----------------
+def queue_emitter(config):
+    """Emetteur sans serveur Socket.IO (processus sans application web) : publication dans
+    polling.message_queue, diffusée par l'application web ; None sans file configurée."""
+    message_queue = config.get("polling", {}).get("message_queue")
+    if not message_queue:
+        return None
+    return SocketIO(message_queue=message_queue).emit
+
+def create_dashboard(config=None, emit=None, owner_url=None):
+    """Etat partagé seul (processus de polling, tâches) ; config None : config.json et journalisation fichier."""
+    config_file = None
+    if config is None:
+        config = load_config()
+        configure_logging(config)
+        config_file = CONFIG_FILE
+    return Dashboard(config, config_file, emit=emit or queue_emitter(config), owner_url=owner_url)
+
+def create_app(config=None, start=False, owner_url=None, **socketio_options):
+    """Application Flask ; start : démarre aussi les tâches de fond (voir Dashboard.start).
+
+    socketio_options : options de Flask-SocketIO (message_queue, async_mode...) ; message_queue
+    vaut par défaut polling.message_queue (mises à jour publiées par un poller dédié)."""
+    app = Flask(__name__)
+    fb = create_dashboard(config, emit=socketio.emit, owner_url=owner_url)
+    message_queue = fb.config.get("polling", {}).get("message_queue")
+    if message_queue:
+        socketio_options.setdefault("message_queue", message_queue)
+    socketio.init_app(app, **socketio_options)
+    app.extensions["freebox"] = fb
+    app.register_blueprint(bp)
+    if start:
+        fb.start()
+    return app
+
+def create_owner_app(dashboard):
+    """Routes HTTP (sans Socket.IO) de l'état partagé d'un processus de polling sans application web."""
+    app = Flask(__name__)
+    app.extensions["freebox"] = dashboard
+    app.register_blueprint(bp)
+    return app
+
+_default_app = None
+
+def __getattr__(name):
+    # Compatibilité : "from freebox_dashboard_app import app" construit l'application au premier accès
+    global _default_app
+    if name == "app":
+        if _default_app is None:
+            _default_app = create_app()
+        return _default_app
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
 # ---------------- Run ----------------
 # Connexion HTTP
 if __name__ == "__main__":
-    socketio.run(app, host="0.0.0.0", port=CONFIG.get("web_port", 5000))
-
+    app = create_app(start=True)
+    socketio.run(app, host="0.0.0.0", port=app.extensions["freebox"].config.get("web_port", 5000))
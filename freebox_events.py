@@ -0,0 +1,168 @@
+# Nécessite l'installation de 'aiohttp': pip install aiohttp
+
+# freebox_events.py - événements poussés par la Freebox (WebSocket /ws/event)
+#
+# Freebox OS publie des notifications sur une WebSocket authentifiée par le même token de
+# session que les appels HTTP : présence des appareils du réseau local
+# (lan_host_l3addr_reachable / unreachable), machines virtuelles, téléchargements... Le
+# subscriber garde la connexion ouverte depuis un thread asyncio dédié, s'abonne aux
+# événements de config.json (section "events") et remet chaque notification au handler
+# (stockage, diffusion Socket.IO) sur un unique thread d'exécution.
+#
+# Connexion perdue ou refusée : nouvelle tentative avec backoff exponentiel, session
+# renouvelée si la box a refusé le token. on_state(True / False) signale l'état de la
+# connexion : tant qu'elle est ouverte, les polls correspondants ne servent plus qu'à la
+# réconciliation, à intervalle lent.
+
+import json, asyncio, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger("freebox.events")
+
+DEFAULT_EVENTS = ["lan_host_l3addr_reachable", "lan_host_l3addr_unreachable"]
+
+
+def ws_url(api_base):
+    """http://box/api/v15 -> ws://box/api/v15/ws/event (https -> wss)."""
+    return "ws" + api_base[len("http"):] + "/ws/event" if api_base.startswith("http") else api_base + "/ws/event"
+
+
+class EventSubscriber:
+    def __init__(self, url, auth, events, handler, on_state=None, reconnect_min=1, reconnect_max=300,
+                 heartbeat=30, timeout=10):
+        self.url = url
+        self.auth = auth
+        self.events = list(events)
+        # handler(source, événement, résultat) : notification reçue
+        self.handler = handler
+        # on_state(connecté) : connexion établie (abonnement accepté) ou perdue
+        self.on_state = on_state
+        self.reconnect_min = reconnect_min
+        self.reconnect_max = reconnect_max
+        self.heartbeat = heartbeat
+        self.timeout = timeout
+        self.connected = False
+        self.stats = {"connects": 0, "events": 0, "errors": 0}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="freebox-events-handler")
+        self._loop = None
+        self._thread = None
+        self._stopping = None
+
+    @classmethod
+    def from_config(cls, api_base, auth, conf, handler, on_state=None):
+        return cls(ws_url(api_base), auth, conf.get("events", DEFAULT_EVENTS), handler, on_state=on_state,
+                   reconnect_min=conf.get("reconnect_min", 1), reconnect_max=conf.get("reconnect_max", 300),
+                   heartbeat=conf.get("heartbeat", 30))
+
+    # ---- Cycle de vie ----
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="freebox-events", daemon=True)
+        self._thread.start()
+        logger.info(f"Abonnement aux événements Freebox ({', '.join(self.events)})")
+
+    def stop(self, timeout=10):
+        if self._loop and self._stopping:
+            self._loop.call_soon_threadsafe(self._stopping.set)
+        if self._thread:
+            self._thread.join(timeout)
+        self._executor.shutdown(wait=False)
+
+    def _run(self):
+        self._loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self._loop)
+        try:
+            self._loop.run_until_complete(self.run())
+        except ImportError:
+            logger.error("Evénements Freebox indisponibles : aiohttp n'est pas installé")
+        finally:
+            self._loop.close()
+
+    # ---- Connexion ----
+    async def run(self):
+        import aiohttp
+
+        self._stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        delay = self.reconnect_min
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=self.timeout)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            while not self._stopping.is_set():
+                token = None
+                try:
+                    # FreeboxAuth est bloquant (renouvellement partagé avec les polls) : hors de la boucle
+                    token = await loop.run_in_executor(None, self.auth.token)
+                    async with session.ws_connect(self.url, headers={"X-Fbx-App-Auth": token},
+                                                  heartbeat=self.heartbeat) as ws:
+                        await self._register(ws)
+                        delay = self.reconnect_min
+                        self.stats["connects"] += 1
+                        self._set_connected(True)
+                        await self._listen(ws)
+                except aiohttp.WSServerHandshakeError as e:
+                    self.stats["errors"] += 1
+                    if e.status == 403 and token:
+                        # Session refusée par la box : renouvelée à la prochaine tentative
+                        self.auth.invalidate(token)
+                    logger.error(f"WebSocket événements refusée ({e.status})")
+                except Exception as e:
+                    self.stats["errors"] += 1
+                    logger.error(f"WebSocket événements : {e!r}")
+                self._set_connected(False)
+                if self._stopping.is_set():
+                    break
+                logger.info(f"WebSocket événements : reconnexion dans {delay:g} s")
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                delay = min(delay * 2, self.reconnect_max)
+
+    async def _register(self, ws):
+        await ws.send_json({"action": "register", "events": self.events})
+        reply = await ws.receive_json(timeout=self.timeout)
+        if not reply.get("success"):
+            raise RuntimeError(f"Abonnement refusé : {reply.get('msg') or reply.get('error_code')}")
+
+    async def _listen(self, ws):
+        import aiohttp
+
+        stopping = asyncio.ensure_future(self._stopping.wait())
+        try:
+            while True:
+                receive = asyncio.ensure_future(ws.receive())
+                await asyncio.wait({receive, stopping}, return_when=asyncio.FIRST_COMPLETED)
+                if stopping.done():
+                    receive.cancel()
+                    await ws.close()
+                    return
+                message = receive.result()
+                if message.type == aiohttp.WSMsgType.TEXT:
+                    self._dispatch(json.loads(message.data))
+                elif message.type in (aiohttp.WSMsgType.CLOSE, aiohttp.WSMsgType.CLOSING,
+                                      aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                    raise ConnectionError("connexion fermée par la Freebox")
+        finally:
+            stopping.cancel()
+
+    # ---- Notifications ----
+    def _dispatch(self, message):
+        if message.get("action") != "notification" or not message.get("success", True):
+            return
+        self.stats["events"] += 1
+        self._executor.submit(self._call, self.handler, message.get("source"), message.get("event"),
+                              message.get("result"))
+
+    def _set_connected(self, connected):
+        if connected == self.connected:
+            return
+        self.connected = connected
+        logger.info("WebSocket événements connectée" if connected else "WebSocket événements déconnectée")
+        # A l'arrêt, les polls sont arrêtés eux aussi : rien à rétablir
+        if self.on_state is not None and not self._stopping.is_set():
+            self._executor.submit(self._call, self.on_state, connected)
+
+    def _call(self, callback, *args):
+        try:
+            callback(*args)
+        except Exception as e:
+            logger.error(f"Traitement d'un événement Freebox : {e}")
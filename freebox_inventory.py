@@ -0,0 +1,219 @@
+# freebox_inventory.py - inventaire des appareils du réseau local, indexé par adresse MAC
+#
+# Les polls /lan/browser/<interface>/ et /dhcp/dynamic_lease/ (et les événements lan_host
+# poussés par la box) sont comparés à un index en mémoire : MAC -> nom, dernière IP,
+# interface, première / dernière présence, bail DHCP. Chaque poll produit les changements
+# "joined", "left" et "ip_changed" en un seul passage sur la réponse (les MAC présentes par
+# interface sont gardées dans un ensemble) ; seuls ces changements sont écrits, dans la
+# série "devices.changes". L'index (et l'historique de présence de chaque appareil) est
+# reconstruit au démarrage en rejouant ces changements, jamais à partir des réponses brutes.
+
+import logging, threading
+from collections import deque
+from freebox_storage import register_retention
+
+logger = logging.getLogger("freebox.inventory")
+
+CHANGES = "devices.changes"
+register_retention(CHANGES, "history")
+
+
+def normalize_mac(mac):
+    return mac.strip().upper() if isinstance(mac, str) and mac.strip() else None
+
+
+def host_mac(host):
+    l2ident = host.get("l2ident") or {}
+    return normalize_mac(l2ident.get("id")) if l2ident.get("type", "mac_address") == "mac_address" else None
+
+
+def host_ip(host):
+    """IPv4 joignable de l'appareil, sinon la première IPv4 connue."""
+    addresses = [c for c in host.get("l3connectivities") or [] if c.get("af") == "ipv4" and c.get("addr")]
+    reachable = [c for c in addresses if c.get("reachable") or c.get("active")]
+    return (reachable or addresses or [{}])[0].get("addr")
+
+
+class HostInventory:
+    def __init__(self, store, history=500):
+        self.store = store
+        # Nombre de sessions de présence gardées par appareil
+        self.history = history
+        self._devices = {}          # MAC -> appareil
+        self._present = {}          # interface -> MAC présentes
+        self._sessions = {}         # MAC -> deque de [arrivée, départ ou None]
+        self._recovered = False
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, store, conf):
+        return cls(store, history=conf.get("history", 500))
+
+    # ---- Index ----
+    def _device(self, mac, ts):
+        device = self._devices.get(mac)
+        if device is None:
+            device = self._devices[mac] = {"mac": mac, "name": None, "ip": None, "interface": None,
+                                           "first_seen": ts, "last_seen": ts, "active": False, "lease": None}
+        return device
+
+    def _apply(self, change, ts):
+        """Applique un changement à l'index (poll en cours ou rejeu au démarrage)."""
+        mac = change["mac"]
+        device = self._device(mac, ts)
+        if change.get("ip"):
+            device["ip"] = change["ip"]
+        if change.get("name"):
+            device["name"] = change["name"]
+        device["last_seen"] = max(device["last_seen"], ts)
+        sessions = self._sessions.setdefault(mac, deque(maxlen=self.history))
+        if change["change"] == "joined":
+            # Appareil passé d'une interface à une autre : il n'est plus attendu sur l'ancienne
+            self._present.get(device["interface"], set()).discard(mac)
+            device["interface"] = change.get("interface") or device["interface"]
+            self._present.setdefault(device["interface"], set()).add(mac)
+            if not (sessions and sessions[-1][1] is None):
+                sessions.append([ts, None])
+            device["active"] = True
+        elif change["change"] == "left":
+            self._present.get(device["interface"], set()).discard(mac)
+            if sessions and sessions[-1][1] is None:
+                sessions[-1][1] = ts
+            device["active"] = False
+
+    def _recover(self):
+        if self._recovered:
+            return
+        self._recovered = True
+        count = 0
+        for record in self.store.query(CHANGES):
+            for change in record["data"].get("result") or []:
+                self._apply(change, record["ts"])
+                count += 1
+        if count:
+            logger.info(f"Inventaire : {len(self._devices)} appareils, {count} changements rejoués")
+
+    def _commit(self, changes, ts):
+        for change in changes:
+            self._apply(change, ts)
+        if changes:
+            self.store.append(CHANGES, {"success": True, "result": changes}, ts=ts)
+        return changes
+
+    # ---- Observations ----
+    def observe_hosts(self, interface, hosts, ts):
+        """Réponse /lan/browser/<interface>/ : changements depuis le poll précédent."""
+        ts = int(ts)
+        with self._lock:
+            self._recover()
+            present, changes = {}, []
+            for host in hosts:
+                mac = host_mac(host) if isinstance(host, dict) else None
+                if mac is None or not host.get("active"):
+                    continue
+                ip = host_ip(host)
+                present[mac] = host.get("primary_name")
+                device = self._devices.get(mac)
+                if device is None or not device["active"] or device["interface"] != interface:
+                    changes.append({"mac": mac, "change": "joined", "interface": interface, "ip": ip,
+                                    "name": host.get("primary_name")})
+                elif ip and ip != device["ip"]:
+                    changes.append({"mac": mac, "change": "ip_changed", "ip": ip, "previous_ip": device["ip"]})
+            for mac in self._present.get(interface, set()) - present.keys():
+                changes.append({"mac": mac, "change": "left"})
+            self._commit(changes, ts)
+            for mac, name in present.items():
+                device = self._devices[mac]
+                device["last_seen"] = ts
+                device["name"] = name or device["name"]
+            return changes
+
+    def observe_host(self, host, ts, interface=None):
+        """Un seul appareil (événement lan_host poussé par la box)."""
+        ts = int(ts)
+        mac = host_mac(host)
+        if mac is None:
+            return []
+        with self._lock:
+            self._recover()
+            device = self._devices.get(mac)
+            interface = interface or host.get("interface") or (device and device["interface"]) or "pub"
+            ip = host_ip(host)
+            changes = []
+            if host.get("active"):
+                if device is None or not device["active"] or device["interface"] != interface:
+                    changes.append({"mac": mac, "change": "joined", "interface": interface, "ip": ip,
+                                    "name": host.get("primary_name")})
+                elif ip and ip != device["ip"]:
+                    changes.append({"mac": mac, "change": "ip_changed", "ip": ip, "previous_ip": device["ip"]})
+                self._commit(changes, ts)
+                self._devices[mac]["last_seen"] = ts
+            elif device is not None and device["active"]:
+                changes = self._commit([{"mac": mac, "change": "left"}], ts)
+            return changes
+
+    def observe_leases(self, leases, ts):
+        """Réponse /dhcp/dynamic_lease/ : nom et bail des appareils, IP modifiée d'un appareil présent."""
+        ts = int(ts)
+        with self._lock:
+            self._recover()
+            changes = []
+            for lease in leases:
+                mac = normalize_mac(lease.get("mac")) if isinstance(lease, dict) else None
+                if mac is None:
+                    continue
+                device = self._device(mac, ts)
+                ip = lease.get("ip")
+                device["lease"] = {"ip": ip, "hostname": lease.get("hostname"), "static": lease.get("is_static", False),
+                                   "expires": ts + lease["lease_remaining"] if "lease_remaining" in lease else None}
+                device["name"] = device["name"] or lease.get("hostname")
+                if ip and device["active"] and device["ip"] and ip != device["ip"]:
+                    changes.append({"mac": mac, "change": "ip_changed", "ip": ip, "previous_ip": device["ip"]})
+                elif ip and not device["ip"]:
+                    device["ip"] = ip
+            return self._commit(changes, ts)
+
+    def touch(self, interface, ts):
+        """Poll identique au précédent : les appareils présents sont toujours là."""
+        with self._lock:
+            for mac in self._present.get(interface, ()):
+                self._devices[mac]["last_seen"] = int(ts)
+
+    # ---- Lecture ----
+    def devices(self, active=None):
+        """Appareils connus (présents d'abord, puis par dernière présence)."""
+        with self._lock:
+            self._recover()
+            devices = [dict(d) for d in self._devices.values() if active is None or d["active"] == active]
+        return sorted(devices, key=lambda d: (not d["active"], -d["last_seen"]))
+
+    def counts(self):
+        with self._lock:
+            self._recover()
+            return {"active": sum(1 for d in self._devices.values() if d["active"]), "known": len(self._devices)}
+
+    def device(self, mac, start=None, end=None):
+        """Appareil et sessions de présence (bornées à [start, end]), None si inconnu."""
+        mac = normalize_mac(mac)
+        with self._lock:
+            self._recover()
+            device = self._devices.get(mac)
+            if device is None:
+                return None
+            device = dict(device)
+            sessions = list(self._sessions.get(mac, ()))
+        present, rows = 0, []
+        for arrived, departed in sessions:
+            until = departed if departed is not None else device["last_seen"]
+            if (end is not None and arrived > end) or (start is not None and until < start):
+                continue
+            rows.append({"start": arrived, "end": departed})
+            present += max(0, min(until, end if end is not None else until) - max(arrived, start or arrived))
+        device["sessions"] = rows
+        device["present_seconds"] = present
+        return device
+
+    def changes(self, start=None, end=None):
+        """Changements persistés, du plus ancien au plus récent."""
+        return [dict(change, ts=record["ts"]) for record in self.store.query(CHANGES, start, end)
+                for change in record["data"].get("result") or []]
@@ -0,0 +1,302 @@
+# freebox_poller.py - registre unique des jobs de polling Freebox
+#
+# Chaque job décrit un endpoint : nom, chemin de l'API, intervalle, série de stockage et
+# extracteur optionnel. Le même registre (section "polling" de config.json) sert au
+# scheduler APScheduler et au moteur asyncio, que le poller tourne dans l'application web
+# ou dans un processus dédié (poll_freebox_scheduler.py).
+#
+# Un seul processus interroge la Freebox : le poller prend un verrou de fichier exclusif
+# avant de démarrer ses jobs. Les autres restent en attente et retentent régulièrement,
+# ce qui assure la reprise si le processus qui détient le verrou s'arrête.
+#
+# En mode adaptatif (polling.adaptive), l'intervalle d'un job s'allonge tant que ses
+# réponses sont identiques (empreinte du contenu) et revient au minimum dès qu'elles
+# changent ou qu'une règle d'alerte de la série approche de son seuil. Une réponse
+# identique à la précédente n'est pas stockée.
+#
+# Quand la box pousse les changements d'un endpoint (freebox_events.py), son job passe en
+# réconciliation : intervalle lent fixe, jusqu'à la perte de la connexion d'événements.
+
+import os, json, time, hashlib, logging
+from freebox_async_poller import AsyncFreeboxPoller, DEFAULT_ENDPOINTS
+
+logger = logging.getLogger("freebox.poller")
+
+# Extracteurs disponibles depuis config.json ("extract": "<nom>")
+EXTRACTORS = {
+    "result": lambda data: {"success": data.get("success", True), "result": data.get("result")},
+}
+
+
+class PollJob:
+    def __init__(self, name, path, interval, series=None, extract=None, min_interval=None, max_interval=None):
+        self.name = name
+        self.path = path
+        self.interval = interval
+        self.series = series or name
+        # extract(réponse) -> données à stocker (None : réponse complète)
+        self.extract = EXTRACTORS[extract] if isinstance(extract, str) else extract
+        # Bornes du mode adaptatif (None : valeurs par défaut de AdaptivePolicy)
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.current = interval
+        self.unchanged = 0
+        # Intervalle de réconciliation imposé (événements poussés par la box), None sinon
+        self.reconcile = None
+
+    @classmethod
+    def from_config(cls, conf):
+        return cls(conf["name"], conf["path"], conf.get("interval", 60), conf.get("series"), conf.get("extract"),
+                   conf.get("min_interval"), conf.get("max_interval"))
+
+    def endpoint(self):
+        return {"name": self.name, "path": self.path, "interval": self.current}
+
+
+def jobs_from_config(config):
+    # Ancienne liste "async_polling.endpoints" acceptée tant que "polling.jobs" est absent
+    jobs = config.get("polling", {}).get("jobs") or config.get("async_polling", {}).get("endpoints") or DEFAULT_ENDPOINTS
+    return [PollJob.from_config(conf) for conf in jobs]
+
+
+# ---------------- Intervalles adaptatifs ----------------
+def content_digest(data):
+    """Empreinte d'une réponse, indépendante de l'ordre des clés."""
+    return hashlib.blake2b(json.dumps(data, sort_keys=True, default=str).encode(), digest_size=16).hexdigest()
+
+
+class AdaptivePolicy:
+    def __init__(self, backoff=2.0, max_factor=4, near=None):
+        self.backoff = backoff
+        # Intervalle maximum par défaut : intervalle configuré x max_factor
+        self.max_factor = max_factor
+        # near(série) -> True si une règle d'alerte de la série est proche de son seuil
+        self.near = near
+        self._digests = {}
+
+    @classmethod
+    def from_config(cls, conf, near=None):
+        if not conf.get("enabled", False):
+            return None
+        return cls(backoff=conf.get("backoff", 2.0), max_factor=conf.get("max_factor", 4), near=near)
+
+    def bounds(self, job):
+        if job.reconcile:
+            return job.reconcile, job.reconcile
+        low = job.min_interval or job.interval
+        high = job.max_interval or job.interval * self.max_factor
+        return low, max(low, high)
+
+    def update(self, job, data):
+        """Ajuste job.current ; True si la réponse est identique à la précédente."""
+        digest = content_digest(data)
+        unchanged = self._digests.get(job.name) == digest
+        self._digests[job.name] = digest
+        low, high = self.bounds(job)
+        if self.near is not None and self.near(job.series):
+            job.current = low
+        elif unchanged:
+            job.current = min(high, job.current * self.backoff)
+        else:
+            job.current = low
+        return unchanged
+
+
+# ---------------- Verrou ----------------
+class FileLock:
+    """Verrou exclusif non bloquant, libéré par le système si le processus meurt."""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = None
+
+    @property
+    def held(self):
+        return self._file is not None
+
+    def acquire(self):
+        if self._file is not None:
+            return True
+        f = open(self.path, "a+")
+        try:
+            if os.name == "nt":
+                import msvcrt
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        f.seek(0)
+        f.truncate()
+        f.write(str(os.getpid()))
+        f.flush()
+        self._file = f
+        return True
+
+    def release(self):
+        if self._file is None:
+            return
+        try:
+            if os.name == "nt":
+                import msvcrt
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+        finally:
+            self._file.close()
+            self._file = None
+
+
+# ---------------- Poller ----------------
+class Poller:
+    def __init__(self, client, jobs, handler, lock_path, observer=None, use_async=False,
+                 max_concurrency=8, standby_seconds=30, adaptive=None, on_unchanged=None, on_lead=None):
+        self.client = client
+        self.jobs = {job.name: job for job in jobs}
+        # handler(série, données) : traitement commun (stockage, alertes, diffusion)
+        self.handler = handler
+        # observer(job, durée en s, succès) : métriques
+        self.observer = observer
+        self.use_async = use_async
+        self.max_concurrency = max_concurrency
+        self.standby_seconds = standby_seconds
+        # adaptive : AdaptivePolicy (None : intervalles fixes)
+        self.adaptive = adaptive
+        # on_unchanged(série) : réponse identique à la précédente, non transmise au handler
+        self.on_unchanged = on_unchanged
+        # on_lead() : ce processus vient de prendre le verrou (tâches réservées au poller actif)
+        self.on_lead = on_lead
+        self.lock = FileLock(lock_path)
+        self.scheduler = None
+        self._async = None
+
+    @classmethod
+    def from_config(cls, client, config, handler, lock_path, observer=None, jobs=None, near=None,
+                    on_unchanged=None, on_lead=None):
+        conf = config.get("polling", {})
+        async_conf = config.get("async_polling", {})
+        return cls(client, jobs or jobs_from_config(config), handler, lock_path, observer=observer,
+                   use_async=async_conf.get("enabled", False),
+                   max_concurrency=async_conf.get("max_concurrency", 8),
+                   standby_seconds=conf.get("standby_seconds", 30),
+                   adaptive=AdaptivePolicy.from_config(conf.get("adaptive", {}), near=near),
+                   on_unchanged=on_unchanged, on_lead=on_lead)
+
+    def paths(self):
+        """{série: chemin Freebox} des séries alimentées par le poller."""
+        return {job.series: job.path for job in self.jobs.values()}
+
+    # ---- Cycle de vie ----
+    def start(self, scheduler):
+        if self.scheduler is not None:
+            return
+        self.scheduler = scheduler
+        if not self._lead():
+            logger.info(f"Poller déjà actif dans un autre processus ({self.lock.path}), mise en attente")
+            scheduler.add_job(self._lead, 'interval', seconds=self.standby_seconds, id="poller_standby",
+                              coalesce=True, max_instances=1)
+
+    def _lead(self):
+        if self.lock.held or not self.lock.acquire():
+            return self.lock.held
+        if self.scheduler.get_job("poller_standby"):
+            self.scheduler.remove_job("poller_standby")
+        if self.use_async:
+            # Moteur asyncio : tous les endpoints depuis un seul thread
+            self._async = AsyncFreeboxPoller(self.client.api_base, self.client.auth,
+                                             [job.endpoint() for job in self.jobs.values()], self.handle,
+                                             max_concurrency=self.max_concurrency, timeout=self.client.timeout,
+                                             observer=self.observer)
+            self._async.start()
+        else:
+            for job in self.jobs.values():
+                self.scheduler.add_job(self.run, 'interval', seconds=job.current, args=[job.name],
+                                       id=f"poll_{job.name}", coalesce=True, max_instances=1)
+        logger.info(f"Poller démarré ({len(self.jobs)} jobs, pid {os.getpid()})")
+        if self.on_lead is not None:
+            self.on_lead()
+        return True
+
+    def stop(self):
+        if self._async:
+            self._async.stop()
+            self._async = None
+        if self.scheduler:
+            for job in self.jobs.values():
+                if self.scheduler.get_job(f"poll_{job.name}"):
+                    self.scheduler.remove_job(f"poll_{job.name}")
+        self.lock.release()
+
+    # ---- Exécution ----
+    def run_once(self, name):
+        """Exécution ponctuelle hors scheduler, seulement si aucun autre processus ne polle."""
+        if self.lock.held:
+            return self.run(name)
+        if not self.lock.acquire():
+            logger.info(f"poll_{name} ignoré : poller actif dans un autre processus")
+            return None
+        try:
+            return self.run(name)
+        finally:
+            self.lock.release()
+
+    def run(self, name):
+        """Exécute un job une fois (scheduler, tâches externes)."""
+        job = self.jobs[name]
+        started = time.monotonic()
+        try:
+            data = self.client.get_json(job.path)
+        except Exception as e:
+            self._observe(name, started, False)
+            logger.error(f"poll_{name} error: {e}")
+            return None
+        self._observe(name, started, True)
+        try:
+            self.handle(name, data)
+        except Exception as e:
+            logger.error(f"poll_{name} error: {e}")
+        return data
+
+    def handle(self, name, data):
+        job = self.jobs[name]
+        data = job.extract(data) if job.extract else data
+        if self.adaptive is not None:
+            previous = job.current
+            unchanged = self.adaptive.update(job, data)
+            if job.current != previous:
+                self._reschedule(job)
+            if unchanged:
+                job.unchanged += 1
+                if self.on_unchanged is not None:
+                    self.on_unchanged(job.series)
+                return
+        self.handler(job.series, data)
+
+    def reconcile(self, name, interval):
+        """Intervalle lent fixe pour un job dont la box pousse les changements ; None : polling normal."""
+        job = self.jobs.get(name)
+        if job is None:
+            return
+        job.reconcile = interval
+        job.current = interval or (self.adaptive.bounds(job)[0] if self.adaptive else job.interval)
+        logger.info(f"poll_{name} : " + (f"réconciliation toutes les {interval:g} s" if interval else "polling normal"))
+        self._reschedule(job)
+
+    def _reschedule(self, job):
+        logger.debug(f"poll_{job.name} : intervalle {job.current:g} s")
+        if self._async:
+            # La boucle asyncio relit l'intervalle après chaque tick
+            for endpoint in self._async.endpoints:
+                if endpoint["name"] == job.name:
+                    endpoint["interval"] = job.current
+        elif self.scheduler is not None and self.scheduler.get_job(f"poll_{job.name}"):
+            self.scheduler.reschedule_job(f"poll_{job.name}", trigger='interval', seconds=job.current)
+
+    def _observe(self, name, started, ok):
+        if self.observer is not None:
+            self.observer(name, time.monotonic() - started, ok)
@@ -0,0 +1,137 @@
+# Nécessite l'installation de 'eventlet' (ou 'gevent') et de 'redis': pip install eventlet redis
+
+# freebox_prod.py - mode production : plusieurs workers web derrière nginx
+#
+# Un processus propriétaire détient le verrou du poller, la session Freebox, les alertes et
+# l'état en direct ; il sert aussi les routes qui en dépendent (snapshots, /category,
+# /metrics, /settings) sur owner_port. N workers web (ports worker_port, worker_port + 1...)
+# servent les pages, l'historique et les connexions Socket.IO sans jamais interroger la box.
+# Les mises à jour publiées par le propriétaire passent par la file de messages Socket.IO
+# (Redis) et sont diffusées par chaque worker à ses propres clients.
+#
+#   python freebox_prod.py               # propriétaire + workers, relancés s'ils s'arrêtent
+#   python freebox_prod.py owner         # processus propriétaire seul
+#   python freebox_prod.py worker 5001   # un worker web
+#   python freebox_prod.py nginx         # blocs upstream / location nginx correspondants
+
+import os, sys, json, time, logging, subprocess
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+DEFAULTS = {
+    "host": "127.0.0.1",
+    "async_mode": "eventlet",
+    "message_queue": "redis://127.0.0.1:6379/0",
+    "owner_port": 5100,
+    "worker_port": 5001,
+    "workers": 4,
+    "restart_delay": 5,
+}
+
+# Routes servies par le processus propriétaire (expression régulière nginx, reprise aussi
+# par genere-flask-nginx-prod.py)
+OWNER_ROUTES = "^/(api/snapshot|api/bootstrap|api/devices|api/calls|api/downloads|category/|metrics|settings|save_settings)"
+
+logger = logging.getLogger("freebox.prod")
+
+
+def production_config(config):
+    return dict(DEFAULTS, **config.get("production", {}))
+
+
+def _monkey_patch(async_mode):
+    # Avant tout import réseau : les sockets et threads deviennent coopératifs
+    if async_mode == "eventlet":
+        import eventlet
+        eventlet.monkey_patch()
+    elif async_mode == "gevent":
+        from gevent import monkey
+        monkey.patch_all()
+
+
+# ---------------- Processus ----------------
+def run_owner(prod):
+    from freebox_dashboard_app import create_app, socketio
+    app = create_app(message_queue=prod["message_queue"], async_mode=prod["async_mode"])
+    app.extensions["freebox"].start(poll=True)
+    logger.info(f"Processus propriétaire sur {prod['host']}:{prod['owner_port']} (pid {os.getpid()})")
+    socketio.run(app, host=prod["host"], port=prod["owner_port"])
+
+
+def run_worker(prod, port):
+    from freebox_dashboard_app import create_app, socketio, configure_logging, load_config
+    # Un fichier de log par worker (la rotation n'est pas partagée entre processus)
+    configure_logging(load_config(), log_file=os.path.join(BASE_DIR, f"freebox-worker-{port}.log"))
+    owner_url = f"http://{prod['host']}:{prod['owner_port']}"
+    app = create_app(owner_url=owner_url, message_queue=prod["message_queue"], async_mode=prod["async_mode"])
+    logger.info(f"Worker web sur {prod['host']}:{port} (pid {os.getpid()})")
+    socketio.run(app, host=prod["host"], port=port)
+
+
+def worker_ports(prod):
+    return [prod["worker_port"] + i for i in range(prod["workers"])]
+
+
+def supervise(prod):
+    """Lance le propriétaire et les workers, relance ceux qui s'arrêtent."""
+    commands = [[sys.executable, __file__, "owner"]]
+    commands += [[sys.executable, __file__, "worker", str(port)] for port in worker_ports(prod)]
+    processes = [subprocess.Popen(command, cwd=BASE_DIR) for command in commands]
+    try:
+        while True:
+            time.sleep(1)
+            for i, process in enumerate(processes):
+                if process.poll() is not None:
+                    logger.error(f"{' '.join(commands[i][2:])} arrêté (code {process.returncode}), "
+                                 f"relance dans {prod['restart_delay']} s")
+                    time.sleep(prod["restart_delay"])
+                    processes[i] = subprocess.Popen(commands[i], cwd=BASE_DIR)
+    except (KeyboardInterrupt, SystemExit):
+        logger.info("Arrêt des processus")
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+# ---------------- Nginx ----------------
+def nginx_config(prod, name="freebox"):
+    """Blocs à inclure dans la configuration nginx (contexte http)."""
+    servers = "\n".join(f"    server {prod['host']}:{port};" for port in worker_ports(prod))
+    proxy = ("        proxy_http_version 1.1;\n"
+             "        proxy_set_header Host $host;\n"
+             "        proxy_set_header X-Real-IP $remote_addr;\n"
+             "        proxy_set_header X-Forwarded-For $proxy_add_x_forwarded_for;\n"
+             "        proxy_set_header X-Forwarded-Proto $scheme;\n")
+    return (f"# Socket.IO : un client reste sur le même worker (ip_hash)\n"
+            f"upstream {name}_workers {{\n    ip_hash;\n{servers}\n}}\n"
+            f"upstream {name}_owner {{\n    server {prod['host']}:{prod['owner_port']};\n}}\n\n"
+            f"# A placer dans le bloc server\n"
+            f"    location /socket.io/ {{\n        proxy_pass http://{name}_workers;\n{proxy}"
+            f"        proxy_set_header Upgrade $http_upgrade;\n"
+            f"        proxy_set_header Connection \"upgrade\";\n"
+            f"        proxy_read_timeout 86400;\n    }}\n"
+            f"    location ~ {OWNER_ROUTES} {{\n        proxy_pass http://{name}_owner;\n{proxy}    }}\n"
+            f"    location / {{\n        proxy_pass http://{name}_workers;\n{proxy}    }}\n")
+
+
+# ---------------- Lancement direct ----------------
+if __name__ == "__main__":
+    with open(os.path.join(BASE_DIR, "config.json"), "r", encoding="utf-8") as f:
+        PROD = production_config(json.load(f))
+    command = sys.argv[1] if len(sys.argv) > 1 else "supervise"
+    if command in ("owner", "worker"):
+        _monkey_patch(PROD["async_mode"])
+    if command == "owner":
+        run_owner(PROD)
+    elif command == "worker":
+        run_worker(PROD, int(sys.argv[2]) if len(sys.argv) > 2 else PROD["worker_port"])
+    elif command == "nginx":
+        print(nginx_config(PROD))
+    else:
+        logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+        supervise(PROD)
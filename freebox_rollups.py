@@ -0,0 +1,223 @@
+# freebox_rollups.py - agrégats sous-échantillonnés (1m / 5m / 1h) des séries Freebox
+#
+# A chaque échantillon reçu, les paliers ouverts sont mis à jour (min/max/moyenne/dernier).
+# Quand un échantillon tombe dans un nouveau palier, le précédent est écrit dans le store
+# sous la série "<serie>.<palier>" (ex: status.5m). /history choisit ensuite le palier le
+# plus grossier qui fournit encore ~N points pour la période demandée.
+
+import re, math, logging, threading
+
+logger = logging.getLogger("freebox.rollups")
+
+TIERS = [("1m", 60), ("5m", 300), ("1h", 3600)]
+
+# Valeurs numériques suivies pour chaque série
+EXTRACTORS = {
+    "status": lambda r: {k: r[k] for k in ("rate_down", "rate_up", "bytes_down", "bytes_up") if k in r},
+    "wifi": lambda r: {"stations": r["stations_count"]} if "stations_count" in r else {},
+    # Baux DHCP comptés à chaque poll de /dhcp/dynamic_lease/ (Dashboard.handle_leases)
+    "dhcp_leases": lambda r: {k: r[k] for k in ("leases", "static") if k in r},
+    # Débit moyen entre deux polls (freebox_usage.py)
+    "throughput": lambda r: {k: r[k] for k in ("rate_down", "rate_up", "bytes_down", "bytes_up") if k in r},
+}
+
+DURATION_RE = re.compile(r"^(\d+)\s*([smhdw])$")
+DURATION_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400, "w": 604800}
+
+
+def parse_duration(value, default=None):
+    """'30m', '24h', '7d', '2w' -> secondes (default si invalide)."""
+    match = DURATION_RE.match((value or "").strip())
+    if not match:
+        return default
+    return int(match.group(1)) * DURATION_UNITS[match.group(2)]
+
+
+def extract(series, data):
+    extractor = EXTRACTORS.get(series)
+    if extractor is None or not isinstance(data, dict):
+        return {}
+    try:
+        return extractor(data.get("result") or {})
+    except (TypeError, KeyError, AttributeError):
+        return {}
+
+
+# ---------------- Palier ----------------
+class Bucket:
+    def __init__(self, start):
+        self.start = start
+        self.count = 0
+        self.aggs = {}
+
+    def add(self, values):
+        self.count += 1
+        for key, value in values.items():
+            agg = self.aggs.get(key)
+            if agg is None:
+                self.aggs[key] = [value, value, value, value, 1]
+            else:
+                agg[0] = min(agg[0], value)
+                agg[1] = max(agg[1], value)
+                agg[2] += value
+                agg[3] = value
+                agg[4] += 1
+
+    def to_data(self):
+        data = {"count": self.count}
+        for key, (lo, hi, total, last, n) in self.aggs.items():
+            data[key] = {"min": lo, "max": hi, "avg": total / n, "last": last}
+        return data
+
+
+def merge_buckets(records, step):
+    """Regroupe des paliers {"ts", "data"} consécutifs en paliers de `step` secondes."""
+    current = None
+    for record in records:
+        start = record["ts"] - record["ts"] % step
+        if current is not None and current["ts"] != start:
+            yield current
+            current = None
+        data = record["data"]
+        if current is None:
+            current = {"ts": start, "data": {k: (dict(v) if isinstance(v, dict) else v) for k, v in data.items()}}
+            continue
+        merged = current["data"]
+        n_old, n_new = merged.get("count", 0), data.get("count", 0)
+        for key, agg in data.items():
+            if key == "count":
+                continue
+            if key not in merged:
+                merged[key] = dict(agg)
+                continue
+            m = merged[key]
+            m["min"] = min(m["min"], agg["min"])
+            m["max"] = max(m["max"], agg["max"])
+            if n_old + n_new:
+                m["avg"] = (m["avg"] * n_old + agg["avg"] * n_new) / (n_old + n_new)
+            m["last"] = agg["last"]
+        merged["count"] = n_old + n_new
+    if current is not None:
+        yield current
+
+
+def select_tier(period, step=None, points=300, tiers=TIERS):
+    """Choisit (palier, pas) pour une période ; palier None = données brutes.
+
+    Sans pas explicite, on prend le palier dont le nombre de points est le plus proche
+    de `points` (24h -> 5m, 7d -> 1h). Si même le palier le plus fin donne moins de
+    la moitié des points visés, on renvoie les données brutes.
+    """
+    if step:
+        candidates = [t for t in tiers if t[1] <= step]
+        return (candidates[-1], step) if candidates else (None, None)
+    points = max(points, 1)
+    if period / tiers[0][1] < points / 2:
+        return None, None
+    best = min(tiers, key=lambda t: abs(math.log(period / t[1] / points)))
+    return best, best[1]
+
+
+# ---------------- Gestionnaire ----------------
+class RollupManager:
+    """Maintient incrémentalement les paliers d'agrégats d'après les échantillons bruts."""
+
+    def __init__(self, store, tiers=TIERS, writable=None):
+        self.store = store
+        self.tiers = tiers
+        # writable() : processus qui écrit les paliers (détenteur du verrou du poller). Les
+        # autres (workers web, application sans polling) ne font que lire : paliers stockés
+        # puis palier en cours recalculé depuis les données brutes à chaque requête.
+        self.writable = writable or (lambda: True)
+        self._open = {}
+        self._recovered = set()
+        self._lock = threading.RLock()
+
+    def supports(self, series):
+        return series in EXTRACTORS
+
+    def tier_series(self, series, tier):
+        return f"{series}.{tier[0]}"
+
+    def _ingest_tier(self, series, tier, ts, values):
+        key = (series, tier[0])
+        start = ts - ts % tier[1]
+        bucket = self._open.get(key)
+        if bucket is not None and bucket.start != start:
+            if start < bucket.start:
+                return
+            self.store.append(self.tier_series(series, tier), bucket.to_data(), ts=bucket.start)
+            bucket = None
+        if bucket is None:
+            bucket = self._open[key] = Bucket(start)
+        bucket.add(values)
+
+    def _recover(self, series, until=None):
+        """Reconstruit les paliers ouverts (ou manquants) à partir des données brutes."""
+        if series in self._recovered:
+            return
+        self._recovered.add(series)
+        resume = {}
+        for tier in self.tiers:
+            last = self.store.last(self.tier_series(series, tier))
+            resume[tier[0]] = last["ts"] + tier[1] if last else 0
+        replayed = 0
+        for record in self.store.query(series, start=min(resume.values()), end=until):
+            values = extract(series, record["data"])
+            if not values:
+                continue
+            for tier in self.tiers:
+                if record["ts"] >= resume[tier[0]]:
+                    self._ingest_tier(series, tier, record["ts"], values)
+            replayed += 1
+        if replayed:
+            logger.info(f"Rollups {series} : {replayed} échantillons rejoués")
+
+    def ingest(self, series, ts, data):
+        values = extract(series, data)
+        if not values or not self.writable():
+            return
+        with self._lock:
+            # L'échantillon courant est déjà écrit en brut : on ne le rejoue pas
+            self._recover(series, until=int(ts) - 1)
+            for tier in self.tiers:
+                self._ingest_tier(series, tier, int(ts), values)
+
+    def query(self, series, tier, start=None, end=None):
+        """Paliers stockés + palier en cours, sous forme {"ts", "data"}."""
+        if not self.writable():
+            yield from self._query_readonly(series, tier, start, end)
+            return
+        with self._lock:
+            self._recover(series)
+            bucket = self._open.get((series, tier[0]))
+            current = {"ts": bucket.start, "data": bucket.to_data()} if bucket else None
+        for record in self.store.query(self.tier_series(series, tier), start, end):
+            yield record
+        if current and (start is None or current["ts"] >= start) and (end is None or current["ts"] <= end):
+            yield current
+
+    def _query_readonly(self, series, tier, start, end):
+        # Rien n'est écrit ni gardé en mémoire : les paliers après le dernier stocké sont
+        # recalculés depuis les échantillons bruts (au plus un palier de retard du processus
+        # qui polle, ou la période demandée si aucun palier n'est encore écrit)
+        last = self.store.last(self.tier_series(series, tier))
+        resume = last["ts"] + tier[1] if last else 0
+        for record in self.store.query(self.tier_series(series, tier), start, end):
+            yield record
+        if start is not None:
+            resume = max(resume, start - start % tier[1])
+        bucket = None
+        for record in self.store.query(series, start=resume, end=end):
+            values = extract(series, record["data"])
+            if not values:
+                continue
+            bucket_start = record["ts"] - record["ts"] % tier[1]
+            if bucket is not None and bucket.start != bucket_start:
+                yield {"ts": bucket.start, "data": bucket.to_data()}
+                bucket = None
+            if bucket is None:
+                bucket = Bucket(bucket_start)
+            bucket.add(values)
+        if bucket is not None:
+            yield {"ts": bucket.start, "data": bucket.to_data()}
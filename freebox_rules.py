@@ -0,0 +1,370 @@
+# freebox_rules.py - moteur de règles d'alerte évaluées au fil de l'eau
+#
+# Chaque règle suit un champ d'une série sur une fenêtre glissante (last, avg, min, max,
+# pNN, rate, delta) mise à jour à chaque échantillon sans relire l'historique : O(1) amorti,
+# O(log n) pour les percentiles (deux tas, voir SlidingPercentile). Une règle se déclenche quand la condition tient depuis "for" secondes,
+# reste active jusqu'au franchissement du seuil "clear" (hystérésis) et ne peut se
+# redéclencher qu'après son cooldown.
+#
+# Les règles de config.json (alerts.rules) complètent celles dérivées des seuils de
+# /settings (alerts.thresholds) ; une règle de même nom remplace la règle dérivée.
+
+import re, heapq, logging, threading, operator
+from collections import deque
+from freebox_rollups import extract, parse_duration
+
+logger = logging.getLogger("freebox.rules")
+
+OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge,
+             "==": operator.eq, "!=": operator.ne}
+PERCENTILE_RE = re.compile(r"^p(\d{1,2})$")
+
+
+def seconds(value, default=0):
+    """Durée en secondes : nombre ou chaîne '30s', '5m', '1h'..."""
+    if value is None:
+        return default
+    if isinstance(value, (int, float)):
+        return value
+    return parse_duration(value, default)
+
+
+def sample_fields(series, data):
+    """Champs bruts de la réponse Freebox + valeurs dérivées (leases, stations...)."""
+    result = data.get("result") if isinstance(data, dict) else None
+    fields = dict(result) if isinstance(result, dict) else {}
+    fields.update(extract(series, data))
+    return fields
+
+
+# ---------------- Fenêtre glissante ----------------
+class SlidingPercentile:
+    """pNN d'une fenêtre glissante : tas max des rang + 1 plus petites valeurs, tas min des autres.
+
+    Les retraits sont différés jusqu'à ce que la valeur arrive au sommet de son tas ; ajout et
+    retrait en O(log n) amorti, lecture en O(1)."""
+
+    def __init__(self, percentile):
+        self.percentile = percentile
+        self._low = []              # valeurs opposées (tas max), sommet = percentile
+        self._high = []
+        self._low_size = 0          # valeurs encore dans la fenêtre, par tas
+        self._high_size = 0
+        self._removed_low = {}      # valeur -> retraits différés
+        self._removed_high = {}
+
+    def __len__(self):
+        return self._low_size + self._high_size
+
+    def add(self, value):
+        if self._low and value <= -self._low[0]:
+            heapq.heappush(self._low, -value)
+            self._low_size += 1
+        else:
+            heapq.heappush(self._high, value)
+            self._high_size += 1
+        self._balance()
+
+    def remove(self, value):
+        # Sommets toujours valides : une valeur <= sommet bas a une copie dans le tas bas
+        if self._low and value <= -self._low[0]:
+            self._removed_low[value] = self._removed_low.get(value, 0) + 1
+            self._low_size -= 1
+        else:
+            self._removed_high[value] = self._removed_high.get(value, 0) + 1
+            self._high_size -= 1
+        self._prune()
+        self._balance()
+
+    def value(self):
+        return -self._low[0] if self._low_size else None
+
+    def clear(self):
+        self._low.clear()
+        self._high.clear()
+        self._low_size = self._high_size = 0
+        self._removed_low.clear()
+        self._removed_high.clear()
+
+    def _prune(self):
+        while self._low and self._removed_low.get(-self._low[0]):
+            self._removed_low[-heapq.heappop(self._low)] -= 1
+        while self._high and self._removed_high.get(self._high[0]):
+            self._removed_high[heapq.heappop(self._high)] -= 1
+
+    def _balance(self):
+        count = len(self)
+        target = min(count - 1, count * self.percentile // 100) + 1 if count else 0
+        while self._low_size > target:
+            heapq.heappush(self._high, -heapq.heappop(self._low))
+            self._low_size -= 1
+            self._high_size += 1
+            self._prune()
+        while self._low_size < target:
+            heapq.heappush(self._low, -heapq.heappop(self._high))
+            self._low_size += 1
+            self._high_size -= 1
+            self._prune()
+        # Retraits différés restés sous les sommets : tas reconstruits (mémoire bornée)
+        if len(self._low) + len(self._high) > 2 * count + 16:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._low = [-v for v in self._pending(self._low, self._removed_low, -1)]
+        self._high = self._pending(self._high, self._removed_high, 1)
+        heapq.heapify(self._low)
+        heapq.heapify(self._high)
+        self._removed_low.clear()
+        self._removed_high.clear()
+
+    @staticmethod
+    def _pending(heap, removed, sign):
+        removed, kept = dict(removed), []
+        for v in heap:
+            if removed.get(sign * v):
+                removed[sign * v] -= 1
+            else:
+                kept.append(sign * v)
+        return kept
+
+
+class Window:
+    def __init__(self, agg, window):
+        self.agg = agg
+        self.window = window
+        self.samples = deque()      # (ts, valeur)
+        self.total = 0
+        self._min = deque()         # candidats au minimum (valeurs croissantes)
+        self._max = deque()         # candidats au maximum (valeurs décroissantes)
+        match = PERCENTILE_RE.match(agg)
+        self.percentile = int(match.group(1)) if match else None
+        self._percentile = SlidingPercentile(self.percentile) if match else None
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, ts, value):
+        if self.agg == "rate" and self.samples and value < self.samples[-1][1]:
+            # Remise à zéro du compteur (redémarrage de la box) : on repart de ce point
+            self.clear()
+        self.samples.append((ts, value))
+        if self.agg == "avg":
+            self.total += value
+        elif self.agg == "min":
+            while self._min and self._min[-1][1] > value:
+                self._min.pop()
+            self._min.append((ts, value))
+        elif self.agg == "max":
+            while self._max and self._max[-1][1] < value:
+                self._max.pop()
+            self._max.append((ts, value))
+        elif self.percentile is not None:
+            self._percentile.add(value)
+        while len(self.samples) > 1 and self.samples[0][0] <= ts - self.window:
+            self._evict()
+
+    def _evict(self):
+        ts, value = self.samples.popleft()
+        if self.agg == "avg":
+            self.total -= value
+        elif self._min and self._min[0][0] == ts:
+            self._min.popleft()
+        elif self._max and self._max[0][0] == ts:
+            self._max.popleft()
+        elif self.percentile is not None:
+            self._percentile.remove(value)
+
+    def clear(self):
+        self.samples.clear()
+        self.total = 0
+        self._min.clear()
+        self._max.clear()
+        if self._percentile is not None:
+            self._percentile.clear()
+
+    def value(self):
+        if not self.samples:
+            return None
+        if self.agg == "last":
+            return self.samples[-1][1]
+        if self.agg == "avg":
+            return self.total / len(self.samples)
+        if self.agg == "min":
+            return self._min[0][1]
+        if self.agg == "max":
+            return self._max[0][1]
+        if self.percentile is not None:
+            return self._percentile.value()
+        (t0, v0), (t1, v1) = self.samples[0], self.samples[-1]
+        if self.agg == "delta":
+            return v1 - v0
+        return (v1 - v0) / (t1 - t0) if t1 > t0 else None
+
+
+# ---------------- Règle ----------------
+class Rule:
+    def __init__(self, conf, default_cooldown=300):
+        self.name = conf["name"]
+        self.series = conf["series"]
+        self.field = conf["field"]
+        self.agg = conf.get("agg", "last")
+        if self.agg not in ("last", "avg", "min", "max", "rate", "delta") and not PERCENTILE_RE.match(self.agg):
+            raise ValueError(f"Règle {self.name} : agrégat inconnu {self.agg}")
+        if conf.get("op", "==") not in OPERATORS:
+            raise ValueError(f"Règle {self.name} : opérateur inconnu {conf.get('op')}")
+        self.op = conf.get("op", "==")
+        self.threshold = conf.get("value")
+        self.clear = conf.get("clear")
+        self.hold = seconds(conf.get("for"))
+        self.cooldown = seconds(conf.get("cooldown"), default_cooldown)
+        self.min_samples = conf.get("min_samples", 1)
+        self.scale = conf.get("scale", 1)
+        self.message = conf.get("message", "{name} : {field} {agg} = {value}")
+        self.notify_resolved = conf.get("resolved", False)
+        self.window = Window(self.agg, seconds(conf.get("window")))
+        self.firing = False
+        self.since = None
+        self.last_fired = None
+        self.last_value = None
+
+    def signature(self):
+        return (self.series, self.field, self.agg, self.window.window, self.scale)
+
+    def _matches(self, value):
+        return OPERATORS[self.op](value, self.threshold)
+
+    def _cleared(self, value):
+        if self.clear is None or self.op in ("==", "!="):
+            return not self._matches(value)
+        if self.op in ("<", "<="):
+            return value >= self.clear
+        return value <= self.clear
+
+    def update(self, ts, raw):
+        """Nouvel échantillon : "firing", "resolved" ou None."""
+        if raw is None:
+            return None
+        if _number(raw) and self.scale != 1:
+            raw = raw * self.scale
+        self.window.add(ts, raw)
+        if len(self.window) < self.min_samples:
+            return None
+        value = self.window.value()
+        if value is None:
+            return None
+        self.last_value = value
+        if self.firing:
+            if self._cleared(value):
+                self.firing = False
+                self.since = None
+                return "resolved"
+            return None
+        if not self._matches(value):
+            self.since = None
+            return None
+        if self.since is None:
+            self.since = ts
+        if ts - self.since < self.hold:
+            return None
+        if self.last_fired is not None and ts - self.last_fired < self.cooldown:
+            return None
+        self.firing = True
+        self.last_fired = ts
+        return "firing"
+
+    def near(self, margin):
+        """Condition en cours (attente de "for"), règle active ou valeur à moins de margin du seuil."""
+        if self.firing or self.since is not None:
+            return True
+        value, threshold = self.last_value, self.threshold
+        if not _number(value) or not _number(threshold):
+            return False
+        return abs(value - threshold) <= abs(threshold) * margin
+
+    def format(self):
+        value = self.last_value
+        try:
+            return self.message.format(name=self.name, field=self.field, agg=self.agg,
+                                       value=value, threshold=self.threshold)
+        except (ValueError, TypeError, KeyError, IndexError):
+            return f"{self.name} : {self.field} {self.agg} = {value}"
+
+
+def _number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def default_rules(alerts):
+    """Règles équivalentes aux seuils réglables depuis /settings."""
+    t = alerts.get("thresholds", {})
+    rules = []
+    for name, field, key, label in (("low_download", "rate_down", "download_min_mbps", "descendant"),
+                                    ("low_upload", "rate_up", "upload_min_mbps", "montant")):
+        if key in t:
+            rules.append({"name": name, "series": "status", "field": field, "agg": "avg", "window": "5m",
+                          "min_samples": 3, "op": "<", "value": t[key], "clear": t[key] * 1.2,
+                          "scale": 1e-6, "message": f"Débit {label} faible : {{value:.2f}} Mbps"})
+    if t.get("wifi_enabled_required"):
+        rules.append({"name": "wifi_down", "series": "wifi", "field": "enabled", "op": "==", "value": False,
+                      "message": "🚨 WiFi désactivé ou indisponible"})
+    return rules
+
+
+def rules_from_config(alerts):
+    rules = {r["name"]: r for r in default_rules(alerts)}
+    rules.update({r["name"]: r for r in alerts.get("rules", [])})
+    cooldown = alerts.get("cooldown_seconds", 300)
+    return [Rule(conf, cooldown) for conf in rules.values()]
+
+
+# ---------------- Moteur ----------------
+class RuleEngine:
+    def __init__(self, rules, notify):
+        # notify(règle, "firing" | "resolved") est appelé à chaque changement d'état
+        self.notify = notify
+        self._lock = threading.Lock()
+        self.load(rules)
+
+    @classmethod
+    def from_config(cls, alerts, notify):
+        return cls(rules_from_config(alerts), notify)
+
+    def load(self, rules):
+        """(Re)charge les règles ; une règle inchangée garde sa fenêtre et son état."""
+        with self._lock:
+            previous = {rule.name: rule for rule in getattr(self, "rules", [])}
+            for rule in rules:
+                old = previous.get(rule.name)
+                if old is not None and old.signature() == rule.signature():
+                    rule.window, rule.firing, rule.since = old.window, old.firing, old.since
+                    rule.last_fired, rule.last_value = old.last_fired, old.last_value
+            self.rules = list(rules)
+            self._by_series = {}
+            for rule in self.rules:
+                self._by_series.setdefault(rule.series, []).append(rule)
+
+    def observe(self, series, ts, data):
+        rules = self._by_series.get(series)
+        if not rules:
+            return []
+        fields = sample_fields(series, data)
+        events = []
+        with self._lock:
+            for rule in rules:
+                try:
+                    event = rule.update(ts, fields.get(rule.field))
+                except TypeError as e:
+                    logger.error(f"Règle {rule.name} : valeur {fields.get(rule.field)!r} invalide ({e})")
+                    continue
+                if event:
+                    events.append((rule, event))
+        for rule, event in events:
+            self.notify(rule, event)
+        return events
+
+    def active(self):
+        return [rule.name for rule in self.rules if rule.firing]
+
+    def near(self, series, margin=0.1):
+        """True si une règle de la série est active ou proche de son seuil (écart relatif <= margin)."""
+        return any(rule.near(margin) for rule in self._by_series.get(series, ()))
@@ -0,0 +1,544 @@
+# freebox_simulator.py - Freebox OS simulée pour les tests, les benchmarks et le développement
+#
+# Serveur HTTP local qui reproduit la partie de l'API Freebox OS utilisée par le tableau de
+# bord : ouverture de session (challenge GET /login/, POST /login/session/ avec le HMAC-SHA1
+# du app_token), réponse 403 auth_required pour un token inconnu ou expiré, et les endpoints
+# interrogés par les pollers (/connection/, /wifi/config/, /dhcp/config/, /lan/browser/pub/,
+# /calllog/, /downloads/...).
+#
+# Les réponses sont rejouées depuis des enregistrements (anciens fichiers data_<nom>.json ou
+# séries du stockage) ou générées : compteurs d'octets croissants, débits variables. Latence
+# (fixe + gigue) et erreurs (5xx, connexion coupée) sont injectables pour chaque requête.
+#
+# La WebSocket d'événements (/ws/event) accepte les abonnements ("action": "register") ;
+# push() envoie une notification aux clients abonnés et set_host_reachable() fait apparaître
+# ou disparaître un appareil du réseau local (réponses /lan/browser/ + événement lan_host).
+#
+#   python freebox_simulator.py [--port 8090] [--latency 20] [--jitter 5] [--errors 0.05] [--replay data]
+#
+# Le tableau de bord s'y connecte avec "freebox_url": "http://127.0.0.1:8090" dans config.json.
+
+import os, re, sys, json, time, hmac, base64, random, socket, struct, hashlib, logging, secrets, argparse, threading
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+logger = logging.getLogger("freebox.simulator")
+
+API_RE = re.compile(r"^/api/v\d+(/.*)$")
+
+WS_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+
+# Série enregistrée -> endpoint Freebox rejoué
+RECORDED_PATHS = {"status": "/connection/", "wifi": "/wifi/config/", "dhcp": "/dhcp/config/"}
+
+
+def default_app_token():
+    """app_token.json du projet si présent : le tableau de bord s'authentifie sans réglage."""
+    try:
+        with open(os.path.join(BASE_DIR, "app_token.json"), "r") as f:
+            return json.load(f)["app_token"]
+    except (OSError, ValueError, KeyError):
+        return "simulator"
+
+
+def load_recordings(source, paths=RECORDED_PATHS, limit=None):
+    """{endpoint: [réponses]} depuis data_<nom>.json ou un dossier de stockage (séries)."""
+    from freebox_storage import TimeSeriesStore
+    recordings = {}
+    for series, path in paths.items():
+        documents = []
+        legacy = os.path.join(source, f"data_{series}.json")
+        if os.path.exists(legacy):
+            with open(legacy, "rb") as f:
+                for line in f:
+                    try:
+                        documents.append(json.loads(line)["data"])
+                    except (ValueError, KeyError, TypeError):
+                        continue
+        else:
+            store = TimeSeriesStore(source)
+            if store.has_series(series):
+                documents = [record["data"] for record in store.query(series)]
+        documents = [d for d in documents if isinstance(d, dict) and "result" in d]
+        if limit:
+            documents = documents[-limit:]
+        if documents:
+            recordings[path] = documents
+    return recordings
+
+
+# ---------------- Réponses générées ----------------
+class Generator:
+    """Réponses plausibles des endpoints interrogés, sans enregistrement."""
+
+    def __init__(self, rng, rate_down=2_000_000, rate_up=200_000, hosts=8, calls=30, downloads=3):
+        self.rng = rng
+        self.rate_down = rate_down
+        self.rate_up = rate_up
+        self.bytes_down = 900_000_000_000
+        self.bytes_up = 27_000_000_000
+        self.last = time.time()
+        self.started = time.time()
+        self.hosts = [self.host(i) for i in range(hosts)]
+        # Journal d'appels (un appel par heure avant le démarrage) et tâches de téléchargement
+        self.calls = [self.call(i, int(self.started) - 3600 * (calls - i)) for i in range(calls)]
+        self.downloads = [self.download(i, f"debian-{12 + i}.iso", 700_000_000) for i in range(downloads)]
+        self.downloads_last = time.time()
+        self._lock = threading.Lock()
+
+    def host(self, i):
+        return {"mac": f"00:24:d4:00:00:{i:02x}", "ip": f"192.168.0.{10 + i}", "name": f"host-{i}", "active": True}
+
+    def call(self, i, ts):
+        kind = ("accepted", "missed", "outgoing")[i % 3]
+        return {"id": i + 1, "type": kind, "datetime": ts, "number": f"06123456{i % 100:02d}",
+                "name": f"Contact {i % 10}", "duration": 0 if kind == "missed" else 30 + (7 * i) % 600,
+                "new": kind == "missed", "contact_id": 0, "line_id": 0}
+
+    def add_call(self, **fields):
+        """Nouvel appel en tête du journal."""
+        with self._lock:
+            call = dict(self.call(len(self.calls), int(time.time())), **fields)
+            self.calls.append(call)
+            return call
+
+    def download(self, i, name, size):
+        return {"id": i + 1, "type": "bt", "name": name, "status": "downloading", "io_priority": "normal",
+                "size": size, "rx_bytes": 0, "tx_bytes": 0, "rx_rate": 0, "tx_rate": 0, "rx_pct": 0, "tx_pct": 0,
+                "eta": 0, "error": "none", "created_ts": int(time.time()),
+                "download_dir": base64.b64encode("/Disque dur/Téléchargements/".encode()).decode()}
+
+    def add_download(self, name, size):
+        with self._lock:
+            task = self.download(max((t["id"] for t in self.downloads), default=0), name, size)
+            self.downloads.append(task)
+            return task
+
+    def remove_download(self, task_id):
+        with self._lock:
+            self.downloads = [t for t in self.downloads if t["id"] != task_id]
+
+    def calllog(self):
+        with self._lock:
+            return [dict(c) for c in reversed(self.calls)]
+
+    def download_tasks(self):
+        # Progression depuis la requête précédente ; téléchargement terminé : partage (seeding)
+        with self._lock:
+            now = time.time()
+            elapsed, self.downloads_last = now - self.downloads_last, now
+            for task in self.downloads:
+                if task["status"] == "downloading":
+                    rate = int(1_000_000 * self.rng.uniform(0.5, 1.5))
+                    task["rx_bytes"] = min(task["size"], task["rx_bytes"] + int(rate * elapsed) + 1)
+                    task["rx_rate"] = rate
+                    task["eta"] = int((task["size"] - task["rx_bytes"]) / rate)
+                    if task["rx_bytes"] == task["size"]:
+                        task.update(status="seeding", rx_rate=0, eta=0)
+                elif task["status"] == "seeding":
+                    task["tx_rate"] = int(100_000 * self.rng.uniform(0.5, 1.5))
+                    task["tx_bytes"] += int(task["tx_rate"] * elapsed)
+                    task["tx_pct"] = int(10000 * task["tx_bytes"] / task["size"])
+                task["rx_pct"] = int(10000 * task["rx_bytes"] / task["size"])
+            return [dict(t) for t in self.downloads]
+
+    def connection(self):
+        with self._lock:
+            now = time.time()
+            down = int(self.rate_down * self.rng.uniform(0.2, 1.8))
+            up = int(self.rate_up * self.rng.uniform(0.2, 1.8))
+            # Compteurs cumulés cohérents avec les débits renvoyés
+            self.bytes_down += int(down * (now - self.last))
+            self.bytes_up += int(up * (now - self.last))
+            self.last = now
+            return {"type": "ethernet", "state": "up", "media": "ftth", "ipv4": "82.65.220.152",
+                    "ipv6": "2a01:e0a:814:6890::1", "ipv4_port_range": [0, 65535],
+                    "bandwidth_down": 5_000_000_000, "bandwidth_up": 900_000_000,
+                    "rate_down": down, "rate_up": up, "bytes_down": self.bytes_down, "bytes_up": self.bytes_up}
+
+    def wifi_config(self):
+        return {"enabled": True, "power_saving": True, "mac_filter_state": "disabled"}
+
+    def dhcp_config(self):
+        return {"enabled": True, "sticky_assign": True, "gateway": "192.168.0.254", "netmask": "255.255.255.0",
+                "ip_range_start": "192.168.0.1", "ip_range_end": "192.168.0.253", "always_broadcast": True,
+                "ignore_out_of_range_hint": False, "dns": ["192.168.0.254", "", "", "", "", ""]}
+
+    def lan_host(self, h):
+        now = int(time.time())
+        return {"id": f"ether-{h['mac']}", "primary_name": h["name"], "host_type": "workstation",
+                "l2ident": {"id": h["mac"], "type": "mac_address"}, "active": h["active"],
+                "reachable": h["active"], "last_activity": now, "last_time_reachable": now, "interface": "pub",
+                "l3connectivities": [{"addr": h["ip"], "af": "ipv4", "active": h["active"],
+                                      "reachable": h["active"], "last_activity": now, "last_time_reachable": now}]}
+
+    def lan_browser(self):
+        return [self.lan_host(h) for h in self.hosts]
+
+    def dhcp_leases(self):
+        now = int(time.time())
+        return [{"mac": h["mac"], "ip": h["ip"], "hostname": h["name"], "is_static": False,
+                 "assign_time": now - 3600, "refresh_time": now - 60, "lease_remaining": 40000}
+                for h in self.hosts]
+
+    def system(self):
+        return {"uptime_val": int(time.time() - self.started), "temp_cpum": self.rng.randint(55, 70),
+                "temp_sw": self.rng.randint(45, 55), "fan_rpm": self.rng.randint(1800, 2200),
+                "board_name": "fbxgw8r", "firmware_version": "4.9.0"}
+
+    def routes(self):
+        return {"/connection/": self.connection, "/wifi/config/": self.wifi_config,
+                "/dhcp/config/": self.dhcp_config, "/lan/browser/pub/": self.lan_browser,
+                "/dhcp/dynamic_lease/": self.dhcp_leases, "/system/": self.system,
+                "/calllog/": self.calllog, "/downloads/": self.download_tasks,
+                "/wifi/ap/": lambda: [{"id": 0, "name": "5G", "status": {"state": "active"}}],
+                "/switch/status/": lambda: [{"id": 1, "link": "up", "speed": "1000"}],
+                "/storage/disk/": lambda: []}
+
+
+# ---------------- WebSocket d'événements ----------------
+class EventSocket:
+    """Connexion /ws/event d'un client : trames texte non fragmentées, ping / pong, fermeture."""
+
+    def __init__(self, connection, rfile, wfile):
+        self.connection = connection
+        self.rfile = rfile
+        self.wfile = wfile
+        self.events = set()
+        self._lock = threading.Lock()
+
+    def send(self, payload, opcode=0x1):
+        data = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+        size = len(data)
+        if size < 126:
+            header = struct.pack(">BB", 0x80 | opcode, size)
+        elif size < 65536:
+            header = struct.pack(">BBH", 0x80 | opcode, 126, size)
+        else:
+            header = struct.pack(">BBQ", 0x80 | opcode, 127, size)
+        with self._lock:
+            self.wfile.write(header + data)
+            self.wfile.flush()
+
+    def receive(self):
+        """(opcode, données) de la trame suivante, None si la connexion est fermée."""
+        head = self.rfile.read(2)
+        if len(head) < 2:
+            return None
+        size = head[1] & 0x7F
+        if size == 126:
+            size = struct.unpack(">H", self.rfile.read(2))[0]
+        elif size == 127:
+            size = struct.unpack(">Q", self.rfile.read(8))[0]
+        mask = self.rfile.read(4) if head[1] & 0x80 else None
+        data = self.rfile.read(size)
+        if mask:
+            data = bytes(b ^ mask[i % 4] for i, b in enumerate(data))
+        return head[0] & 0x0F, data
+
+    def close(self):
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+# ---------------- Serveur ----------------
+class FreeboxSimulator:
+    def __init__(self, app_token=None, host="127.0.0.1", port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                 errors=(500, 503, "drop"), login_latency=0.0, session_ttl=3600, recordings=None, seed=None):
+        self.app_token = app_token or default_app_token()
+        self.host = host
+        self.port = port
+        # Latence ajoutée à chaque requête (s) : latency + uniforme(0, jitter)
+        self.latency = latency
+        self.jitter = jitter
+        # Proportion de requêtes en erreur ; errors : codes HTTP ou "drop" (connexion coupée)
+        self.error_rate = error_rate
+        self.errors = tuple(errors)
+        self.login_latency = login_latency
+        self.session_ttl = session_ttl
+        self.rng = random.Random(seed)
+        self.generator = Generator(self.rng)
+        self.routes = self.generator.routes()
+        # Réponses enregistrées, rejouées en boucle dans l'ordre
+        self.recordings = recordings or {}
+        self._cursors = {}
+        self._challenges = deque(maxlen=8)
+        self._sessions = {}
+        self._sockets = set()
+        self._lock = threading.Lock()
+        self.stats = {"requests": 0, "logins": 0, "login_failures": 0, "auth_required": 0, "errors": 0,
+                      "notifications": 0}
+        self._server = None
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    def api_base(self, version="v15"):
+        return f"{self.url}/api/{version}"
+
+    # ---- Cycle de vie ----
+    def start(self):
+        self._server = ThreadingHTTPServer((self.host, self.port), self._handler())
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, name="freebox-simulator", daemon=True).start()
+        logger.info(f"Freebox simulée sur {self.url}")
+        return self
+
+    def stop(self):
+        self.drop_events()
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def revoke(self):
+        """Invalide toutes les sessions (expiration ou redémarrage de la box)."""
+        with self._lock:
+            self._sessions.clear()
+
+    def _count(self, key):
+        with self._lock:
+            self.stats[key] += 1
+
+    # ---- Session ----
+    def challenge(self):
+        value = secrets.token_hex(16)
+        with self._lock:
+            self._challenges.append(value)
+            logged_in = bool(self._sessions)
+        return {"logged_in": logged_in, "challenge": value, "password_salt": "", "password_set": True}
+
+    def open_session(self, body):
+        time.sleep(self.login_latency)
+        with self._lock:
+            challenges = list(self._challenges)
+        password = body.get("password", "")
+        # Challenge émis récemment : plusieurs clients peuvent s'authentifier en même temps
+        if not any(hmac.compare_digest(password, hmac.new(self.app_token.encode(), c.encode(), hashlib.sha1).hexdigest())
+                   for c in challenges):
+            self._count("login_failures")
+            return 403, {"success": False, "error_code": "invalid_token", "msg": "Erreur d'authentification"}
+        token = secrets.token_urlsafe(24)
+        with self._lock:
+            self._sessions[token] = time.time() + self.session_ttl
+            self.stats["logins"] += 1
+        return 200, {"success": True, "result": {"session_token": token, "challenge": challenges[-1],
+                                                 "permissions": {"settings": False, "explorer": True},
+                                                 "expires": self.session_ttl}}
+
+    def authorized(self, token):
+        with self._lock:
+            expire = self._sessions.get(token)
+            if expire is not None and expire < time.time():
+                del self._sessions[token]
+                expire = None
+        return expire is not None
+
+    # ---- Evénements ----
+    def events(self, handler):
+        """Connexion WebSocket /ws/event, servie jusqu'à sa fermeture."""
+        self._count("requests")
+        if not self.authorized(handler.headers.get("X-Fbx-App-Auth")):
+            self._count("auth_required")
+            return 403, {"success": False, "error_code": "auth_required", "msg": "Invalid session token, or not session token sent"}
+        key = handler.headers.get("Sec-WebSocket-Key", "")
+        accept = base64.b64encode(hashlib.sha1((key + WS_GUID).encode()).digest()).decode()
+        handler.send_response(101)
+        handler.send_header("Upgrade", "websocket")
+        handler.send_header("Connection", "Upgrade")
+        handler.send_header("Sec-WebSocket-Accept", accept)
+        handler.end_headers()
+        handler.wfile.flush()
+        sock = EventSocket(handler.connection, handler.rfile, handler.wfile)
+        with self._lock:
+            self._sockets.add(sock)
+        try:
+            while True:
+                frame = sock.receive()
+                if frame is None:
+                    break
+                opcode, data = frame
+                if opcode == 0x8:
+                    sock.send(data[:2], opcode=0x8)
+                    break
+                if opcode == 0x9:
+                    sock.send(data, opcode=0xA)
+                elif opcode == 0x1:
+                    message = json.loads(data)
+                    if message.get("action") == "register":
+                        sock.events = set(message.get("events", []))
+                        sock.send({"action": "register", "success": True})
+        except (OSError, ValueError):
+            pass
+        finally:
+            with self._lock:
+                self._sockets.discard(sock)
+        return None, None
+
+    def push(self, source, event, result):
+        """Notification envoyée aux clients abonnés à <source>_<event> ; nombre de clients."""
+        with self._lock:
+            sockets = [sock for sock in self._sockets if f"{source}_{event}" in sock.events]
+        message = {"action": "notification", "success": True, "source": source, "event": event, "result": result}
+        sent = 0
+        for sock in sockets:
+            try:
+                sock.send(message)
+                sent += 1
+            except OSError:
+                pass
+        with self._lock:
+            self.stats["notifications"] += sent
+        return sent
+
+    def drop_events(self):
+        """Coupe les WebSockets d'événements (redémarrage de la box, perte réseau)."""
+        with self._lock:
+            sockets = list(self._sockets)
+        for sock in sockets:
+            sock.close()
+
+    @property
+    def event_clients(self):
+        with self._lock:
+            return sum(1 for sock in self._sockets if sock.events)
+
+    def set_host_reachable(self, mac, reachable):
+        """Appareil qui rejoint ou quitte le réseau local (ajouté si inconnu)."""
+        host = next((h for h in self.generator.hosts if h["mac"] == mac), None)
+        if host is None:
+            host = self.generator.host(len(self.generator.hosts))
+            host["mac"] = mac
+            self.generator.hosts.append(host)
+        host["active"] = reachable
+        event = "l3addr_reachable" if reachable else "l3addr_unreachable"
+        return self.push("lan_host", event, self.generator.lan_host(host))
+
+    # ---- Endpoints ----
+    def result(self, path):
+        recorded = self.recordings.get(path)
+        if recorded:
+            with self._lock:
+                i = self._cursors.get(path, 0)
+                self._cursors[path] = i + 1
+            return 200, recorded[i % len(recorded)]
+        route = self.routes.get(path)
+        if route is None:
+            return 404, {"success": False, "error_code": "invalid_request", "msg": f"Endpoint inconnu : {path}"}
+        return 200, {"success": True, "result": route()}
+
+    def dispatch(self, method, path, headers, body):
+        """(statut, réponse) pour une requête ; statut None : connexion coupée."""
+        self._count("requests")
+        delay = self.latency + (self.rng.uniform(0, self.jitter) if self.jitter else 0)
+        if delay:
+            time.sleep(delay)
+        match = API_RE.match(path.split("?", 1)[0])
+        if not match:
+            return 404, {"success": False, "error_code": "invalid_request"}
+        path = match.group(1)
+        if self.error_rate and self.rng.random() < self.error_rate:
+            self._count("errors")
+            error = self.rng.choice(self.errors)
+            if error == "drop":
+                return None, None
+            return error, {"success": False, "error_code": "internal_error", "msg": "Erreur injectée"}
+        if path == "/login/" and method == "GET":
+            return 200, {"success": True, "result": self.challenge()}
+        if path == "/login/session/" and method == "POST":
+            return self.open_session(body)
+        if not self.authorized(headers.get("X-Fbx-App-Auth")):
+            self._count("auth_required")
+            return 403, {"success": False, "error_code": "auth_required", "msg": "Invalid session token, or not session token sent"}
+        return self.result(path)
+
+    def _handler(self):
+        simulator = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                self.request.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def _handle(self, method):
+                if self.headers.get("Upgrade", "").lower() == "websocket":
+                    match = API_RE.match(self.path.split("?", 1)[0])
+                    if match and match.group(1) == "/ws/event":
+                        status, payload = simulator.events(self)
+                        if status is None:
+                            self.close_connection = True
+                            return
+                        return self._reply(status, payload)
+                body = {}
+                length = int(self.headers.get("Content-Length", 0))
+                if length:
+                    try:
+                        body = json.loads(self.rfile.read(length))
+                    except ValueError:
+                        pass
+                status, payload = simulator.dispatch(method, self.path, self.headers, body)
+                if status is None:
+                    self.close_connection = True
+                    self.connection.shutdown(socket.SHUT_RDWR)
+                    return
+                self._reply(status, payload)
+
+            def _reply(self, status, payload):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                self._handle("GET")
+
+            def do_POST(self):
+                self._handle("POST")
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+
+# ---------------- Lancement direct ----------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Freebox OS simulée")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--latency", type=float, default=0, help="latence par requête (ms)")
+    parser.add_argument("--jitter", type=float, default=0, help="gigue ajoutée (ms)")
+    parser.add_argument("--login-latency", type=float, default=0, help="durée d'ouverture de session (ms)")
+    parser.add_argument("--errors", type=float, default=0, help="proportion de requêtes en erreur (0-1)")
+    parser.add_argument("--session-ttl", type=int, default=3600)
+    parser.add_argument("--replay", help="dossier data_<nom>.json ou dossier de stockage à rejouer")
+    parser.add_argument("--seed", type=int)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    sim = FreeboxSimulator(host=args.host, port=args.port, latency=args.latency / 1000, jitter=args.jitter / 1000,
+                           login_latency=args.login_latency / 1000, error_rate=args.errors,
+                           session_ttl=args.session_ttl, seed=args.seed,
+                           recordings=load_recordings(args.replay) if args.replay else None)
+    sim.start()
+    logger.info(f"Endpoints rejoués : {sorted(sim.recordings) or 'aucun'}")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        sim.stop()
+        sys.exit(0)
@@ -0,0 +1,45 @@
+# freebox_snapshots.py - dernier état connu de chaque série, en mémoire
+#
+# save_data() y range chaque réponse reçue par les pollers avec sa date. Les pages
+# /category et l'API /api/snapshot/<nom> lisent ce registre en O(1) et ne retournent
+# vers la Freebox que si le snapshot est plus vieux que le max_age demandé.
+
+import time, threading
+
+
+class SnapshotRegistry:
+    def __init__(self, fallback=None):
+        # fallback(nom) -> {"ts", "data"} ou None : amorçage depuis le stockage au premier accès
+        self.fallback = fallback
+        self._snapshots = {}
+        self._lock = threading.Lock()
+
+    def put(self, name, data, ts=None):
+        with self._lock:
+            self._snapshots[name] = (time.time() if ts is None else ts, data)
+
+    def touch(self, name, ts=None):
+        """Réponse identique à la précédente (polling adaptatif) : seule la date est rafraîchie."""
+        with self._lock:
+            if name in self._snapshots:
+                self._snapshots[name] = (time.time() if ts is None else ts, self._snapshots[name][1])
+
+    def get(self, name, max_age=None):
+        """(ts, data) si un snapshot existe et a moins de max_age secondes, sinon None."""
+        snapshot = self._snapshots.get(name)
+        if snapshot is None and self.fallback is not None:
+            try:
+                record = self.fallback(name)
+            except ValueError:
+                record = None
+            if record is not None:
+                with self._lock:
+                    snapshot = self._snapshots.setdefault(name, (record["ts"], record["data"]))
+        if snapshot is None:
+            return None
+        if max_age is not None and time.time() - snapshot[0] > max_age:
+            return None
+        return snapshot
+
+    def names(self):
+        return sorted(self._snapshots)
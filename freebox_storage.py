@@ -0,0 +1,708 @@
+# freebox_storage.py - stockage des séries temporelles Freebox
+#
+# Les échantillons sont rangés par série et par jour (UTC) :
+#   data/<serie>/<AAAA-MM-JJ>.jsonl  -> un enregistrement JSON par ligne {"ts": ..., "data": ...}
+#   data/<serie>/<AAAA-MM-JJ>.idx    -> index binaire à largeur fixe (ts int64, offset int64)
+#
+# Mode compact (config "storage.mode": "compact") pour status / wifi / dhcp :
+#   data/<serie>/<AAAA-MM-JJ>.state  -> journal dédupliqué des états (champs peu changeants)
+#   data/<serie>/<AAAA-MM-JJ>.col    -> enregistrements binaires à largeur fixe
+#                                       (ts uint32, id d'état uint32, colonnes uint32 / int64)
+# Le document d'origine est reconstruit à la lecture (état + colonnes).
+#
+# Rétention (config "retention") : les segments clos anciens sont compressés (.gz, et
+# convertis au format compact si besoin), puis supprimés au-delà de la durée de conservation.
+#
+# Une requête sur une période ne lit que les segments concernés, cherche par
+# dichotomie le premier enregistrement dans l'index puis se positionne
+# directement sur la bonne ligne : seules les lignes retournées sont décodées.
+#
+# Le dernier segment écrit de chaque série garde ses fichiers ouverts en ajout ; chaque
+# lot est écrit d'un bloc puis vidé (flush), et synchronisé sur disque (fsync) à la demande.
+#
+# Migration unique des anciens fichiers data/data_<nom>.json :
+#   python freebox_storage.py migrate [dossier_data]
+
+import os, re, sys, gzip, json, glob, time, shutil, struct, calendar, logging, threading
+from array import array
+from bisect import bisect_left, bisect_right
+
+logger = logging.getLogger("freebox.storage")
+
+# Pas de nom commençant par un point ("." et ".." sortiraient du data_dir)
+SERIES_RE = re.compile(r"^[A-Za-z0-9_-][A-Za-z0-9_.-]*$")
+INDEX_ENTRY = struct.Struct("<qq")
+DAY_SECONDS = 86400
+
+
+def day_of(ts):
+    """Nom du segment (jour UTC) contenant le timestamp."""
+    return time.strftime("%Y-%m-%d", time.gmtime(ts))
+
+
+def day_start(day):
+    return calendar.timegm(time.strptime(day, "%Y-%m-%d"))
+
+
+def _open_data(path):
+    """Ouvre un fichier de données, en clair ou compressé (.gz) par la compaction."""
+    try:
+        return open(path, "rb")
+    except FileNotFoundError:
+        return gzip.open(path + ".gz", "rb")
+
+
+def _prepare_gzip(path):
+    """Compresse path vers un fichier temporaire, sans verrou.
+
+    Renvoie une fonction à appeler sous le verrou de la série pour activer la version .gz
+    (abandon si le fichier a changé entre-temps)."""
+    size = os.path.getsize(path)
+    tmp = path + ".gz.tmp"
+    with open(path, "rb") as src, gzip.open(tmp, "wb") as dst:
+        shutil.copyfileobj(src, dst)
+
+    def commit():
+        if os.path.getsize(path) != size:
+            os.remove(tmp)
+            return False
+        os.replace(tmp, path + ".gz")
+        os.remove(path)
+        return True
+    return commit
+
+
+def _load_index(path):
+    """Charge un fichier .idx -> (timestamps, offsets)."""
+    arr = array("q")
+    try:
+        with open(path, "rb") as f:
+            arr.frombytes(f.read())
+    except FileNotFoundError:
+        return array("q"), array("q")
+    if len(arr) % 2:
+        arr = arr[:-1]
+    if sys.byteorder == "big":
+        arr.byteswap()
+    return arr[0::2], arr[1::2]
+
+
+# ---------------- Segment JSON indexé ----------------
+class JsonSegment:
+    """Segment journalier : lignes JSON + index (ts, offset)."""
+
+    def __init__(self, base):
+        self.base = base
+        self.data_path = base + ".jsonl"
+        self.index_path = base + ".idx"
+        self._files = None     # (données, index) ouverts en ajout
+
+    def exists(self):
+        return os.path.exists(self.data_path) or self.compressed()
+
+    def compressed(self):
+        return os.path.exists(self.data_path + ".gz")
+
+    def append(self, records, sync=False):
+        self.append_lines([(int(ts), (json.dumps({"ts": int(ts), "data": data}) + "\n").encode("utf-8"))
+                           for ts, data in records], sync)
+
+    def append_lines(self, entries, sync=False):
+        """entries : liste de (ts, ligne encodée en bytes terminée par \\n)."""
+        if self._files is None:
+            self._files = (open(self.data_path, "ab"), open(self.index_path, "ab"))
+        f, idx = self._files
+        offset = f.seek(0, os.SEEK_END)
+        lines, index = [], bytearray()
+        for ts, line in entries:
+            lines.append(line)
+            index += INDEX_ENTRY.pack(ts, offset)
+            offset += len(line)
+        # Les lignes sont écrites avant l'index qui les référence
+        f.write(b"".join(lines))
+        f.flush()
+        idx.write(index)
+        idx.flush()
+        if sync:
+            os.fsync(f.fileno())
+            os.fsync(idx.fileno())
+
+    def close(self):
+        if self._files is not None:
+            for f in self._files:
+                f.close()
+            self._files = None
+
+    def repair(self):
+        """Reconstruit l'index s'il ne correspond plus au fichier (arrêt brutal)."""
+        if not os.path.exists(self.data_path):
+            return
+        size = os.path.getsize(self.data_path)
+        stamps, offsets = _load_index(self.index_path)
+        if offsets:
+            with open(self.data_path, "rb") as f:
+                f.seek(offsets[-1])
+                last = f.readline()
+            if last.endswith(b"\n") and offsets[-1] + len(last) == size \
+                    and os.path.getsize(self.index_path) == len(offsets) * INDEX_ENTRY.size:
+                return
+        elif size == 0:
+            return
+        self.rebuild_index()
+
+    def rebuild_index(self):
+        logger.warning(f"Reconstruction de l'index {self.index_path}")
+        index = bytearray()
+        offset = 0
+        with open(self.data_path, "rb+") as f:
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Ligne partielle en fin de fichier : on la tronque
+                    f.truncate(offset)
+                    break
+                try:
+                    ts = int(json.loads(line)["ts"])
+                except (ValueError, KeyError, TypeError):
+                    offset += len(line)
+                    continue
+                index += INDEX_ENTRY.pack(ts, offset)
+                offset += len(line)
+        with open(self.index_path, "wb") as idx:
+            idx.write(index)
+
+    def rewrite(self, records):
+        """Réécrit le segment (fichiers temporaires puis remplacement atomique)."""
+        tmp = JsonSegment(self.base + ".tmp")
+        tmp.remove()
+        tmp.append(records)
+        tmp.close()
+        self.close()
+        os.replace(tmp.index_path, self.index_path)
+        os.replace(tmp.data_path, self.data_path)
+        # Segment déjà compressé : l'ancienne version ne doit plus être lue
+        if os.path.exists(self.data_path + ".gz"):
+            os.remove(self.data_path + ".gz")
+
+    def remove(self):
+        self.close()
+        for path in (self.data_path, self.data_path + ".gz", self.index_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def compress(self):
+        return _prepare_gzip(self.data_path)
+
+    def last(self):
+        stamps, offsets = _load_index(self.index_path)
+        if not offsets:
+            return None
+        with _open_data(self.data_path) as f:
+            f.seek(offsets[-1])
+            return json.loads(f.readline())
+
+    def count(self):
+        try:
+            return os.path.getsize(self.index_path) // INDEX_ENTRY.size
+        except FileNotFoundError:
+            return 0
+
+    def read(self, start=None, end=None):
+        stamps, offsets = _load_index(self.index_path)
+        lo = bisect_left(stamps, start) if start is not None else 0
+        hi = bisect_right(stamps, end) if end is not None else len(stamps)
+        if lo >= hi:
+            return
+        with _open_data(self.data_path) as f:
+            f.seek(offsets[lo])
+            for _ in range(hi - lo):
+                line = f.readline()
+                if not line:
+                    break
+                yield json.loads(line)
+
+
+# ---------------- Segment colonnaire (mode compact) ----------------
+# Colonnes numériques qui changent à chaque poll, lues dans data["result"] :
+# (nom, format struct) - "I" pour les débits (octets/s), "q" pour les compteurs cumulés
+COMPACT_COLUMNS = {
+    "status": (("rate_down", "I"), ("rate_up", "I"), ("bytes_down", "q"), ("bytes_up", "q")),
+    "wifi": (("stations_count", "I"),),
+    "dhcp": (),
+}
+# Valeur réservée "champ absent" et bornes acceptées pour chaque format
+MISSING = {"I": 2 ** 32 - 1, "q": -2 ** 63}
+BOUNDS = {"I": (0, 2 ** 32 - 2), "q": (-2 ** 63 + 1, 2 ** 63 - 1)}
+
+
+class ColumnarSegment:
+    """Segment journalier compact : journal d'états dédupliqués + colonnes à largeur fixe."""
+
+    def __init__(self, base, columns):
+        self.base = base
+        self.columns = tuple(columns)
+        self.data_path = base + ".col"
+        self.state_path = base + ".state"
+        self.record = struct.Struct("<II" + "".join(fmt for _, fmt in self.columns))
+        self.missing = [MISSING[fmt] for _, fmt in self.columns]
+        self._states = {}      # état encodé -> id
+        self._templates = []   # id -> document modèle
+        self._state_offset = 0
+        # Protège le journal d'états (lecteurs et écrivain) et les fichiers ouverts
+        self._lock = threading.RLock()
+        self._files = None     # (états, données) ouverts en ajout
+
+    def exists(self):
+        return os.path.exists(self.data_path) or self.compressed()
+
+    def compressed(self):
+        return os.path.exists(self.data_path + ".gz")
+
+    def _load_states(self):
+        """Charge les états ajoutés depuis la dernière lecture (le journal ne fait que croître)."""
+        with self._lock:
+            try:
+                with open(self.state_path, "rb") as f:
+                    f.seek(self._state_offset)
+                    for line in f:
+                        if not line.endswith(b"\n"):
+                            break
+                        self._states[line.rstrip(b"\n")] = len(self._templates)
+                        self._templates.append(json.loads(line))
+                        self._state_offset += len(line)
+            except FileNotFoundError:
+                pass
+
+    def _split(self, data):
+        """Sépare le document en (modèle, valeurs des colonnes)."""
+        values = list(self.missing)
+        result = data.get("result") if isinstance(data, dict) else None
+        if not isinstance(result, dict) or not self.columns:
+            return data, values
+        template = dict(result)
+        for i, (column, fmt) in enumerate(self.columns):
+            value = template.get(column)
+            lo, hi = BOUNDS[fmt]
+            # Valeur hors format : elle reste dans l'état
+            if type(value) is int and lo <= value <= hi:
+                values[i] = value
+                template[column] = None  # conserve l'ordre des clés
+        return dict(data, result=template), values
+
+    def _state_id(self, template, state_file):
+        # Appelé sous self._lock (append)
+        key = json.dumps(template, separators=(",", ":")).encode("utf-8")
+        state_id = self._states.get(key)
+        if state_id is None:
+            state_id = len(self._templates)
+            state_file.write(key + b"\n")
+            self._state_offset += len(key) + 1
+            self._states[key] = state_id
+            self._templates.append(json.loads(key))
+        return state_id
+
+    def append(self, records, sync=False):
+        # Un lecteur ne doit pas relire le journal d'états pendant qu'on y ajoute des lignes
+        with self._lock:
+            self._load_states()
+            if self._files is None:
+                self._files = (open(self.state_path, "ab"), open(self.data_path, "ab"))
+            states, f = self._files
+            packed = bytearray()
+            for ts, data in records:
+                template, values = self._split(data)
+                packed += self.record.pack(int(ts), self._state_id(template, states), *values)
+            # Les états sont écrits avant les enregistrements qui les référencent
+            states.flush()
+            f.write(packed)
+            f.flush()
+            if sync:
+                os.fsync(states.fileno())
+                os.fsync(f.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._files is not None:
+                for f in self._files:
+                    f.close()
+                self._files = None
+
+    def _build(self, ts, state_id, values):
+        template = self._templates[state_id]
+        if not self.columns or not isinstance(template.get("result"), dict):
+            return {"ts": ts, "data": template}
+        result = dict(template["result"])
+        for (column, _), value, missing in zip(self.columns, values, self.missing):
+            if value != missing:
+                result[column] = value
+        return {"ts": ts, "data": dict(template, result=result)}
+
+    def repair(self):
+        """Tronque un enregistrement ou un état partiel (arrêt brutal)."""
+        if not os.path.exists(self.data_path):
+            return
+        size = os.path.getsize(self.data_path)
+        if size % self.record.size:
+            logger.warning(f"Enregistrement partiel tronqué dans {self.data_path}")
+            with open(self.data_path, "rb+") as f:
+                f.truncate(size - size % self.record.size)
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "rb+") as f:
+                content = f.read()
+                if content and not content.endswith(b"\n"):
+                    f.truncate(content.rfind(b"\n") + 1)
+
+    def _read_buffer(self):
+        try:
+            with _open_data(self.data_path) as f:
+                buf = f.read()
+        except FileNotFoundError:
+            return b""
+        return buf[:len(buf) - len(buf) % self.record.size]
+
+    def read(self, start=None, end=None):
+        buf = self._read_buffer()
+        size = self.record.size
+        stamps = _Stamps(buf, size)
+        lo = bisect_left(stamps, start) if start is not None else 0
+        hi = bisect_right(stamps, end) if end is not None else len(stamps)
+        if lo >= hi:
+            return
+        self._load_states()
+        for fields in self.record.iter_unpack(memoryview(buf)[lo * size:hi * size]):
+            yield self._build(fields[0], fields[1], fields[2:])
+
+    def last(self):
+        buf = self._read_buffer()
+        if not buf:
+            return None
+        self._load_states()
+        fields = self.record.unpack_from(buf, len(buf) - self.record.size)
+        return self._build(fields[0], fields[1], fields[2:])
+
+    def count(self):
+        try:
+            return os.path.getsize(self.data_path) // self.record.size
+        except FileNotFoundError:
+            return len(self._read_buffer()) // self.record.size
+
+    def rewrite(self, records):
+        self.stage(records)()
+
+    def stage(self, records):
+        """Ecrit les enregistrements dans des fichiers temporaires ; renvoie la fonction
+        qui les met en place."""
+        tmp = ColumnarSegment(self.base + ".tmp", self.columns)
+        tmp.remove()
+        tmp.append(records)
+        tmp.close()
+
+        def commit():
+            with self._lock:
+                self.close()
+                os.replace(tmp.state_path, self.state_path)
+                os.replace(tmp.data_path, self.data_path)
+                if os.path.exists(self.data_path + ".gz"):
+                    os.remove(self.data_path + ".gz")
+                self._states, self._templates, self._state_offset = {}, [], 0
+        return commit
+
+    def remove(self):
+        self.close()
+        for path in (self.data_path, self.data_path + ".gz", self.state_path):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def compress(self):
+        return _prepare_gzip(self.data_path)
+
+
+class _Stamps:
+    """Vue des timestamps d'un buffer d'enregistrements, pour bisect."""
+
+    def __init__(self, buf, size):
+        self.buf = buf
+        self.size = size
+
+    def __len__(self):
+        return len(self.buf) // self.size
+
+    def __getitem__(self, i):
+        return struct.unpack_from("<I", self.buf, i * self.size)[0]
+
+
+# ---------------- Store ----------------
+class TimeSeriesStore:
+    """Stockage des séries temporelles, partitionné par jour et indexé par timestamp."""
+
+    def __init__(self, root, compact_series=()):
+        self.root = root
+        self.compact_series = set(compact_series)
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+        self._segments = {}
+        self._checked = set()
+        self._open = {}        # série -> segment dont les fichiers sont ouverts
+
+    # ---- Helpers ----
+    def _series_dir(self, series):
+        if not SERIES_RE.match(series or ""):
+            raise ValueError(f"Nom de série invalide : {series!r}")
+        return os.path.join(self.root, series)
+
+    def _lock(self, series):
+        with self._locks_guard:
+            return self._locks.setdefault(series, threading.Lock())
+
+    def _segment(self, series, day):
+        """Segment d'un jour : format existant sur disque, sinon format configuré."""
+        base = os.path.join(self._series_dir(series), day)
+        with self._locks_guard:
+            segment = self._segments.get(base)
+            if segment is None or not segment.exists():
+                if os.path.exists(base + ".col") or os.path.exists(base + ".col.gz") or (
+                        series in self.compact_series and not JsonSegment(base).exists()):
+                    segment = ColumnarSegment(base, COMPACT_COLUMNS.get(series, ()))
+                else:
+                    segment = JsonSegment(base)
+                self._segments[base] = segment
+            return segment
+
+    def segments(self, series):
+        """Jours disponibles pour une série, triés."""
+        try:
+            names = os.listdir(self._series_dir(series))
+        except FileNotFoundError:
+            return []
+        return sorted({n.split(".", 1)[0] for n in names
+                       if n.endswith((".jsonl", ".col", ".jsonl.gz", ".col.gz")) and ".tmp." not in n})
+
+    def series(self):
+        try:
+            return sorted(n for n in os.listdir(self.root)
+                          if SERIES_RE.match(n) and os.path.isdir(os.path.join(self.root, n)))
+        except FileNotFoundError:
+            return []
+
+    def has_series(self, series):
+        try:
+            return bool(self.segments(series))
+        except ValueError:
+            return False
+
+    # ---- Ecriture ----
+    def append(self, series, data, ts=None):
+        ts = int(time.time()) if ts is None else int(ts)
+        self.append_many(series, [(ts, data)])
+        return ts
+
+    def append_many(self, series, records, sync=False):
+        """Ajoute des enregistrements (ts, data) en ordre chronologique ; sync : fsync du lot."""
+        by_day = {}
+        for ts, data in records:
+            by_day.setdefault(day_of(ts), []).append((int(ts), data))
+        self._write(series, by_day, sync)
+
+    def _write(self, series, by_day, sync=False):
+        os.makedirs(self._series_dir(series), exist_ok=True)
+        with self._lock(series):
+            for day in sorted(by_day):
+                segment = self._segment(series, day)
+                if segment.base not in self._checked:
+                    segment.repair()
+                    self._checked.add(segment.base)
+                # Un seul segment ouvert par série : le précédent est fermé
+                previous = self._open.get(series)
+                if previous is not None and previous is not segment:
+                    previous.close()
+                self._open[series] = segment
+                segment.append(by_day[day], sync)
+
+    def close(self):
+        """Ferme les fichiers gardés ouverts pour l'écriture."""
+        with self._locks_guard:
+            segments, self._open = list(self._open.items()), {}
+        for series, segment in segments:
+            # Jamais pendant une écriture en cours sur la série
+            with self._lock(series):
+                segment.close()
+
+    # ---- Lecture ----
+    def query(self, series, start=None, end=None):
+        """Itère sur les enregistrements {"ts", "data"} avec start <= ts <= end."""
+        for day in self.segments(series):
+            first = day_start(day)
+            if start is not None and first + DAY_SECONDS <= start:
+                continue
+            if end is not None and first > end:
+                break
+            for attempt in range(2):
+                try:
+                    yield from self._segment(series, day).read(start, end)
+                    break
+                except FileNotFoundError:
+                    # Segment compacté ou supprimé pendant la lecture : on le résout à nouveau,
+                    # sous le verrou de la série (ses fichiers peuvent être utilisés par l'écrivain)
+                    with self._lock(series):
+                        self._forget(series, day)
+
+    def last(self, series):
+        """Dernier enregistrement de la série (ou None)."""
+        for day in reversed(self.segments(series)):
+            record = self._segment(series, day).last()
+            if record is not None:
+                return record
+        return None
+
+    def count(self, series):
+        return sum(self._segment(series, day).count() for day in self.segments(series))
+
+    # ---- Rétention & compaction ----
+    def drop_before(self, series, cutoff):
+        """Supprime les segments entièrement antérieurs à cutoff."""
+        dropped = 0
+        for day in self.segments(series):
+            if day_start(day) + DAY_SECONDS > cutoff:
+                break
+            with self._lock(series):
+                self._segment(series, day).remove()
+                self._forget(series, day)
+            dropped += 1
+        return dropped
+
+    def compact(self, series, cutoff):
+        """Compresse les segments clos antérieurs à cutoff (conversion compacte si configurée).
+
+        La compression se fait hors verrou : seuls les remplacements de fichiers bloquent
+        brièvement les écritures, et les lecteurs gardent leurs descripteurs ouverts."""
+        compacted = 0
+        for day in self.segments(series):
+            if day_start(day) + DAY_SECONDS > cutoff:
+                break
+            segment = self._segment(series, day)
+            if series in self.compact_series and isinstance(segment, JsonSegment):
+                converted = ColumnarSegment(segment.base, COMPACT_COLUMNS.get(series, ()))
+                commit = converted.stage([(r["ts"], r["data"]) for r in segment.read()])
+                with self._lock(series):
+                    commit()
+                    segment.remove()
+                    self._forget(series, day)
+                segment = self._segment(series, day)
+            if segment.compressed():
+                continue
+            commit = segment.compress()
+            with self._lock(series):
+                segment.close()
+                if commit():
+                    compacted += 1
+                self._forget(series, day)
+        return compacted
+
+    def _forget(self, series, day):
+        with self._locks_guard:
+            segment = self._segments.pop(os.path.join(self._series_dir(series), day), None)
+            if segment is not None and self._open.get(series) is segment:
+                del self._open[series]
+        if segment is not None:
+            segment.close()
+
+
+# ---------------- Rétention ----------------
+# Séries ni brutes ni paliers d'agrégats, déclarées par leur module : "history" pour les
+# journaux gardés history_months mois (changements d'appareils, appels, volumes par période...)
+RETENTION_CLASSES = {}
+
+
+def register_retention(series, kind):
+    RETENTION_CLASSES[series] = kind
+
+
+def retention_days(series, retention, tiers=()):
+    """Durée de conservation d'une série en jours (0 : illimitée).
+
+    tiers : noms des paliers d'agrégats ("1m", "5m", "1h") ; "<serie>.<palier>" est gardée
+    tier_days[palier] jours (rollup_months à défaut). Les autres séries sont brutes (raw_days)."""
+    rollup_days = retention.get("rollup_months", 12) * 31
+    if RETENTION_CLASSES.get(series) == "history":
+        return retention.get("history_months", retention.get("rollup_months", 12)) * 31
+    base, _, tier = series.rpartition(".")
+    if base and tier in tiers:
+        return retention.get("tier_days", {}).get(tier, rollup_days)
+    return retention.get("raw_days", 30)
+
+
+def apply_retention(store, retention, now=None, tiers=(), checkpoints=None):
+    """Applique la section "retention" de config.json à toutes les séries du store.
+
+    checkpoints : série -> fonction(cutoff, ts) appelée avant d'en supprimer des segments, pour
+    écrire l'état complet que les changements supprimés ne permettraient plus de reconstruire."""
+    now = time.time() if now is None else now
+    compress_days = retention.get("compress_after_days", 2)
+    checkpoints = checkpoints or {}
+    report = {}
+    for series in store.series():
+        keep_days = retention_days(series, retention, tiers)
+        cutoff = now - keep_days * DAY_SECONDS
+        days = store.segments(series) if keep_days and series in checkpoints else []
+        if days and day_start(days[0]) + DAY_SECONDS <= cutoff:
+            checkpoints[series](cutoff, now)
+        dropped = store.drop_before(series, cutoff) if keep_days else 0
+        compacted = store.compact(series, now - compress_days * DAY_SECONDS)
+        if dropped or compacted:
+            report[series] = {"dropped": dropped, "compacted": compacted}
+    return report
+
+
+def store_from_config(data_dir, config):
+    """Construit le store selon la section "storage" de config.json."""
+    storage = config.get("storage", {})
+    compact = storage.get("compact_series", list(COMPACT_COLUMNS)) if storage.get("mode") == "compact" else ()
+    return TimeSeriesStore(data_dir, compact_series=compact)
+
+
+# ---------------- Migration ----------------
+def migrate_legacy(data_dir, store):
+    """Importe les anciens fichiers data_<nom>.json puis les renomme en .migrated."""
+    migrated = {}
+    for path in sorted(glob.glob(os.path.join(data_dir, "data_*.json"))):
+        series = os.path.basename(path)[len("data_"):-len(".json")]
+        by_day = {}
+        count = 0
+        with open(path, "rb") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    ts = int(entry["ts"])
+                except (ValueError, KeyError, TypeError):
+                    logger.warning(f"Ligne ignorée dans {path}")
+                    continue
+                by_day.setdefault(day_of(ts), []).append((ts, entry.get("data")))
+                count += 1
+        os.makedirs(store._series_dir(series), exist_ok=True)
+        with store._lock(series):
+            for day, records in by_day.items():
+                segment = store._segment(series, day)
+                if segment.exists():
+                    # Le segment a déjà reçu des données : fusion triée puis réécriture
+                    segment.repair()
+                    records.extend((r["ts"], r["data"]) for r in segment.read())
+                records.sort(key=lambda record: record[0])
+                segment.rewrite(records)
+        os.replace(path, path + ".migrated")
+        migrated[series] = count
+        logger.info(f"Migration {series} : {count} enregistrements")
+    return migrated
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(levelname)s] %(message)s")
+    if len(sys.argv) < 2 or sys.argv[1] != "migrate":
+        print("Usage : python freebox_storage.py migrate [dossier_data]")
+        sys.exit(1)
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    data_dir = sys.argv[2] if len(sys.argv) > 2 else os.path.join(base_dir, "data")
+    with open(os.path.join(base_dir, "config.json"), "r", encoding="utf-8") as f:
+        config = json.load(f)
+    result = migrate_legacy(data_dir, store_from_config(data_dir, config))
+    print(f"Migration terminée : {result}")
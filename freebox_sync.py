@@ -0,0 +1,191 @@
+# freebox_sync.py - copie locale du journal d'appels et des téléchargements
+#
+# /calllog/ et /downloads/ renvoient toujours la liste complète (pas de pagination côté box).
+# Les jobs "calls" et "downloads" comparent chaque réponse à une copie locale et n'écrivent que
+# ce qui est nouveau :
+# - journal d'appels : curseur (date, id) du dernier appel vu, seuls les appels plus récents
+#   sont ajoutés (un journal remis à zéro par la box repart avec des dates plus récentes)
+# - téléchargements : tâches indexées par id, état mis à jour sur place ; seuls les champs
+#   modifiés sont écrits (débits et eta, instantanés, ne sont gardés qu'en mémoire)
+# Les pages /category/calls et /category/downloads (et /api/calls, /api/downloads) sont
+# paginées et filtrées depuis cette copie. Au démarrage, elle est reconstruite en rejouant les
+# séries "calls.log" et "downloads.changes". Avant que la rétention ne supprime d'anciens
+# changements de téléchargements, l'état complet des tâches est écrit (checkpoint) : le rejeu
+# repart de ce point.
+
+import math, logging, threading
+from freebox_storage import register_retention
+
+logger = logging.getLogger("freebox.sync")
+
+# Champs instantanés des tâches de téléchargement, non écrits
+VOLATILE = ("rx_rate", "tx_rate", "eta")
+
+
+class LocalSync:
+    """Copie locale d'une liste Freebox, reconstruite depuis la série des éléments écrits."""
+
+    series = None
+
+    def __init__(self, store):
+        self.store = store
+        self._recovered = False
+        self._lock = threading.Lock()
+
+    def _recover(self):
+        if self._recovered:
+            return
+        self._recovered = True
+        count = 0
+        for record in self.store.query(self.series):
+            if record["data"].get("checkpoint"):
+                # Etat complet : remplace tout ce qui précède
+                self._reset()
+            for item in record["data"].get("result") or []:
+                self._apply(item, record["ts"])
+                count += 1
+        if count:
+            logger.info(f"{self.series} : {count} éléments rejoués")
+
+    def sync(self, items, ts):
+        """Réponse complète de la box : éléments nouveaux ou modifiés, écrits dans la série."""
+        ts = int(ts)
+        with self._lock:
+            self._recover()
+            changes = self._diff([i for i in items or [] if isinstance(i, dict) and "id" in i], ts)
+            for change in changes:
+                self._apply(change, ts)
+            if changes:
+                self.store.append(self.series, {"success": True, "result": changes}, ts=ts)
+            return changes
+
+    def page(self, page=1, per_page=50, **filters):
+        """Page de la copie locale (plus récents d'abord) ; filters : voir _rows."""
+        with self._lock:
+            self._recover()
+            rows = self._rows(**{k: v for k, v in filters.items() if v not in (None, "")})
+        pages = max(1, math.ceil(len(rows) / per_page))
+        page = min(max(1, page), pages)
+        return {"total": len(rows), "page": page, "pages": pages, "per_page": per_page,
+                "items": [dict(row) for row in rows[(page - 1) * per_page:page * per_page]]}
+
+    def __len__(self):
+        with self._lock:
+            self._recover()
+            return self._count()
+
+
+class CallLog(LocalSync):
+    series = "calls.log"
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._calls = []        # du plus ancien au plus récent
+        self.cursor = (0, 0)    # (date, id) du dernier appel écrit
+
+    @staticmethod
+    def key(call):
+        return call.get("datetime") or 0, call["id"]
+
+    def _diff(self, calls, ts):
+        return sorted((c for c in calls if self.key(c) > self.cursor), key=self.key)
+
+    def _apply(self, call, ts):
+        self._calls.append(call)
+        self.cursor = max(self.cursor, self.key(call))
+
+    def _count(self):
+        return len(self._calls)
+
+    def _rows(self, type=None, number=None, since=None):
+        # type : missed / accepted / outgoing ; number : numéro ou nom (partiel) ; since : date minimale
+        rows = self._calls[::-1]
+        if type is not None:
+            rows = [c for c in rows if c.get("type") == type]
+        if number is not None:
+            needle = number.lower()
+            rows = [c for c in rows if needle in (c.get("number") or "") or needle in (c.get("name") or "").lower()]
+        if since is not None:
+            rows = [c for c in rows if (c.get("datetime") or 0) >= since]
+        return rows
+
+
+register_retention(CallLog.series, "history")
+
+
+class DownloadTasks(LocalSync):
+    series = "downloads.changes"
+
+    def __init__(self, store):
+        super().__init__(store)
+        self._tasks = {}        # id -> tâche (les tâches supprimées de la box restent, removed)
+
+    def _diff(self, tasks, ts):
+        changes, seen = [], set()
+        for task in tasks:
+            seen.add(task["id"])
+            known = self._tasks.get(task["id"])
+            if known is None or known.get("removed"):
+                changes.append(dict(task, change="added"))
+                continue
+            fields = {k: v for k, v in task.items() if known.get(k) != v}
+            # Débits et eta mis à jour sur place, sans écriture
+            for k in VOLATILE:
+                if k in fields:
+                    known[k] = fields.pop(k)
+            if fields:
+                changes.append(dict(fields, id=task["id"], change="updated"))
+        changes += [{"id": task_id, "change": "removed"} for task_id, known in self._tasks.items()
+                    if task_id not in seen and not known.get("removed")]
+        return changes
+
+    def _reset(self):
+        self._tasks.clear()
+
+    def checkpoint(self, cutoff, ts):
+        """Ecrit l'état complet des tâches avant une purge de rétention (changements < cutoff).
+
+        Les tâches supprimées de la box avant cutoff sont oubliées."""
+        ts = int(ts)
+        with self._lock:
+            self._recover()
+            tasks = [dict(task, change="checkpoint") for task in self._tasks.values()
+                     if not (task.get("removed") and task["updated"] < cutoff)]
+            self._reset()
+            for task in tasks:
+                self._apply(task, ts)
+            self.store.append(self.series, {"success": True, "result": tasks, "checkpoint": True}, ts=ts)
+        logger.info(f"{self.series} : checkpoint de {len(tasks)} tâches")
+        return len(tasks)
+
+    def _apply(self, change, ts):
+        fields = {k: v for k, v in change.items() if k != "change"}
+        if change["change"] == "checkpoint":
+            self._tasks[change["id"]] = fields
+            return
+        if change["change"] == "added":
+            task = self._tasks[change["id"]] = dict(fields, first_seen=ts)
+        else:
+            task = self._tasks.setdefault(change["id"], {"id": change["id"], "first_seen": ts})
+            task.update(fields)
+        if change["change"] == "removed":
+            task.update(removed=True, rx_rate=0, tx_rate=0)
+        task["updated"] = ts
+
+    def _count(self):
+        return len(self._tasks)
+
+    def _rows(self, status=None, name=None):
+        # status : downloading, seeding, done, stopped, error... ou removed (supprimées de la box)
+        rows = sorted(self._tasks.values(), key=lambda t: (t.get("created_ts") or t["first_seen"], t["id"]),
+                      reverse=True)
+        if status == "removed":
+            rows = [t for t in rows if t.get("removed")]
+        elif status is not None:
+            rows = [t for t in rows if t.get("status") == status and not t.get("removed")]
+        if name is not None:
+            rows = [t for t in rows if name.lower() in (t.get("name") or "").lower()]
+        return rows
+
+
+register_retention(DownloadTasks.series, "history")
@@ -1,30 +1,29 @@
 # Nécessite l'installation de 'apscheduler: pip install apscheduler
 
-import time
+# freebox_tasks.py - exécution ponctuelle des jobs de polling (cron, tâches externes)
+#
+# Les jobs viennent du registre unique du poller ; une exécution est ignorée si un autre
+# processus détient déjà le verrou du poller (pas de double interrogation de la box).
+
 import logging
-from freebox_dashboard_app import freebox, API_BASE
+from functools import lru_cache
+from freebox_dashboard_app import create_dashboard
 
 logger = logging.getLogger("freebox.tasks")
 
+@lru_cache(maxsize=None)
+def dashboard():
+    # Construit au premier job : l'import de ce module reste sans effet
+    return create_dashboard()
+
+def run(name):
+    return dashboard().poller.run_once(name)
+
 def poll_status():
-    try:
-        r = requests.get(
-            f"{API_BASE}/connection/",
-            headers=freebox.headers(),
-            timeout=5
-        )
-        data = r.json()
-        logger.info(f"Freebox status: {data}")
-    except Exception as e:
-        logger.error(f"Erreur poll_status: {e}")
+    return run("status")
 
 def poll_wifi():
-    try:
-        r = requests.get(
-            f"{API_BASE}/wifi/config/",
-            headers=freebox.headers(),
-            timeout=5
-        )
-        logger.info("WiFi OK")
-    except Exception as e:
-        logger.error(f"Erreur poll_wifi: {e}")
+    return run("wifi")
+
+def poll_dhcp():
+    return run("dhcp")
@@ -0,0 +1,130 @@
+# freebox_usage.py - débit moyen et volumes calculés depuis les compteurs d'octets
+#
+# rate_down / rate_up de /connection/ sont des valeurs instantanées ; bytes_down / bytes_up
+# sont des compteurs cumulés. Entre deux polls, la différence des compteurs divisée par
+# l'intervalle donne le débit moyen exact, stocké dans la série "throughput". Une remise à
+# zéro des compteurs (redémarrage de la box) est détectée et l'intervalle ignoré.
+#
+# Les volumes du jour et du mois (jours UTC) sont tenus au fil de l'eau : chaque
+# enregistrement "throughput" porte les cumuls en cours, et les jours / mois clos sont
+# écrits dans "throughput.day" et "throughput.month". Un rapport de consommation ne relit
+# donc jamais l'historique brut.
+
+import logging, threading
+from freebox_storage import day_of, day_start, register_retention
+
+logger = logging.getLogger("freebox.usage")
+
+SOURCE = "status"
+SERIES = "throughput"
+# Volumes par jour et par mois, gardés comme un historique (pas de palier d'agrégats)
+register_retention(f"{SERIES}.day", "history")
+register_retention(f"{SERIES}.month", "history")
+
+
+class UsageTracker:
+    def __init__(self, store, max_gap=3600):
+        self.store = store
+        # Au-delà de max_gap secondes sans poll, l'intervalle n'est pas comptabilisé
+        self.max_gap = max_gap
+        self._previous = None       # (ts, bytes_down, bytes_up)
+        self._totals = None
+        self._recovered = False
+        self._lock = threading.Lock()
+
+    def period_series(self, period):
+        return f"{SERIES}.{period}"
+
+    # ---- Reprise après redémarrage ----
+    def _recover(self, until):
+        if self._recovered:
+            return
+        self._recovered = True
+        last = self.store.last(SERIES)
+        if last is not None:
+            self._totals = dict(last["data"].get("totals") or {}) or None
+        for record in self.store.query(SOURCE, start=until - self.max_gap, end=until - 1):
+            counters = _counters(record["data"])
+            if counters is not None:
+                self._previous = (record["ts"],) + counters
+
+    # ---- Cumuls jour / mois ----
+    def _roll(self, ts):
+        day = day_of(ts)
+        month = day[:7]
+        totals = self._totals
+        if totals is None:
+            self._totals = {"day": day, "month": month, "day_down": 0, "day_up": 0, "month_down": 0, "month_up": 0}
+            return
+        if totals["day"] != day:
+            self.store.append(self.period_series("day"), {"bytes_down": totals["day_down"], "bytes_up": totals["day_up"]},
+                              ts=day_start(totals["day"]))
+            totals.update(day=day, day_down=0, day_up=0)
+        if totals["month"] != month:
+            self.store.append(self.period_series("month"), {"bytes_down": totals["month_down"], "bytes_up": totals["month_up"]},
+                              ts=day_start(totals["month"] + "-01"))
+            totals.update(month=month, month_down=0, month_up=0)
+
+    def ingest(self, series, ts, data):
+        """Echantillon brut de la série status : enregistrement throughput écrit, ou None."""
+        if series != SOURCE:
+            return None
+        counters = _counters(data)
+        if counters is None:
+            return None
+        ts = int(ts)
+        with self._lock:
+            self._recover(ts)
+            previous, self._previous = self._previous, (ts,) + counters
+            if previous is None:
+                return None
+            interval = ts - previous[0]
+            down, up = counters[0] - previous[1], counters[1] - previous[2]
+            if interval <= 0 or interval > self.max_gap:
+                return None
+            if down < 0 or up < 0:
+                logger.info(f"Compteurs d'octets remis à zéro à {ts}, intervalle ignoré")
+                return None
+            self._roll(ts)
+            totals = self._totals
+            totals["day_down"] += down
+            totals["day_up"] += up
+            totals["month_down"] += down
+            totals["month_up"] += up
+            record = {"result": {"rate_down": down / interval, "rate_up": up / interval,
+                                 "bytes_down": down, "bytes_up": up, "interval": interval},
+                      "totals": dict(totals)}
+            self.store.append(SERIES, record, ts=ts)
+            return record
+
+    # ---- Lecture ----
+    def current(self):
+        """Cumuls du jour et du mois en cours (None avant le premier intervalle)."""
+        with self._lock:
+            if not self._recovered:
+                last = self.store.last(SERIES)
+                return dict(last["data"]["totals"]) if last and last["data"].get("totals") else None
+            return dict(self._totals) if self._totals else None
+
+    def report(self, period, start=None):
+        """Volumes par jour ou par mois : périodes closes stockées + période en cours."""
+        if period not in ("day", "month"):
+            raise ValueError(f"Période inconnue : {period}")
+        rows = [{"period": day_of(r["ts"])[:10 if period == "day" else 7], "ts": r["ts"],
+                 "bytes_down": r["data"]["bytes_down"], "bytes_up": r["data"]["bytes_up"]}
+                for r in self.store.query(self.period_series(period), start=start)]
+        totals = self.current()
+        if totals:
+            label = totals[period]
+            ts = day_start(label if period == "day" else label + "-01")
+            if start is None or ts >= start:
+                rows.append({"period": label, "ts": ts, "bytes_down": totals[f"{period}_down"],
+                             "bytes_up": totals[f"{period}_up"], "open": True})
+        return rows
+
+
+def _counters(data):
+    result = data.get("result") if isinstance(data, dict) else None
+    if not isinstance(result, dict) or "bytes_down" not in result or "bytes_up" not in result:
+        return None
+    return result["bytes_down"], result["bytes_up"]
@@ -0,0 +1,208 @@
+# freebox_writer.py - écriture groupée des séries (group commit)
+#
+# Les producteurs (pollers, agrégats, consommation) ne touchent plus au disque : append()
+# date l'enregistrement, le dépose dans la file de sa série et rend la main. Un thread
+# d'écriture par série vide sa file par lots : tout ce qui est arrivé pendant flush_interval
+# (ou pendant l'écriture précédente) part en une seule écriture sur des fichiers gardés
+# ouverts. Une série n'a qu'un écrivain : aucune ligne ne peut être entrelacée.
+#
+# Politique fsync : "never" (cache système), "batch" (chaque lot) ou "interval" (au plus
+# toutes les fsync_interval secondes). Les lectures (query, last...) attendent d'abord
+# l'écriture de ce qui est en file pour la série, et close() écrit tout avant de rendre la main.
+
+import time, queue, atexit, logging, threading
+
+logger = logging.getLogger("freebox.writer")
+
+FSYNC_POLICIES = ("never", "batch", "interval")
+
+
+class SeriesWriter:
+    def __init__(self, store, series, flush_interval=1.0, max_batch=512, fsync="interval", fsync_interval=5.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Politique fsync inconnue : {fsync}")
+        self.store = store
+        self.series = series
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self.fsync = fsync
+        self.fsync_interval = fsync_interval
+        self.queue = queue.Queue()
+        self.stats = {"records": 0, "commits": 0, "fsyncs": 0, "errors": 0}
+        self._last_sync = time.monotonic()
+        self._thread = threading.Thread(target=self._run, name=f"freebox-writer-{series}", daemon=True)
+        self._thread.start()
+
+    # ---- Producteurs ----
+    def put(self, ts, data):
+        self.queue.put((ts, data))
+
+    def flush(self, timeout=None):
+        """Attend l'écriture de tout ce qui a été déposé avant l'appel."""
+        done = threading.Event()
+        self.queue.put(done)
+        return done.wait(timeout)
+
+    def close(self, timeout=10):
+        self.queue.put(None)
+        self._thread.join(timeout)
+        # Enregistrements déposés pendant l'arrêt : écrits ici, une dernière fois
+        batch = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, threading.Event):
+                item.set()
+            elif item is not None:
+                batch.append(item)
+        self._commit(batch, force_sync=True)
+
+    # ---- Ecriture ----
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self.queue.get()
+            batch, waiters = [], []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                if item is None:
+                    stopping = True
+                    break
+                if isinstance(item, threading.Event):
+                    # Demande de flush : le lot part sans attendre la fin de la fenêtre
+                    waiters.append(item)
+                    break
+                batch.append(item)
+                if len(batch) >= self.max_batch:
+                    break
+                try:
+                    item = self.queue.get(timeout=max(0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+            self._commit(batch, force_sync=stopping)
+            for waiter in waiters:
+                waiter.set()
+
+    def _commit(self, batch, force_sync=False):
+        if not batch:
+            return
+        now = time.monotonic()
+        sync = self.fsync == "batch" or (self.fsync == "interval" and
+                                         (force_sync or now - self._last_sync >= self.fsync_interval))
+        try:
+            self.store.append_many(self.series, batch, sync=sync)
+        except Exception as e:
+            self.stats["errors"] += 1
+            logger.error(f"Ecriture {self.series} : {len(batch)} enregistrements perdus ({e})")
+            return
+        self.stats["records"] += len(batch)
+        self.stats["commits"] += 1
+        if sync:
+            self.stats["fsyncs"] += 1
+            self._last_sync = now
+
+
+class BufferedStore:
+    """TimeSeriesStore dont les écritures passent par un SeriesWriter par série."""
+
+    def __init__(self, store, flush_interval=1.0, max_batch=512, fsync="interval", fsync_interval=5.0):
+        if fsync not in FSYNC_POLICIES:
+            raise ValueError(f"Politique fsync inconnue : {fsync}")
+        self.store = store
+        self.options = {"flush_interval": flush_interval, "max_batch": max_batch,
+                        "fsync": fsync, "fsync_interval": fsync_interval}
+        self._writers = {}
+        self._lock = threading.Lock()
+        self._closed = False
+        atexit.register(self.close)
+
+    @classmethod
+    def from_config(cls, store, conf):
+        return cls(store, flush_interval=conf.get("flush_interval", 1.0), max_batch=conf.get("max_batch", 512),
+                   fsync=conf.get("fsync", "interval"), fsync_interval=conf.get("fsync_interval", 5.0))
+
+    def __getattr__(self, name):
+        # segments, series, has_series, root... : lecture directe du store
+        return getattr(self.store, name)
+
+    def _writer(self, series):
+        if self._closed:
+            return None
+        writer = self._writers.get(series)
+        if writer is None:
+            # Nom validé avant de créer le thread (ValueError comme le store)
+            self.store._series_dir(series)
+            with self._lock:
+                if self._closed:
+                    return None
+                writer = self._writers.get(series)
+                if writer is None:
+                    writer = self._writers[series] = SeriesWriter(self.store, series, **self.options)
+        return writer
+
+    # ---- Ecriture ----
+    def append(self, series, data, ts=None):
+        ts = int(time.time()) if ts is None else int(ts)
+        self.append_many(series, [(ts, data)])
+        return ts
+
+    def append_many(self, series, records, sync=False):
+        writer = self._writer(series)
+        if writer is None:
+            # Après close() (poll tardif pendant l'arrêt) : écriture directe
+            return self.store.append_many(series, records, sync)
+        for ts, data in records:
+            writer.put(int(ts), data)
+        if sync:
+            writer.flush()
+
+    def flush(self, series=None):
+        if self._closed:
+            return
+        writers = [self._writers.get(series)] if series is not None else list(self._writers.values())
+        for writer in writers:
+            if writer is not None:
+                writer.flush()
+
+    def close(self):
+        """Ecrit tout ce qui est en file, arrête les écrivains et ferme les fichiers."""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+        for writer in self._writers.values():
+            writer.close()
+        self.store.close()
+
+    @property
+    def stats(self):
+        totals = {"records": 0, "commits": 0, "fsyncs": 0, "errors": 0}
+        for writer in list(self._writers.values()):
+            for key, value in writer.stats.items():
+                totals[key] += value
+        totals["pending"] = sum(writer.queue.qsize() for writer in list(self._writers.values()))
+        return totals
+
+    # ---- Lecture (après écriture de la file de la série) ----
+    def query(self, series, start=None, end=None):
+        self.flush(series)
+        return self.store.query(series, start, end)
+
+    def last(self, series):
+        self.flush(series)
+        return self.store.last(series)
+
+    def count(self, series):
+        self.flush(series)
+        return self.store.count(series)
+
+    # ---- Rétention ----
+    def drop_before(self, series, cutoff):
+        self.flush(series)
+        return self.store.drop_before(series, cutoff)
+
+    def compact(self, series, cutoff):
+        self.flush(series)
+        return self.store.compact(series, cutoff)
@@ -1,8 +1,10 @@
 # Installer: pip install fpdf
 
 import os
+import json
 import zipfile
 from fpdf import FPDF
+from freebox_prod import OWNER_ROUTES
 
 # Nom du projet
 project_name = "flask-nginx-prod"
@@ -18,6 +20,9 @@ config_json = """{
   "project_name": "flask-nginx-prod",
   "domains": ["monsite.com", "blog.monsite.com"],
   "flask_port": 5000,
+  "workers": 1,
+  "owner_port": 0,
+  "owner_routes": """ + json.dumps(OWNER_ROUTES) + """,
   "email": "admin@example.com"
 }"""
 with open(os.path.join(project_name, "config", "config.json"), "w") as f:
@@ -57,6 +62,15 @@ CONFIG_FILE="../config/config.json"
 DOMAINS=$(jq -r '.domains[]' $CONFIG_FILE)
 FLASK_PORT=$(jq -r '.flask_port' $CONFIG_FILE)
 EMAIL=$(jq -r '.email' $CONFIG_FILE)
+# Plusieurs workers : ports flask_port, flask_port + 1... (ip_hash pour Socket.IO)
+WORKERS=$(jq -r '.workers // 1' $CONFIG_FILE)
+# Processus propriétaire optionnel (état en direct), servant les routes owner_routes
+OWNER_PORT=$(jq -r '.owner_port // 0' $CONFIG_FILE)
+OWNER_ROUTES=$(jq -r '.owner_routes // ""' $CONFIG_FILE)
+SERVERS=""
+for i in $(seq 0 $((WORKERS - 1))); do
+    SERVERS="$SERVERS    server 127.0.0.1:$((FLASK_PORT + i));"$'\\n'
+done
 
 sudo apt update
 sudo apt install -y nginx certbot python3-certbot-nginx brotli jq
@@ -66,7 +80,25 @@ sudo cp ../html/404.html /var/www/html/404.html
 sudo cp ../html/50x.html /var/www/html/50x.html
 
 for SITE in $DOMAINS; do
+UPSTREAM="${SITE//./_}_workers"
+OWNER_UPSTREAM=""
+OWNER_LOCATION=""
+if [ "$OWNER_PORT" != "0" ] && [ -n "$OWNER_ROUTES" ]; then
+OWNER_UPSTREAM="upstream ${SITE//./_}_owner { server 127.0.0.1:$OWNER_PORT; }"
+OWNER_LOCATION="location ~ $OWNER_ROUTES {
+        proxy_pass http://${SITE//./_}_owner;
+        proxy_http_version 1.1;
+        proxy_set_header Host \$host;
+        proxy_set_header X-Real-IP \$remote_addr;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_set_header X-Forwarded-Proto \$scheme;
+    }"
+fi
 sudo tee /etc/nginx/sites-available/$SITE > /dev/null <<EOL
+upstream $UPSTREAM {
+    ip_hash;
+$SERVERS}
+$OWNER_UPSTREAM
 server {
     listen 80;
     server_name $SITE www.$SITE;
@@ -91,8 +123,18 @@ server {
     brotli on;
     brotli_types text/plain text/css application/javascript application/json image/svg+xml;
     brotli_comp_level 6;
+    location /socket.io/ {
+        proxy_pass http://$UPSTREAM;
+        proxy_http_version 1.1;
+        proxy_set_header Upgrade \$http_upgrade;
+        proxy_set_header Connection "upgrade";
+        proxy_set_header Host \$host;
+        proxy_set_header X-Forwarded-For \$proxy_add_x_forwarded_for;
+        proxy_read_timeout 86400;
+    }
+    $OWNER_LOCATION
     location / {
-        proxy_pass http://127.0.0.1:$FLASK_PORT;
+        proxy_pass http://$UPSTREAM;
         proxy_http_version 1.1;
         proxy_set_header Host \$host;
         proxy_set_header X-Real-IP \$remote_addr;
@@ -155,6 +197,8 @@ pdf.multi_cell(0, 6,
 "8. Tous les logs Nginx se trouvent dans /var/www/<domaine>/logs.\n"
 "9. Les pages d'erreur 404 et 50x sont personnalisables dans html/.\n"
 "10. Le système est compatible CDN et HTTP/2 push pour les assets critiques.\n"
+"11. Plusieurs workers : 'workers' ports consécutifs depuis flask_port (ip_hash, WebSocket), et\n"
+"    'owner_port' / 'owner_routes' pour les routes servies par un processus unique.\n"
 )
 pdf.output(os.path.join(project_name, "README.pdf"))
 
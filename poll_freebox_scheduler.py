@@ -1,79 +1,51 @@
 # Nécessite l'installation de 'apscheduler: pip install apscheduler
 
+# poll_freebox_scheduler.py - polling Freebox sans interface web
+#
+# Démarre le poller unique (freebox_poller.py) avec le traitement commun de l'application
+# (stockage, agrégats, alertes) sans servir le tableau de bord. Avec "polling.embedded" à
+# false, l'application web ne polle plus et ce processus est le seul à interroger la box.
+# Sinon, le verrou du poller garantit qu'un seul des deux processus polle : l'autre reste
+# en attente et prend le relais s'il s'arrête.
+#
+# L'état en direct (fenêtre récente, dernières valeurs, inventaire, copies locales, /metrics)
+# reste dans ce processus : il le sert sur 127.0.0.1:polling.owner_port, où l'application web
+# qui ne détient pas le verrou relaie ces routes, et publie les mises à jour dans la file de
+# messages Socket.IO (polling.message_queue) que l'application web diffuse à ses dashboards.
+
+import time
 import logging
-import requests
-import json
-import os
-from apscheduler.schedulers.background import BackgroundScheduler
-from freebox_dashboard_app import freebox, API_BASE
+import threading
+from werkzeug.serving import make_server
+from freebox_dashboard_app import create_dashboard, create_owner_app
 
-# ---------------- Logging ----------------
-LOG_FILE = os.path.join(os.path.dirname(__file__), "freebox_poll.log")
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s [%(levelname)s] %(message)s",
-    handlers=[logging.FileHandler(LOG_FILE, encoding="utf-8"), logging.StreamHandler()]
-)
 logger = logging.getLogger("freebox.poll")
 
-# ---------------- Fonction utilitaire ----------------
-def save_data(name, data):
-    """
-    Sauvegarde les données Freebox dans un fichier JSON avec timestamp.
-    """
-    entry = {"ts": int(time.time()), "data": data}
-    file_path = os.path.join(os.path.dirname(__file__), f"data_{name}.json")
-    with open(file_path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(entry) + "\n")
-
-# ---------------- Tâches Freebox ----------------
-def poll_status():
-    try:
-        r = requests.get(f"{API_BASE}/connection/", headers=freebox.headers(), timeout=5)
-        r.raise_for_status()
-        data = r.json()
-        logger.info("Poll status OK")
-        save_data("status", data)
-    except Exception as e:
-        logger.error(f"Erreur poll_status: {e}")
-
-def poll_wifi():
-    try:
-        r = requests.get(f"{API_BASE}/wifi/config/", headers=freebox.headers(), timeout=5)
-        r.raise_for_status()
-        data = r.json()
-        logger.info("Poll WiFi OK")
-        save_data("wifi", data)
-    except Exception as e:
-        logger.error(f"Erreur poll_wifi: {e}")
-
-def poll_dhcp():
-    try:
-        r = requests.get(f"{API_BASE}/dhcp/config/", headers=freebox.headers(), timeout=5)
-        r.raise_for_status()
-        data = r.json()
-        logger.info("Poll DHCP OK")
-        save_data("dhcp", data)
-    except Exception as e:
-        logger.error(f"Erreur poll_dhcp: {e}")
+# ---------------- Etat en direct ----------------
+def serve_owner(dashboard):
+    """Sert les routes de l'état en direct sur polling.owner_port ; None si le port vaut 0."""
+    port = dashboard.config.get("polling", {}).get("owner_port")
+    if not port:
+        return None
+    server = make_server("127.0.0.1", port, create_owner_app(dashboard), threaded=True)
+    threading.Thread(target=server.serve_forever, name="freebox-owner", daemon=True).start()
+    logger.info(f"Etat en direct servi sur 127.0.0.1:{server.server_port}")
+    return server
 
 # ---------------- Scheduler ----------------
-def start_scheduler():
-    scheduler = BackgroundScheduler()
-    scheduler.add_job(poll_status, 'interval', seconds=30, id='poll_status')
-    scheduler.add_job(poll_wifi, 'interval', minutes=5, id='poll_wifi')
-    scheduler.add_job(poll_dhcp, 'interval', minutes=5, id='poll_dhcp')
-    scheduler.start()
-    logger.info("Scheduler Freebox démarré")
-    return scheduler
+def start_scheduler(dashboard=None):
+    dashboard = dashboard or create_dashboard()
+    dashboard.start(poll=True)
+    serve_owner(dashboard)
+    return dashboard
 
 # ---------------- Lancement direct ----------------
 if __name__ == "__main__":
-    start_scheduler()
+    dashboard = start_scheduler()
     # Boucle infinie pour garder le script vivant
-    import time
     try:
         while True:
             time.sleep(10)
     except (KeyboardInterrupt, SystemExit):
         logger.info("Arrêt du scheduler")
+        dashboard.stop()
@@ -0,0 +1,90 @@
+# tests/test_alerts.py
+# Tests de l'envoi des alertes en arrière-plan (freebox_alerts.py)
+
+import sys, os, time, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_alerts import AlertDispatcher, digest
+
+class FakeSMTP:
+    connections = 0
+    sent = []
+    fail = 0
+
+    def __init__(self, host, port, timeout=None):
+        FakeSMTP.connections += 1
+
+    def starttls(self):
+        pass
+
+    def login(self, user, password):
+        pass
+
+    def send_message(self, msg):
+        if FakeSMTP.fail:
+            FakeSMTP.fail -= 1
+            raise OSError("connection reset")
+        FakeSMTP.sent.append((msg["Subject"], msg.get_payload(decode=True).decode()))
+
+    def quit(self):
+        pass
+
+def make_dispatcher(**kw):
+    FakeSMTP.connections, FakeSMTP.sent, FakeSMTP.fail = 0, [], 0
+    conf = {"enabled": True, "cooldown_seconds": 300,
+            "mail": {"enabled": True, "from": "box@example.org", "to": ["me@example.org"],
+                     "server": "smtp.example.org", "port": 587, "tls": True, "username": "u", "password": "p"}}
+    results = []
+    dispatcher = AlertDispatcher(conf, on_result=lambda *r: results.append(r), smtp_factory=FakeSMTP, **kw)
+    return dispatcher, results
+
+def wait_for(predicate, timeout=3):
+    deadline = time.monotonic() + timeout
+    while not predicate() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return predicate()
+
+def test_send_does_not_block_and_batches():
+    dispatcher, results = make_dispatcher(batch_seconds=0.2)
+    dispatcher.start()
+    start = time.monotonic()
+    dispatcher.send("Débit descendant faible")
+    dispatcher.send("WiFi désactivé")
+    assert time.monotonic() - start < 0.05
+    assert wait_for(lambda: results)
+    dispatcher.stop()
+    assert FakeSMTP.sent == [("Freebox Alert (2)", "- Débit descendant faible\n- WiFi désactivé")]
+    assert results == [("mail", True, 2)]
+
+def test_smtp_connection_is_reused():
+    dispatcher, results = make_dispatcher(batch_seconds=0)
+    dispatcher.start()
+    for i in range(3):
+        dispatcher.send(f"alerte {i}")
+        assert wait_for(lambda: len(results) == i + 1)
+    dispatcher.stop()
+    assert FakeSMTP.connections == 1 and len(FakeSMTP.sent) == 3
+
+def test_retry_with_new_connection():
+    dispatcher, results = make_dispatcher(batch_seconds=0, backoff_seconds=0.01)
+    FakeSMTP.fail = 2
+    dispatcher.start()
+    dispatcher.send("Débit montant faible")
+    assert wait_for(lambda: results)
+    dispatcher.stop()
+    assert results == [("mail", True, 1)] and FakeSMTP.connections == 3
+
+def test_cooldown_is_thread_safe():
+    dispatcher, _ = make_dispatcher()
+    accepted = []
+    threads = [threading.Thread(target=lambda: accepted.append(dispatcher.send("x", "wifi_down"))) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert accepted.count(True) == 1
+    dispatcher.conf["enabled"] = False
+    assert dispatcher.send("y") is False
+
+def test_digest_single_message():
+    assert digest(["WiFi désactivé"]) == ("Freebox Alert", "WiFi désactivé")
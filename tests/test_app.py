@@ -0,0 +1,72 @@
+# tests/test_app.py
+# Tests de la fabrique d'application (freebox_dashboard_app.py) : import sans effet, état par application
+
+import sys, os, copy, json
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from freebox_dashboard_app import create_app, generate_jwt, load_config
+
+CONFIG = load_config()
+
+@pytest.fixture
+def app(tmp_path):
+    config = copy.deepcopy(CONFIG)
+    config["data_dir"] = str(tmp_path)
+    return create_app(config)
+
+def status(rate_down):
+    return {"success": True, "result": {"rate_down": rate_down, "rate_up": 1000, "state": "up"}}
+
+def test_create_app_is_inert(app):
+    fb = app.extensions["freebox"]
+    # Ni client Freebox (app_token.json), ni scheduler, ni poller avant Dashboard.start()
+    assert not {"client", "scheduler", "poller"} & set(fb.__dict__)
+    assert not fb.started and fb.broadcaster._thread is None
+
+def test_dashboard_touches_disk_only_on_start(tmp_path):
+    config = copy.deepcopy(CONFIG)
+    config["data_dir"] = str(tmp_path / "data")
+    fb = create_app(config, owner_url="http://127.0.0.1:1").extensions["freebox"]
+    assert not os.path.exists(tmp_path / "data")
+    # Worker sans session Freebox : démarré sans client ni poller, arrêté proprement
+    fb.start(poll=False)
+    assert fb.started and os.path.isdir(tmp_path / "data") and fb.scheduler.running
+    assert not {"client", "poller"} & set(fb.__dict__)
+    fb.stop()
+    assert not fb.started and not fb.scheduler.running and not fb.broadcaster._thread.is_alive()
+
+def test_routes_use_application_state(app, tmp_path):
+    fb = app.extensions["freebox"]
+    fb.handle_result("status", status(8_000_000))
+    client = app.test_client()
+    assert client.get("/dashboard").status_code == 302
+    client.set_cookie("jwt", generate_jwt("admin", fb.config))
+    assert client.get("/api/snapshot/status").get_json()["data"] == status(8_000_000)
+    assert 'freebox_rate_bytes{direction="down"} 8000000' in client.get("/metrics").data.decode()
+    # Echantillon écrit dans le data_dir de cette application (écritures groupées vidées)
+    fb.store.flush()
+    assert os.listdir(tmp_path)
+
+def test_applications_are_independent(app, tmp_path):
+    config = copy.deepcopy(CONFIG)
+    config["data_dir"] = str(tmp_path / "other")
+    other = create_app(config)
+    app.extensions["freebox"].handle_result("status", status(1))
+    assert other.extensions["freebox"].snapshots.get("status") is None
+
+def test_legacy_files_migrated_by_poller_owner(app, tmp_path):
+    fb = app.extensions["freebox"]
+    legacy = tmp_path / "data_status.json"
+    legacy.write_text("".join(json.dumps({"ts": 1_700_000_000 + i, "data": status(i)}) + "\n" for i in range(3)))
+    fb.poller.lock.path = str(tmp_path / "poller.lock")
+    # Sans le verrou du poller, rien n'est importé
+    fb.migrate_data()
+    assert legacy.exists()
+    assert fb.poller.lock.acquire()
+    try:
+        fb.on_lead()
+    finally:
+        fb.poller.lock.release()
+    assert not legacy.exists() and (tmp_path / "data_status.json.migrated").exists()
+    assert [r["data"] for r in fb.store.query("status")] == [status(i) for i in range(3)]
@@ -0,0 +1,62 @@
+# tests/test_async_poller.py
+# Tests du moteur de polling asyncio (freebox_async_poller.py)
+
+import sys, os, json, time, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+pytest.importorskip("aiohttp")
+from freebox_async_poller import AsyncFreeboxPoller
+
+DELAY = 0.2
+
+class SlowFreebox(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        time.sleep(DELAY)
+        body = json.dumps({"success": True, "result": {"path": self.path,
+                                                        "auth": self.headers.get("X-Fbx-App-Auth")}}).encode()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+class Server(ThreadingHTTPServer):
+    request_queue_size = 64
+
+class StaticAuth:
+    def headers(self):
+        return {"X-Fbx-App-Auth": "session"}
+
+def test_concurrent_fan_out():
+    server = Server(("127.0.0.1", 0), SlowFreebox)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    endpoints = [{"name": f"ep{i}", "path": f"/ep{i}/", "interval": 60} for i in range(10)]
+    results = {}
+    observed = []
+    done = threading.Event()
+
+    def handler(name, data):
+        results[name] = data["result"]
+        if len(results) == len(endpoints):
+            done.set()
+
+    poller = AsyncFreeboxPoller(f"http://127.0.0.1:{server.server_address[1]}/api/v15",
+                                StaticAuth(), endpoints, handler, max_concurrency=10,
+                                observer=lambda name, seconds, ok: observed.append((name, seconds, ok)))
+    start = time.monotonic()
+    poller.start()
+    assert done.wait(5)
+    elapsed = time.monotonic() - start
+    poller.stop()
+    server.shutdown()
+    # 10 requêtes de 200 ms en parallèle : bien moins que 2 s en séquentiel
+    assert elapsed < 10 * DELAY / 2
+    assert results["ep3"] == {"path": "/api/v15/ep3/", "auth": "session"}
+    assert len(observed) == 10 and all(ok and seconds >= DELAY for _, seconds, ok in observed)
@@ -0,0 +1,97 @@
+# tests/test_broadcast.py
+# Tests de la diffusion Socket.IO groupée (freebox_broadcast.py)
+
+import sys, os, time, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_broadcast import Broadcaster, RecentWindow, chart_point
+
+def status(down, up=100, bytes_down=0):
+    return {"success": True, "result": {"rate_down": down, "rate_up": up, "bytes_down": bytes_down, "state": "up"}}
+
+class Recorder:
+    def __init__(self):
+        self.events = []
+        self.received = threading.Event()
+
+    def __call__(self, event, payload):
+        self.events.append((event, payload))
+        self.received.set()
+
+def test_chart_point_keeps_chart_fields_only():
+    assert chart_point("status", status(1000, bytes_down=5)) == {"rate_down": 1000, "rate_up": 100}
+    assert chart_point("dhcp_leases", {"result": {"leases": 2, "static": 1}}) == {"leases": 2}
+    assert chart_point("lan_hosts", {"result": []}) is None
+
+def test_delta_against_last_sent():
+    emit = Recorder()
+    broadcaster = Broadcaster(emit)
+    broadcaster.flush([("status", 10, chart_point("status", status(1000)))])
+    broadcaster.flush([("status", 40, chart_point("status", status(2000)))])
+    assert emit.events[0] == ("update", {"status": {"rate_down": 1000, "rate_up": 100, "ts": 10}})
+    assert emit.events[1] == ("update", {"status": {"rate_down": 2000, "ts": 40}})
+    assert broadcaster.state() == {"status": {"rate_down": 2000, "rate_up": 100, "ts": 40}}
+
+def test_burst_is_coalesced_and_rate_limited():
+    emit = Recorder()
+    broadcaster = Broadcaster(emit, max_rate=5)
+    broadcaster.start()
+    broadcaster.publish("status", 1, status(1))
+    assert emit.received.wait(2)
+    for i in range(50):
+        broadcaster.publish("status", i + 2, status(i + 2))
+        broadcaster.publish("dhcp_leases", i + 2, {"result": {"leases": 0}})
+    time.sleep(0.5)
+    broadcaster.stop()
+    # Un envoi au plus toutes les 200 ms, chacun ne portant que le dernier échantillon
+    assert 2 <= len(emit.events) <= 4
+    assert emit.events[-1][1]["status"]["ts"] == 51
+    assert broadcaster.stats["coalesced"] >= 90
+
+def test_slow_send_never_blocks_publishers():
+    # Envoi lent (client ou file de messages) : les échantillons publiés entre-temps sont fusionnés
+    emit = Recorder()
+    release = threading.Event()
+    def slow(event, payload):
+        emit(event, payload)
+        release.wait(2)
+    broadcaster = Broadcaster(slow, max_rate=0)
+    broadcaster.start()
+    broadcaster.publish("status", 1, status(1))
+    assert emit.received.wait(2)
+    started = time.monotonic()
+    for i in range(100):
+        broadcaster.publish("status", i + 2, status(i + 2))
+    assert time.monotonic() - started < 0.5
+    release.set()
+    time.sleep(0.3)
+    broadcaster.stop()
+    assert [payload["status"]["ts"] for _, payload in emit.events] == [1, 101]
+    assert broadcaster.stats["coalesced"] == 99
+
+def test_full_queue_drops_oldest():
+    broadcaster = Broadcaster(Recorder(), queue_size=3)
+    for i in range(5):
+        broadcaster.publish("status", i, status(i))
+    assert broadcaster.stats["dropped"] == 2
+    assert [broadcaster._queue.get_nowait()[1] for _ in range(3)] == [2, 3, 4]
+
+# --- Fenêtre récente (bootstrap des dashboards) ---
+def test_recent_window_downsamples():
+    window = RecentWindow(window=600, points=10)
+    for ts in range(0, 1200, 30):
+        window.add("status", ts, status(ts))
+    window.add("lan_hosts", 10, {"result": []})
+    points = window.snapshot()["status"]
+    # 60 s par point, seuls les 10 derniers pas sont gardés
+    assert [p["ts"] for p in points] == list(range(600, 1200, 60))
+    assert points[-1] == {"ts": 1140, "rate_down": 1155.0, "rate_up": 100.0}
+    assert list(window.snapshot()) == ["status"]
+
+def test_recent_window_snapshot_is_cached():
+    window = RecentWindow(window=600, points=10)
+    window.seed("dhcp_leases", [{"ts": 0, "data": {"result": {"leases": 1}}}])
+    first = window.snapshot()
+    assert window.snapshot() is first
+    window.add("dhcp_leases", 70, {"result": {"leases": 2}})
+    assert window.snapshot()["dhcp_leases"] == [{"ts": 0, "leases": 1}, {"ts": 60, "leases": 2}]
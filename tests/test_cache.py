@@ -0,0 +1,75 @@
+# tests/test_cache.py
+# Tests du cache TTL des pages /category (freebox_cache.py)
+
+import sys, os, time, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from freebox_cache import TTLCache
+
+class Loader:
+    def __init__(self, delay=0):
+        self.calls = 0
+        self.delay = delay
+
+    def __call__(self):
+        self.calls += 1
+        time.sleep(self.delay)
+        return {"call": self.calls}
+
+def test_hit_and_expiry():
+    cache = TTLCache(ttl=0.1, stale_ttl=0)
+    loader = Loader()
+    assert cache.get("dhcp", loader) == {"call": 1}
+    assert cache.get("dhcp", loader) == {"call": 1}
+    time.sleep(0.15)
+    assert cache.get("dhcp", loader) == {"call": 2}
+    assert cache.stats["hit"] == 1 and cache.stats["miss"] == 2
+
+def test_stale_while_revalidate():
+    cache = TTLCache(ttl=0.05, stale_ttl=10)
+    loader = Loader(delay=0.2)
+    cache.get("system", loader)
+    time.sleep(0.1)
+    start = time.monotonic()
+    # Entrée périmée servie immédiatement, un seul rafraîchissement en fond
+    assert cache.get("system", loader) == {"call": 1}
+    assert cache.get("system", loader) == {"call": 1}
+    assert time.monotonic() - start < 0.1
+    time.sleep(0.3)
+    assert loader.calls == 2
+    assert cache.get("system", loader) == {"call": 2}
+
+def test_coalescing():
+    cache = TTLCache(ttl=10)
+    loader = Loader(delay=0.2)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get("storage", loader))) for _ in range(10)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert loader.calls == 1
+    assert results == [{"call": 1}] * 10
+    assert cache.stats["coalesced"] == 9
+
+def test_lru_eviction_and_per_key_ttl():
+    cache = TTLCache(max_entries=2, ttl=10, ttls={"downloads": 0})
+    for key in ("a", "b"):
+        cache.get(key, Loader())
+    cache.get("a", Loader())          # "a" devient le plus récent
+    cache.get("c", Loader())          # évince "b"
+    assert len(cache) == 2 and cache.stats["evictions"] == 1
+    loader = Loader()
+    cache.get("b", loader)
+    assert loader.calls == 1
+    assert cache.ttl_for("downloads") == 0
+
+def test_errors_are_not_cached():
+    cache = TTLCache(ttl=10)
+
+    def failing():
+        raise RuntimeError("box down")
+    with pytest.raises(RuntimeError):
+        cache.get("calls", failing)
+    assert cache.get("calls", Loader()) == {"call": 1}
@@ -0,0 +1,127 @@
+# tests/test_client.py
+# Tests du client Freebox poolé (freebox_client.py) contre une Freebox factice locale
+
+import sys, os, json, time, hmac, hashlib, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from freebox_client import FreeboxClient, FreeboxAuthError
+
+APP_TOKEN = "app-token"
+
+class FakeFreebox(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    connections = 0
+    requests = []
+    logins = 0
+    login_delay = 0
+    login_fails = False
+    revoked = set()
+
+    def setup(self):
+        FakeFreebox.connections += 1
+        super().setup()
+
+    def _reply(self, payload, status=200):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        FakeFreebox.requests.append((self.path, self.headers.get("X-Fbx-App-Auth")))
+        if self.path.endswith("/login/"):
+            return self._reply({"success": True, "result": {"challenge": "abc"}})
+        if self.headers.get("X-Fbx-App-Auth") in FakeFreebox.revoked:
+            return self._reply({"success": False, "error_code": "auth_required"}, 403)
+        self._reply({"success": True, "result": {"state": "up"}})
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        FakeFreebox.logins += 1
+        time.sleep(FakeFreebox.login_delay)
+        if FakeFreebox.login_fails:
+            return self._reply({"success": False, "error_code": "internal_error"}, 500)
+        expected = hmac.new(APP_TOKEN.encode(), b"abc", hashlib.sha1).hexdigest()
+        if body["password"] != expected:
+            return self._reply({"success": False, "error_code": "invalid_token"}, 403)
+        self._reply({"success": True, "result": {"session_token": f"session{FakeFreebox.logins}", "expires": 3600}})
+
+    def log_message(self, *args):
+        pass
+
+@pytest.fixture
+def fake_freebox():
+    FakeFreebox.connections = 0
+    FakeFreebox.requests = []
+    FakeFreebox.logins = 0
+    FakeFreebox.login_delay = 0
+    FakeFreebox.login_fails = False
+    FakeFreebox.revoked = set()
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeFreebox)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/api/v15"
+    server.shutdown()
+
+def test_session_and_connection_reuse(fake_freebox):
+    client = FreeboxClient(fake_freebox, "app", APP_TOKEN)
+    for _ in range(5):
+        assert client.get_json("/connection/")["result"]["state"] == "up"
+    assert FakeFreebox.connections == 1
+    assert FakeFreebox.requests[-1] == ("/api/v15/connection/", "session1")
+    # Une seule ouverture de session pour les 5 appels
+    assert sum(1 for path, _ in FakeFreebox.requests if path.endswith("/login/")) == 1
+
+def test_timeout_per_endpoint():
+    client = FreeboxClient("http://localhost/api/v15", "app", APP_TOKEN,
+                           timeout=5, timeouts={"/storage/": 10, "/storage/disk/": 20})
+    assert client.timeout_for("/connection/") == 5
+    assert client.timeout_for("/storage/") == 10
+    assert client.timeout_for("/storage/disk/1") == 20
+
+# --- Renouvellement de session ---
+def test_single_flight_renewal(fake_freebox):
+    FakeFreebox.login_delay = 0.3
+    client = FreeboxClient(fake_freebox, "app", APP_TOKEN)
+    tokens = []
+    threads = [threading.Thread(target=lambda: tokens.append(client.auth.token())) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert FakeFreebox.logins == 1
+    assert tokens == ["session1"] * 20
+
+def test_web_request_fails_fast_during_renewal(fake_freebox):
+    FakeFreebox.login_delay = 0.5
+    client = FreeboxClient(fake_freebox, "app", APP_TOKEN)
+    poller = threading.Thread(target=client.auth.token)
+    poller.start()
+    time.sleep(0.1)
+    start = time.monotonic()
+    with pytest.raises(FreeboxAuthError):
+        client.get("/system/", wait=False)
+    assert time.monotonic() - start < 0.2
+    poller.join()
+
+def test_backoff_does_not_sleep(fake_freebox):
+    FakeFreebox.login_fails = True
+    client = FreeboxClient(fake_freebox, "app", APP_TOKEN, retries=0)
+    with pytest.raises(FreeboxAuthError):
+        client.auth.token()
+    start = time.monotonic()
+    with pytest.raises(FreeboxAuthError):
+        client.auth.token()
+    assert time.monotonic() - start < 0.1
+    assert FakeFreebox.logins == 1
+
+def test_relogin_on_auth_required(fake_freebox):
+    client = FreeboxClient(fake_freebox, "app", APP_TOKEN)
+    client.get_json("/connection/")
+    FakeFreebox.revoked.add("session1")
+    assert client.get_json("/connection/")["result"]["state"] == "up"
+    assert FakeFreebox.logins == 2
+    assert FakeFreebox.requests[-1] == ("/api/v15/connection/", "session2")
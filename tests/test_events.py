@@ -0,0 +1,79 @@
+# tests/test_events.py
+# Tests des événements poussés par la Freebox (freebox_events.py) contre la Freebox simulée
+
+import sys, os, copy, time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from freebox_client import FreeboxClient
+from freebox_events import EventSubscriber, ws_url
+from freebox_simulator import FreeboxSimulator
+from freebox_dashboard_app import create_dashboard, load_config
+
+pytest.importorskip("aiohttp")
+
+CONFIG = load_config()
+MAC = "00:24:d4:00:00:01"
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.01)
+    return False
+
+def test_ws_url():
+    assert ws_url("http://mafreebox.freebox.fr/api/v15") == "ws://mafreebox.freebox.fr/api/v15/ws/event"
+    assert ws_url("https://box.example:443/api/v15") == "wss://box.example:443/api/v15/ws/event"
+
+def test_subscriber_reconnects_and_renews_session():
+    with FreeboxSimulator(app_token="secret") as sim:
+        client = FreeboxClient(sim.api_base(), "app", "secret")
+        received, states = [], []
+        subscriber = EventSubscriber(ws_url(sim.api_base()), client.auth, ["lan_host_l3addr_unreachable"],
+                                     lambda *event: received.append(event), on_state=states.append,
+                                     reconnect_min=0.05)
+        subscriber.start()
+        try:
+            assert wait_for(lambda: sim.event_clients == 1)
+            # Evénement non demandé à l'abonnement : pas envoyé
+            assert sim.set_host_reachable(MAC, True) == 0
+            assert sim.set_host_reachable(MAC, False) == 1
+            assert wait_for(lambda: received)
+            source, event, result = received[0]
+            assert (source, event, result["l2ident"]["id"], result["active"]) == ("lan_host", "l3addr_unreachable", MAC, False)
+            # Coupure avec session révoquée : poignée de main refusée, nouvelle session, réabonnement
+            sim.revoke()
+            sim.drop_events()
+            assert wait_for(lambda: subscriber.stats["connects"] == 2 and sim.event_clients == 1)
+            assert sim.stats["logins"] == 2 and subscriber.stats["errors"] >= 2
+            assert wait_for(lambda: states == [True, False, True])
+        finally:
+            subscriber.stop()
+
+def test_dashboard_switches_polls_to_reconciliation(tmp_path):
+    with FreeboxSimulator(seed=1) as sim:
+        config = copy.deepcopy(CONFIG)
+        config.update(freebox_url=sim.url, data_dir=str(tmp_path))
+        config["polling"]["lock_file"] = str(tmp_path / "poller.lock")
+        config["events"] = dict(config["events"], enabled=True, reconnect_min=0.05, reconcile_interval=900)
+        emitted = []
+        fb = create_dashboard(config, emit=lambda event, data: emitted.append((event, data)))
+        fb.start(poll=True)
+        try:
+            job = fb.poller.jobs["lan_hosts"]
+            # Connexion établie : intervalle de réconciliation et poll de rattrapage immédiat
+            assert wait_for(lambda: job.current == 900 and fb.snapshots.get("lan_hosts") is not None)
+            assert fb.scheduler.get_job("poll_lan_hosts").trigger.interval.total_seconds() == 900
+            sim.set_host_reachable(MAC, False)
+            assert wait_for(lambda: any(event == "event" for event, _ in emitted))
+            hosts = {h["l2ident"]["id"]: h for h in fb.snapshots.get("lan_hosts")[1]["result"]}
+            assert hosts[MAC]["active"] is False and len(hosts) == 8
+            assert fb.store.last("events")["data"]["event"] == "l3addr_unreachable"
+            assert 'freebox_events_total{source="lan_host",event="l3addr_unreachable"} 1' in fb.metrics.render()
+            # Connexion perdue : retour au polling normal jusqu'à la reconnexion
+            sim.stop()
+            assert wait_for(lambda: job.current == job.interval)
+        finally:
+            fb.stop()
@@ -1,65 +1,95 @@
 # tests/test_freebox_api.py
-# Version complète : tests automatisés pour Freebox Dashboard
-# - JWT via cookie ou header
-# - Tests /status, /wifi, /dhcp, /reboot
-# - Compatible FlaskClient sous Windows
+# Tests de bout en bout : application Flask + poller contre la Freebox simulée (freebox_simulator.py)
+# - authentification locale (formulaire /login, cookie JWT)
+# - ouverture de session Freebox (challenge + HMAC-SHA1), renouvellement après expiration
+# - polls /connection/, /wifi/config/, /dhcp/config/ puis /api/snapshot, /history, /metrics, /category
 
-import sys, os
+import sys, os, copy
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
 import pytest
-from freebox_dashboard_app import app
+from freebox_dashboard_app import create_app, generate_jwt, load_config
+from freebox_simulator import FreeboxSimulator, load_recordings
+
+CONFIG = load_config()
+DATA_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'data'))
 
 @pytest.fixture
-def client():
-    app.config['TESTING'] = True
-    app.url_map.strict_slashes = False  # pour éviter 404 sur Windows
-    with app.test_client() as client:
-        yield client
+def simulator():
+    with FreeboxSimulator(recordings=load_recordings(DATA_DIR), seed=1) as sim:
+        yield sim
 
-# --- Fixture pour token JWT ---
 @pytest.fixture
-def token(client):
-    response = client.post('/login', json={'username':'admin','password':'admin'})
-    return response.get_json()['token']
+def app(simulator, tmp_path):
+    config = copy.deepcopy(CONFIG)
+    config["freebox_url"] = simulator.url
+    config["data_dir"] = str(tmp_path)
+    config["polling"]["lock_file"] = str(tmp_path / "poller.lock")
+    config["polling"]["adaptive"]["enabled"] = False
+    config["http"]["retries"] = 0
+    app = create_app(config)
+    yield app
+    app.extensions["freebox"].store.close()
 
-# --- Tests Login ---
-def test_login_success(client):
-    response = client.post('/login', json={'username':'admin','password':'admin'})
-    assert response.status_code == 200
-    data = response.get_json()
-    assert 'token' in data
+@pytest.fixture
+def client(app):
+    client = app.test_client()
+    client.set_cookie("jwt", generate_jwt("admin", app.extensions["freebox"].config))
+    return client
 
-def test_login_failure(client):
-    response = client.post('/login', json={'username':'admin','password':'wrong'})
-    assert response.status_code == 401
+# --- Authentification locale ---
+def test_login_form(app):
+    client = app.test_client()
+    assert client.post('/login', data={'username': 'admin', 'password': 'wrong'}).status_code == 401
+    response = client.post('/login', data={'username': 'admin', 'password': 'admin'})
+    assert response.status_code == 200
+    assert 'jwt=' in response.headers['Set-Cookie']
 
-# --- Tests endpoints API ---
-def test_status_unauthorized(client):
-    response = client.get('/status')
-    assert response.status_code == 401
+def test_pages_require_jwt(app):
+    client = app.test_client()
+    for path in ('/dashboard', '/api/snapshot', '/history/status', '/settings'):
+        assert client.get(path).status_code == 302
+    client.set_cookie("jwt", "invalide")
+    assert client.get('/dashboard').status_code == 302
 
-def test_status_authorized(client, token):
-    # Test via header
-    response = client.get('/status', headers={'Authorization': f'Bearer {token}'})
-    assert response.status_code in [200, 500]
-    # Test via cookie
-    response2 = client.get('/status', headers={'Cookie': f'jwt={token}'})
-    assert response2.status_code in [200, 500]
+def test_dashboard_access(client):
+    response = client.get('/dashboard')
+    assert response.status_code == 200
+    assert 'Freebox Dashboard' in response.data.decode()
 
-def test_wifi_authorized(client, token):
-    response = client.get('/wifi', headers={'Authorization': f'Bearer {token}'})
-    assert response.status_code in [200, 500]
+# --- Polling contre la Freebox simulée ---
+def test_poll_and_read_back(app, client, simulator):
+    fb = app.extensions["freebox"]
+    for name in ("status", "wifi", "dhcp", "system"):
+        assert fb.poller.run(name)["success"]
+    assert simulator.stats["logins"] == 1
+    status = client.get('/api/snapshot/status').get_json()
+    # Première réponse enregistrée dans data/data_status.json
+    assert status["data"] == simulator.recordings["/connection/"][0]
+    assert set(client.get('/api/snapshot').get_json()["snapshots"]) >= {"status", "wifi", "dhcp", "system"}
+    history = client.get('/history/status?period=1h').get_json()
+    assert len(history["data"]) == 1
+    metrics = client.get('/metrics').data.decode()
+    assert 'freebox_link_up 1' in metrics
+    assert 'freebox_poll_duration_seconds_count{job="status"} 1' in metrics
+    assert 'freebox_poll_failures_total{job="status"}' not in metrics
 
-def test_dhcp_authorized(client, token):
-    response = client.get('/dhcp', headers={'Authorization': f'Bearer {token}'})
-    assert response.status_code in [200, 500]
+def test_session_renewed_after_expiry(app, simulator):
+    fb = app.extensions["freebox"]
+    fb.poller.run("status")
+    simulator.revoke()
+    # 403 auth_required : reconnexion puis rejeu de la requête
+    assert fb.poller.run("status")["success"]
+    assert simulator.stats["logins"] == 2 and simulator.stats["auth_required"] == 1
 
-def test_reboot_authorized(client, token):
-    response = client.post('/reboot', headers={'Authorization': f'Bearer {token}'})
-    assert response.status_code in [200, 500]
+def test_poll_failure_is_counted(app, simulator):
+    fb = app.extensions["freebox"]
+    simulator.error_rate, simulator.errors = 1.0, (500,)
+    assert fb.poller.run("status") is None
+    assert 'freebox_poll_failures_total{job="status"} 1' in fb.metrics.render()
 
-def test_dashboard_access(client, token):
-    response = client.get('/dashboard', headers={'Authorization': f'Bearer {token}'})
+def test_category_from_simulator(client):
+    response = client.get('/category/config')
     assert response.status_code == 200
-    assert b'Freebox Dashboard' in response.data
+    assert 'fbxgw8r' in response.data.decode()
+    assert client.get('/category/inconnue').status_code == 404
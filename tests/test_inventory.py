@@ -0,0 +1,90 @@
+# tests/test_inventory.py
+# Tests de l'inventaire des appareils du réseau local (freebox_inventory.py)
+
+import sys, os, copy
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_storage import TimeSeriesStore
+from freebox_inventory import HostInventory, CHANGES
+from freebox_simulator import FreeboxSimulator
+from freebox_dashboard_app import create_app, generate_jwt, load_config
+
+CONFIG = load_config()
+
+def host(i, ip=None, active=True):
+    mac = f"00:24:d4:00:00:{i:02x}"
+    return {"id": f"ether-{mac}", "primary_name": f"host-{i}", "active": active,
+            "l2ident": {"id": mac, "type": "mac_address"},
+            "l3connectivities": [{"addr": ip or f"192.168.0.{10 + i}", "af": "ipv4", "reachable": active}]}
+
+def kinds(changes):
+    return sorted((c["mac"][-2:], c["change"]) for c in changes)
+
+def test_diffs_and_recovery(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    inventory = HostInventory(store)
+    assert kinds(inventory.observe_hosts("pub", [host(1), host(2), host(3, active=False)], 100)) == [
+        ("01", "joined"), ("02", "joined")]
+    assert inventory.observe_hosts("pub", [host(1), host(2)], 160) == []
+    changes = inventory.observe_hosts("pub", [host(1, ip="192.168.0.99"), host(3)], 220)
+    assert kinds(changes) == [("01", "ip_changed"), ("02", "left"), ("03", "joined")]
+    assert next(c for c in changes if c["change"] == "ip_changed")["previous_ip"] == "192.168.0.11"
+    # Seuls les changements sont écrits
+    assert [len(r["data"]["result"]) for r in store.query(CHANGES)] == [2, 3]
+    device = inventory.device("00:24:D4:00:00:02")
+    assert (device["first_seen"], device["last_seen"], device["active"]) == (100, 220, False)
+    assert device["sessions"] == [{"start": 100, "end": 220}] and device["present_seconds"] == 120
+
+    # Redémarrage : index reconstruit depuis les changements, pas depuis les réponses brutes
+    recovered = HostInventory(store)
+    assert recovered.devices() == inventory.devices()
+    assert recovered.counts() == {"active": 2, "known": 3}
+    assert kinds(recovered.observe_hosts("pub", [host(3)], 280)) == [("01", "left")]
+
+def test_leases_name_devices_and_report_new_ip(tmp_path):
+    inventory = HostInventory(TimeSeriesStore(str(tmp_path)))
+    inventory.observe_hosts("pub", [dict(host(1), primary_name="")], 100)
+    leases = [{"mac": "00:24:d4:00:00:01", "ip": "192.168.0.50", "hostname": "nas", "lease_remaining": 600},
+              {"mac": "00:24:d4:00:00:09", "ip": "192.168.0.19", "hostname": "printer", "is_static": True}]
+    changes = inventory.observe_leases(leases, 130)
+    assert kinds(changes) == [("01", "ip_changed")]
+    nas, printer = inventory.devices()
+    assert (nas["name"], nas["ip"], nas["lease"]["expires"]) == ("nas", "192.168.0.50", 730)
+    # Bail d'un appareil absent : connu mais pas présent, aucun changement écrit
+    assert (printer["active"], printer["ip"], printer["lease"]["static"]) == (False, "192.168.0.19", True)
+    assert inventory.observe_leases(leases, 160) == []
+
+def test_dashboard_inventory(tmp_path):
+    with FreeboxSimulator(seed=1) as sim:
+        config = copy.deepcopy(CONFIG)
+        config.update(freebox_url=sim.url, data_dir=str(tmp_path))
+        config["polling"]["lock_file"] = str(tmp_path / "poller.lock")
+        config["polling"]["adaptive"]["enabled"] = False
+        app = create_app(config)
+        fb = app.extensions["freebox"]
+        emitted = []
+        fb.emit = lambda event, data: emitted.append((event, data))
+        client = app.test_client()
+        client.set_cookie("jwt", generate_jwt("admin", config))
+        try:
+            fb.poller.run("lan_hosts")
+            fb.poller.run("dhcp_leases")
+            assert client.get('/api/devices').get_json()["counts"] == {"active": 8, "known": 8}
+            sim.set_host_reachable("00:24:d4:00:00:02", False)
+            fb.poller.run("lan_hosts")
+            assert emitted[-1][1]["changes"] == [{"mac": "00:24:D4:00:00:02", "change": "left"}]
+            inactive = client.get('/api/devices?state=inactive').get_json()["devices"]
+            assert [(d["mac"], d["name"]) for d in inactive] == [("00:24:D4:00:00:02", "host-2")]
+            device = client.get('/api/devices/00:24:d4:00:00:02').get_json()
+            assert len(device["sessions"]) == 1 and device["sessions"][0]["end"] is not None
+            assert client.get('/api/devices/00:00:00:00:00:00').status_code == 404
+            assert len(client.get('/api/devices/changes').get_json()["changes"]) == 9
+            # Baux comptés à chaque poll ; listes d'appareils non stockées
+            assert fb.store.last("dhcp_leases")["data"]["result"] == {"leases": 8, "static": 0}
+            assert not fb.store.has_series("lan_hosts")
+            metrics = client.get('/metrics').data.decode()
+            assert 'freebox_dhcp_clients 8' in metrics
+            assert 'freebox_lan_devices{state="active"} 7' in metrics
+            assert 'freebox_lan_device_changes_total{change="left"} 1' in metrics
+        finally:
+            fb.store.close()
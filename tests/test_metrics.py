@@ -0,0 +1,50 @@
+# tests/test_metrics.py
+# Tests du registre de métriques Prometheus (freebox_metrics.py)
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_metrics import MetricsRegistry
+
+def test_gauge_and_counter_render():
+    metrics = MetricsRegistry()
+    rate = metrics.gauge("freebox_rate_bytes", "Débit", ("direction",))
+    polls = metrics.counter("freebox_poll_failures_total", "Echecs", ("job",))
+    rate.set(1250000, direction="down")
+    rate.set(0.5, direction="up")
+    polls.inc(job="wifi")
+    polls.inc(2, job="wifi")
+    text = metrics.render()
+    assert "# TYPE freebox_rate_bytes gauge" in text
+    assert 'freebox_rate_bytes{direction="down"} 1250000' in text
+    assert 'freebox_rate_bytes{direction="up"} 0.5' in text
+    assert 'freebox_poll_failures_total{job="wifi"} 3' in text
+    assert text.endswith("\n")
+
+def test_histogram_buckets():
+    metrics = MetricsRegistry()
+    latency = metrics.histogram("freebox_poll_duration_seconds", "Durée", ("job",), buckets=(0.1, 1))
+    for value in (0.05, 0.5, 3):
+        latency.observe(value, job="status")
+    text = metrics.render()
+    assert 'freebox_poll_duration_seconds_bucket{job="status",le="0.1"} 1' in text
+    assert 'freebox_poll_duration_seconds_bucket{job="status",le="1"} 2' in text
+    assert 'freebox_poll_duration_seconds_bucket{job="status",le="+Inf"} 3' in text
+    assert 'freebox_poll_duration_seconds_count{job="status"} 3' in text
+    assert 'freebox_poll_duration_seconds_sum{job="status"} 3.55' in text
+
+def test_collector_runs_at_scrape():
+    metrics = MetricsRegistry()
+    renewals = metrics.counter("freebox_auth_renewals_total", "Sessions")
+    source = {"renewals": 0}
+    metrics.collector(lambda: renewals.set(source["renewals"]))
+    source["renewals"] = 4
+    assert "freebox_auth_renewals_total 4" in metrics.render()
+
+def test_gauge_replace_drops_old_labels():
+    metrics = MetricsRegistry()
+    firing = metrics.gauge("freebox_alert_rule_firing", "Règles", ("rule",))
+    firing.set(1, rule="wifi_down")
+    firing.replace({("low_download",): 0})
+    text = metrics.render()
+    assert 'rule="wifi_down"' not in text and 'freebox_alert_rule_firing{rule="low_download"} 0' in text
@@ -0,0 +1,53 @@
+# tests/test_poll_freebox_scheduler.py
+# Tests du poller dédié (poll_freebox_scheduler.py) : l'application web en attente du verrou lit l'état en direct chez lui
+
+import sys, os, copy, time, socket
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_simulator import FreeboxSimulator
+from freebox_dashboard_app import create_app, create_dashboard, generate_jwt, load_config, socketio
+from poll_freebox_scheduler import serve_owner
+
+CONFIG = load_config()
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def test_standby_web_app_reads_live_state_from_poller(tmp_path):
+    with FreeboxSimulator(seed=1) as sim:
+        config = copy.deepcopy(CONFIG)
+        config.update(freebox_url=sim.url, data_dir=str(tmp_path))
+        config["polling"].update(lock_file=str(tmp_path / "poller.lock"), owner_port=free_port())
+        config["polling"]["adaptive"]["enabled"] = False
+        headless = create_dashboard(copy.deepcopy(config))
+        headless.start(poll=True)
+        server = serve_owner(headless)
+        web = create_app(copy.deepcopy(config), start=True)
+        fb = web.extensions["freebox"]
+        try:
+            # Verrou pris par le poller dédié : l'application web reste en attente
+            assert headless.owns_store() and not fb.owns_store()
+            for job in ("status", "wifi", "lan_hosts"):
+                headless.poller.run(job)
+            # Dernières valeurs publiées par le thread de diffusion du poller
+            deadline = time.monotonic() + 2
+            while "status" not in headless.broadcaster.state() and time.monotonic() < deadline:
+                time.sleep(0.01)
+            client = web.test_client()
+            client.set_cookie("jwt", generate_jwt("admin", config))
+            bootstrap = client.get("/api/bootstrap").get_json()
+            assert bootstrap["series"]["status"] and bootstrap["state"]["status"]["rate_down"] is not None
+            metrics = client.get("/metrics").data.decode()
+            assert 'freebox_rate_bytes{direction="down"}' in metrics and "freebox_wifi_clients" in metrics
+            devices = client.get("/api/devices").get_json()
+            assert devices["counts"]["known"] and devices["counts"] == headless.inventory.counts()
+            ws = socketio.test_client(web)
+            received = {event["name"]: event["args"][0] for event in ws.get_received()}
+            assert received["bootstrap"]["series"]["status"] and received["state"]["status"]
+            ws.disconnect()
+        finally:
+            fb.stop()
+            headless.stop()
+            server.shutdown()
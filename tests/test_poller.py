@@ -0,0 +1,110 @@
+# tests/test_poller.py
+# Tests du poller unique (freebox_poller.py) : registre, verrou, reprise
+
+import sys, os, time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from apscheduler.schedulers.background import BackgroundScheduler
+from freebox_poller import Poller, PollJob, FileLock, AdaptivePolicy, jobs_from_config
+
+class FakeClient:
+    api_base = "http://localhost/api/v15"
+    timeout = 5
+
+    def __init__(self):
+        self.calls = []
+
+    def get_json(self, path):
+        self.calls.append(path)
+        return {"success": True, "result": {"path": path}, "extra": "x"}
+
+CONFIG = {"polling": {"jobs": [{"name": "status", "path": "/connection/", "interval": 30},
+                               {"name": "hosts", "path": "/lan/browser/pub/", "interval": 60,
+                                "series": "lan_hosts", "extract": "result"}]}}
+
+def test_registry_and_extractor(tmp_path):
+    received = []
+    poller = Poller.from_config(FakeClient(), CONFIG, lambda s, d: received.append((s, d)), str(tmp_path / "lock"))
+    assert poller.paths() == {"status": "/connection/", "lan_hosts": "/lan/browser/pub/"}
+    poller.run("hosts")
+    assert received == [("lan_hosts", {"success": True, "result": {"path": "/lan/browser/pub/"}})]
+    assert [job.name for job in jobs_from_config({})] == ["status", "wifi", "dhcp"]
+
+def test_file_lock_is_exclusive(tmp_path):
+    first, second = FileLock(str(tmp_path / "lock")), FileLock(str(tmp_path / "lock"))
+    assert first.acquire() and not second.acquire()
+    first.release()
+    assert second.acquire()
+    second.release()
+
+def test_single_leader_and_takeover(tmp_path):
+    lock = str(tmp_path / "poller.lock")
+    schedulers = [BackgroundScheduler(), BackgroundScheduler()]
+    pollers = [Poller.from_config(FakeClient(), CONFIG, lambda s, d: None, lock) for _ in schedulers]
+    for poller in pollers:
+        poller.standby_seconds = 0.1
+    for poller, scheduler in zip(pollers, schedulers):
+        scheduler.start()
+        poller.start(scheduler)
+    assert pollers[0].lock.held and not pollers[1].lock.held
+    assert schedulers[0].get_job("poll_status") and not schedulers[1].get_job("poll_status")
+    # Arrêt du leader : l'autre processus prend le relais au prochain essai
+    pollers[0].stop()
+    deadline = time.monotonic() + 3
+    while not pollers[1].lock.held and time.monotonic() < deadline:
+        time.sleep(0.05)
+    assert schedulers[1].get_job("poll_status") and not schedulers[1].get_job("poller_standby")
+    for scheduler in schedulers:
+        scheduler.shutdown(wait=False)
+    pollers[1].stop()
+
+def test_run_once_skips_when_another_process_polls(tmp_path):
+    lock = str(tmp_path / "poller.lock")
+    leader = FileLock(lock)
+    leader.acquire()
+    client = FakeClient()
+    poller = Poller.from_config(client, CONFIG, lambda s, d: None, lock)
+    assert poller.run_once("status") is None and client.calls == []
+    leader.release()
+    assert poller.run_once("status")["result"] == {"path": "/connection/"}
+    assert not poller.lock.held
+
+def test_adaptive_backoff_and_duplicates(tmp_path):
+    received, unchanged = [], []
+    config = {"polling": {"adaptive": {"enabled": True, "backoff": 2, "max_factor": 4},
+                          "jobs": [{"name": "wifi", "path": "/wifi/config/", "interval": 300}]}}
+    poller = Poller.from_config(FakeClient(), config, lambda s, d: received.append(d), str(tmp_path / "lock"),
+                                on_unchanged=unchanged.append)
+    job = poller.jobs["wifi"]
+    for _ in range(4):
+        poller.run("wifi")
+    # Une seule réponse stockée, intervalle doublé à chaque doublon puis plafonné à 4 x 300 s
+    assert len(received) == 1 and unchanged == ["wifi"] * 3
+    assert job.current == 1200 and job.unchanged == 3
+    poller.handle("wifi", {"success": True, "result": {"enabled": False}})
+    assert job.current == 300 and len(received) == 2
+
+def test_adaptive_bounds_and_rescheduling(tmp_path):
+    near = {"status": False}
+    policy = AdaptivePolicy(backoff=3, near=lambda series: near[series])
+    job = PollJob("status", "/connection/", 30, min_interval=10, max_interval=60)
+    policy.update(job, {"a": 1})
+    assert job.current == 10
+    policy.update(job, {"a": 1})
+    policy.update(job, {"a": 1})
+    assert job.current == 60
+    # Règle proche de son seuil : retour au minimum même si rien n'a changé
+    near["status"] = True
+    policy.update(job, {"a": 1})
+    assert job.current == 10
+
+    scheduler = BackgroundScheduler()
+    scheduler.start()
+    config = {"polling": {"adaptive": {"enabled": True}, "jobs": [{"name": "status", "path": "/connection/", "interval": 30}]}}
+    poller = Poller.from_config(FakeClient(), config, lambda s, d: None, str(tmp_path / "lock"))
+    poller.start(scheduler)
+    poller.run("status")
+    poller.run("status")
+    assert scheduler.get_job("poll_status").trigger.interval.total_seconds() == 60
+    poller.stop()
+    scheduler.shutdown(wait=False)
@@ -0,0 +1,55 @@
+# tests/test_prod.py
+# Tests du mode production (freebox_prod.py) : worker web sans session Freebox, état lu chez le propriétaire
+
+import sys, os, copy, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from werkzeug.serving import make_server
+from freebox_dashboard_app import create_app, generate_jwt, load_config, socketio
+from freebox_prod import production_config, nginx_config, worker_ports
+
+CONFIG = load_config()
+
+def make_config(path):
+    config = copy.deepcopy(CONFIG)
+    config["data_dir"] = str(path)
+    return config
+
+@pytest.fixture
+def owner(tmp_path):
+    app = create_app(make_config(tmp_path))
+    server = make_server("127.0.0.1", 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield app, f"http://127.0.0.1:{server.server_port}"
+    server.shutdown()
+
+def test_worker_reads_live_state_from_owner(owner, tmp_path):
+    owner_app, url = owner
+    fb = owner_app.extensions["freebox"]
+    fb.handle_result("status", {"success": True, "result": {"rate_down": 5, "rate_up": 1, "state": "up"}})
+    fb.broadcaster.flush([("status", 100, {"rate_down": 5, "rate_up": 1})])
+    # Le worker partage le stockage mais pas la mémoire du propriétaire
+    worker = create_app(make_config(tmp_path), owner_url=url)
+    ws = socketio.test_client(worker)
+    received = {event["name"]: event["args"][0] for event in ws.get_received()}
+    assert received["bootstrap"]["series"]["status"][0]["rate_down"] == 5
+    assert received["state"] == {"status": {"rate_down": 5, "rate_up": 1, "ts": 100}}
+    ws.disconnect()
+
+def test_worker_never_opens_a_freebox_session(owner, tmp_path):
+    worker = create_app(make_config(tmp_path), owner_url=owner[1])
+    client = worker.test_client()
+    client.set_cookie("jwt", generate_jwt("admin", CONFIG))
+    assert client.get("/category/storage").status_code == 503
+    # Téléchargements lus dans la copie locale (stockage partagé), sans la Freebox
+    assert client.get("/category/downloads").status_code == 200
+    assert "client" not in worker.extensions["freebox"].__dict__
+
+def test_nginx_config():
+    prod = production_config({"production": {"workers": 2, "worker_port": 6001, "owner_port": 6100}})
+    assert worker_ports(prod) == [6001, 6002]
+    conf = nginx_config(prod)
+    assert "ip_hash;\n    server 127.0.0.1:6001;\n    server 127.0.0.1:6002;" in conf
+    assert "server 127.0.0.1:6100;" in conf and "proxy_set_header Upgrade $http_upgrade;" in conf
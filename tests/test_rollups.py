@@ -0,0 +1,79 @@
+# tests/test_rollups.py
+# Tests des agrégats sous-échantillonnés (freebox_rollups.py)
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from freebox_storage import TimeSeriesStore
+from freebox_rollups import RollupManager, TIERS, parse_duration, select_tier, merge_buckets
+
+T0 = 1766743200  # aligné sur l'heure
+
+def status(rate):
+    return {"success": True, "result": {"rate_down": rate, "rate_up": 1, "bytes_down": 10 * rate, "bytes_up": 0}}
+
+def feed(store, rollups, n, step=30):
+    for i in range(n):
+        ts = T0 + i * step
+        store.append("status", status(i), ts=ts)
+        rollups.ingest("status", ts, status(i))
+
+def test_parse_duration():
+    assert parse_duration("24h") == 86400
+    assert parse_duration("30m") == 1800
+    assert parse_duration("2w") == 1209600
+    assert parse_duration("bogus", 5) == 5
+
+def test_select_tier():
+    assert select_tier(3600, points=300) == (None, None)
+    assert select_tier(86400, points=300) == (TIERS[1], 300)
+    assert select_tier(7 * 86400, points=300) == (TIERS[2], 3600)
+    assert select_tier(6 * 3600, points=300) == (TIERS[0], 60)
+    assert select_tier(86400, step=900) == (TIERS[1], 900)
+
+def test_incremental_buckets(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    rollups = RollupManager(store)
+    feed(store, rollups, 10)  # 5 minutes à 30 s
+    minutes = list(rollups.query("status", TIERS[0]))
+    assert [m["ts"] for m in minutes] == [T0 + 60 * i for i in range(5)]
+    assert minutes[0]["data"]["count"] == 2
+    assert minutes[0]["data"]["rate_down"] == {"min": 0, "max": 1, "avg": 0.5, "last": 1}
+    # Le palier 5m est encore ouvert mais restitué par query()
+    five = list(rollups.query("status", TIERS[1]))
+    assert len(five) == 1 and five[0]["data"]["count"] == 10
+
+def test_recover_after_restart(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    feed(store, RollupManager(store), 10)
+    restarted = RollupManager(store)
+    minutes = list(restarted.query("status", TIERS[0]))
+    assert sum(m["data"]["count"] for m in minutes) == 10
+
+def test_merge_buckets(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    rollups = RollupManager(store)
+    feed(store, rollups, 10)
+    merged = list(merge_buckets(rollups.query("status", TIERS[0]), 300))
+    assert len(merged) == 1
+    assert merged[0]["data"]["count"] == 10
+    assert merged[0]["data"]["rate_down"]["avg"] == pytest.approx(4.5)
+    assert merged[0]["data"]["rate_down"]["max"] == 9
+
+def test_readonly_process_never_writes(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    writer = RollupManager(store)
+    reader = RollupManager(store, writable=lambda: False)
+    feed(store, writer, 10)
+    assert [m["ts"] for m in reader.query("status", TIERS[0])] == [T0 + 60 * i for i in range(5)]
+    # Le processus qui polle continue : le palier en cours est recalculé à chaque requête
+    for i in range(10, 20):
+        store.append("status", status(i), ts=T0 + 30 * i)
+        writer.ingest("status", T0 + 30 * i, status(i))
+    reader.ingest("status", T0 + 600, status(20))
+    minutes = list(reader.query("status", TIERS[0]))
+    assert [m["ts"] for m in minutes] == [T0 + 60 * i for i in range(10)]
+    assert minutes == list(writer.query("status", TIERS[0]))
+    assert sum(m["data"]["count"] for m in reader.query("status", TIERS[2])) == 20
+    assert not store.has_series("status.1h")
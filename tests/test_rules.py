@@ -0,0 +1,101 @@
+# tests/test_rules.py
+# Tests du moteur de règles d'alerte (freebox_rules.py)
+
+import sys, os, random
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from freebox_rules import Rule, RuleEngine, Window, rules_from_config
+
+def status(rate_down=10_000_000, state="up", bytes_down=0):
+    return {"success": True, "result": {"rate_down": rate_down, "rate_up": 1_000_000,
+                                        "bytes_down": bytes_down, "state": state}}
+
+def engine(*rules):
+    events = []
+    return RuleEngine([Rule(r) for r in rules], lambda rule, event: events.append((rule.name, event))), events
+
+@pytest.mark.parametrize("agg,expected", [("avg", 4.75), ("min", 2), ("max", 8), ("p50", 5), ("last", 5), ("delta", -3)])
+def test_window_aggregates(agg, expected):
+    window = Window(agg, 100)
+    for ts, value in [(0, 100), (100, 1), (130, 8), (160, 2), (190, 4), (220, 5)]:
+        window.add(ts, value)
+    # Le point ts=0 est sorti de la fenêtre
+    assert window.value() == expected
+
+@pytest.mark.parametrize("agg", ["p0", "p50", "p95", "p99"])
+def test_percentile_matches_sorted_window(agg):
+    rng = random.Random(agg)
+    window, percentile = Window(agg, 60), int(agg[1:])
+    for ts in range(0, 5000, 3):
+        # Doublons fréquents et longues séries de valeurs croissantes
+        window.add(ts, rng.randint(0, 20) if ts < 2500 else ts // 7)
+        values = sorted(v for t, v in window.samples)
+        assert window.value() == values[min(len(values) - 1, len(values) * percentile // 100)]
+    heaps = window._percentile
+    assert len(heaps._low) + len(heaps._high) <= 2 * len(window) + 16
+
+def test_rate_ignores_counter_reset():
+    window = Window("rate", 300)
+    for ts, value in [(0, 1000), (30, 4000), (60, 100), (90, 700)]:
+        window.add(ts, value)
+    assert window.value() == 20
+
+def test_single_noisy_sample_does_not_fire():
+    rules, events = engine({"name": "low_download", "series": "status", "field": "rate_down", "agg": "avg",
+                            "window": "5m", "min_samples": 3, "op": "<", "value": 5, "scale": 1e-6})
+    for ts, rate in [(0, 10e6), (30, 10e6), (60, 0), (90, 10e6)]:
+        rules.observe("status", ts, status(rate))
+    assert events == []
+    for ts in range(120, 600, 30):
+        rules.observe("status", ts, status(1e6))
+    assert events == [("low_download", "firing")]
+
+def test_hysteresis_and_cooldown():
+    rules, events = engine({"name": "low", "series": "status", "field": "rate_down", "op": "<", "value": 5,
+                            "clear": 8, "cooldown": "10m", "scale": 1e-6})
+    samples = [(0, 4e6), (30, 6e6), (60, 9e6), (90, 4e6), (700, 9e6), (730, 4e6)]
+    for ts, rate in samples:
+        rules.observe("status", ts, status(rate))
+    # 6 Mbps ne suffit pas à lever l'alerte ; la 2e baisse tombe dans le cooldown
+    assert events == [("low", "firing"), ("low", "resolved"), ("low", "firing")]
+
+def test_state_transition_with_hold():
+    rules, events = engine({"name": "link_down", "series": "status", "field": "state", "op": "!=",
+                            "value": "up", "for": "1m", "message": "Connexion {value}"})
+    for ts, state in [(0, "up"), (30, "down"), (60, "down"), (90, "down"), (120, "up")]:
+        rules.observe("status", ts, status(state=state))
+    assert events == [("link_down", "firing"), ("link_down", "resolved")]
+    assert rules.rules[0].format() == "Connexion up"
+
+def test_leases_jump_and_defaults():
+    alerts = {"cooldown_seconds": 60, "thresholds": {"download_min_mbps": 5, "upload_min_mbps": 1,
+                                                      "wifi_enabled_required": True},
+              "rules": [{"name": "jump", "series": "dhcp_leases", "field": "leases", "agg": "delta",
+                         "window": "15m", "op": ">=", "value": 3},
+                        {"name": "low_upload", "series": "status", "field": "rate_up", "op": "<", "value": 0.5}]}
+    rules = rules_from_config(alerts)
+    assert sorted(r.name for r in rules) == ["jump", "low_download", "low_upload", "wifi_down"]
+    assert next(r for r in rules if r.name == "low_upload").threshold == 0.5
+    events = []
+    engine_ = RuleEngine(rules, lambda rule, event: events.append((rule.name, event)))
+    engine_.observe("dhcp_leases", 0, {"result": {"leases": 1}})
+    engine_.observe("dhcp_leases", 300, {"result": {"leases": 4}})
+    engine_.observe("wifi", 300, {"result": {"enabled": False}})
+    assert events == [("jump", "firing"), ("wifi_down", "firing")]
+
+def test_reload_keeps_state_of_unchanged_rules():
+    conf = {"name": "wifi_down", "series": "wifi", "field": "enabled", "op": "==", "value": False}
+    rules, events = engine(conf)
+    rules.observe("wifi", 0, {"result": {"enabled": False}})
+    rules.load([Rule(conf)])
+    rules.observe("wifi", 30, {"result": {"enabled": False}})
+    assert events == [("wifi_down", "firing")] and rules.active() == ["wifi_down"]
+
+def test_near_threshold():
+    rules, events = engine({"name": "low_download", "series": "status", "field": "rate_down", "op": "<",
+                            "value": 5, "scale": 1e-6})
+    rules.observe("status", 0, status(rate_down=20_000_000))
+    assert not rules.near("status") and not rules.near("wifi")
+    rules.observe("status", 30, status(rate_down=5_400_000))
+    assert rules.near("status") and not rules.near("status", margin=0.05)
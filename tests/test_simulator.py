@@ -0,0 +1,33 @@
+# tests/test_simulator.py
+# Tests de la Freebox simulée (freebox_simulator.py) : handshake, réponses générées, injection d'erreurs
+
+import sys, os, hmac, hashlib
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest, requests
+from freebox_client import FreeboxClient, FreeboxAuthError
+from freebox_simulator import FreeboxSimulator
+
+def test_handshake_requires_app_token():
+    with FreeboxSimulator(app_token="secret") as sim:
+        challenge = requests.get(f"{sim.api_base()}/login/").json()["result"]["challenge"]
+        bad = requests.post(f"{sim.api_base()}/login/session/", json={"app_id": "app", "password": "x"})
+        assert bad.status_code == 403 and bad.json()["error_code"] == "invalid_token"
+        password = hmac.new(b"secret", challenge.encode(), hashlib.sha1).hexdigest()
+        token = requests.post(f"{sim.api_base()}/login/session/", json={"app_id": "app", "password": password}).json()["result"]["session_token"]
+        assert requests.get(f"{sim.api_base()}/connection/").status_code == 403
+        assert requests.get(f"{sim.api_base()}/connection/", headers={"X-Fbx-App-Auth": token}).json()["success"]
+        with pytest.raises(FreeboxAuthError):
+            FreeboxClient(sim.api_base(), "app", "mauvais").get_json("/connection/")
+
+def test_generated_counters_and_errors():
+    with FreeboxSimulator(app_token="secret", seed=2) as sim:
+        client = FreeboxClient(sim.api_base(), "app", "secret", retries=0)
+        first = client.get_json("/connection/")["result"]
+        second = client.get_json("/connection/")["result"]
+        assert second["bytes_down"] >= first["bytes_down"] and second["state"] == "up"
+        assert client.get("/inconnu/").status_code == 404
+        sim.error_rate, sim.errors = 1.0, ("drop",)
+        with pytest.raises(requests.ConnectionError):
+            client.get_json("/connection/")
+        assert sim.stats["errors"] == 1
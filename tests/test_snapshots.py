@@ -0,0 +1,24 @@
+# tests/test_snapshots.py
+# Tests du registre des derniers états (freebox_snapshots.py)
+
+import sys, os, time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_storage import TimeSeriesStore
+from freebox_snapshots import SnapshotRegistry
+
+def test_max_age():
+    snapshots = SnapshotRegistry()
+    snapshots.put("dhcp", {"result": {}}, ts=time.time() - 120)
+    assert snapshots.get("dhcp")[1] == {"result": {}}
+    assert snapshots.get("dhcp", max_age=300) is not None
+    assert snapshots.get("dhcp", max_age=60) is None
+    assert snapshots.get("wifi") is None
+
+def test_fallback_from_store(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    store.append("wifi", {"result": {"enabled": True}}, ts=1766743072)
+    snapshots = SnapshotRegistry(fallback=store.last)
+    assert snapshots.get("wifi") == (1766743072, {"result": {"enabled": True}})
+    assert snapshots.get("../config") is None
+    assert snapshots.names() == ["wifi"]
@@ -0,0 +1,188 @@
+# tests/test_storage.py
+# Tests du stockage des séries temporelles (freebox_storage.py)
+
+import sys, os, json, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from freebox_storage import TimeSeriesStore, migrate_legacy, apply_retention, day_of
+
+DAY = 86400
+T0 = 1766742802  # 2025-12-26
+
+@pytest.fixture
+def store(tmp_path):
+    return TimeSeriesStore(str(tmp_path))
+
+def sample(rate):
+    return {"success": True, "result": {"rate_down": rate, "rate_up": rate // 10}}
+
+def test_append_and_query_range(store):
+    for i in range(100):
+        store.append("status", sample(i), ts=T0 + i * 30)
+    rows = list(store.query("status", start=T0 + 300, end=T0 + 600))
+    assert [r["ts"] for r in rows] == list(range(T0 + 300, T0 + 601, 30))
+    assert rows[0]["data"] == sample(10)
+    assert store.count("status") == 100
+
+def test_segments_are_daily(store):
+    store.append("status", sample(1), ts=T0)
+    store.append("status", sample(2), ts=T0 + DAY)
+    store.append("status", sample(3), ts=T0 + 2 * DAY)
+    assert store.segments("status") == [day_of(T0), day_of(T0 + DAY), day_of(T0 + 2 * DAY)]
+    rows = list(store.query("status", start=T0 + DAY))
+    assert [r["data"]["result"]["rate_down"] for r in rows] == [2, 3]
+
+def test_invalid_series_name(store):
+    assert not store.has_series("../config")
+    with pytest.raises(ValueError):
+        store.append("../config", {})
+
+def test_dot_series_stay_inside_root(tmp_path):
+    os.makedirs(tmp_path / "data")
+    store = TimeSeriesStore(str(tmp_path / "data"))
+    # Segment hors du data_dir, atteignable par la série ".."
+    with open(tmp_path / f"{day_of(T0)}.jsonl", "w") as f:
+        f.write(json.dumps({"ts": T0, "data": sample(1)}) + "\n")
+    for name in (".", "..", ".hidden"):
+        assert not store.has_series(name)
+        with pytest.raises(ValueError):
+            list(store.query(name))
+    assert store.series() == []
+
+def test_repair_after_partial_write(store):
+    store.append("status", sample(1), ts=T0)
+    store.append("status", sample(2), ts=T0 + 30)
+    segment = store._segment("status", day_of(T0))
+    # Simule un arrêt brutal : ligne tronquée et index désynchronisé
+    with open(segment.data_path, "ab") as f:
+        f.write(b'{"ts": 17667')
+    reopened = TimeSeriesStore(store.root)
+    reopened.append("status", sample(3), ts=T0 + 60)
+    assert [r["data"]["result"]["rate_down"] for r in reopened.query("status")] == [1, 2, 3]
+
+def test_migrate_legacy(tmp_path):
+    legacy = tmp_path / "data_status.json"
+    with open(legacy, "w") as f:
+        for i in range(5):
+            f.write(json.dumps({"ts": T0 + i * 30, "data": sample(i)}) + "\n")
+    store = TimeSeriesStore(str(tmp_path))
+    store.append("status", sample(99), ts=T0 + 45)
+    assert migrate_legacy(str(tmp_path), store) == {"status": 5}
+    assert not legacy.exists()
+    assert [r["ts"] for r in store.query("status")] == sorted([T0 + i * 30 for i in range(5)] + [T0 + 45])
+
+# --- Mode compact ---
+def load_sample(name):
+    path = os.path.join(os.path.dirname(__file__), '..', 'data', f'data_{name}.json')
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+@pytest.mark.parametrize("name", ["status", "wifi", "dhcp"])
+def test_compact_roundtrip(tmp_path, name):
+    records = load_sample(name)
+    store = TimeSeriesStore(str(tmp_path), compact_series=[name])
+    store.append_many(name, [(r["ts"], r["data"]) for r in records])
+    assert list(store.query(name)) == records
+    assert store.last(name) == records[-1]
+    middle = records[len(records) // 2]["ts"]
+    assert list(store.query(name, start=middle)) == [r for r in records if r["ts"] >= middle]
+
+def test_compact_is_smaller(tmp_path):
+    records = load_sample("status")
+    store = TimeSeriesStore(str(tmp_path), compact_series=["status"])
+    store.append_many("status", [(r["ts"], r["data"]) for r in records])
+    raw = sum(len(json.dumps(r)) + 1 for r in records)
+    compact = sum(os.path.getsize(os.path.join(tmp_path, "status", n)) for n in os.listdir(tmp_path / "status"))
+    assert compact * 10 < raw
+
+def test_compact_keeps_existing_json_segments(tmp_path):
+    TimeSeriesStore(str(tmp_path)).append("status", sample(1), ts=T0)
+    store = TimeSeriesStore(str(tmp_path), compact_series=["status"])
+    store.append("status", sample(2), ts=T0 + 30)
+    store.append("status", sample(3), ts=T0 + DAY)
+    assert [r["data"]["result"]["rate_down"] for r in store.query("status")] == [1, 2, 3]
+    assert sorted(os.listdir(tmp_path / "status")) == [
+        f"{day_of(T0)}.idx", f"{day_of(T0)}.jsonl", f"{day_of(T0 + DAY)}.col", f"{day_of(T0 + DAY)}.state"]
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_migrate_into_compressed_segment(tmp_path, compact):
+    store = TimeSeriesStore(str(tmp_path), compact_series=["status"] if compact else [])
+    for i in range(3):
+        store.append("status", sample(i), ts=T0 + i * 60)
+    assert store.compact("status", T0 + 2 * DAY) == 1
+    with open(tmp_path / "data_status.json", "w") as f:
+        f.write(json.dumps({"ts": T0 + 30, "data": sample(9)}) + "\n")
+    assert migrate_legacy(str(tmp_path), store) == {"status": 1}
+    # Ancienne version compressée supprimée : ni doublons ni données périmées
+    assert not [n for n in os.listdir(tmp_path / "status") if n.endswith(".gz")]
+    assert store.compact("status", T0 + 2 * DAY) == 1
+    reopened = TimeSeriesStore(str(tmp_path), compact_series=["status"] if compact else [])
+    assert [r["data"]["result"]["rate_down"] for r in reopened.query("status")] == [0, 9, 1, 2]
+
+# --- Rétention & compaction ---
+def test_retention_compresses_and_drops(tmp_path):
+    store = TimeSeriesStore(str(tmp_path), compact_series=["status"])
+    legacy = TimeSeriesStore(str(tmp_path))
+    for d in range(5):
+        legacy.append("status", sample(d), ts=T0 + d * DAY)
+        store.append("status.1h", {"count": 1}, ts=T0 + d * DAY)
+    now = T0 + 5 * DAY
+    report = apply_retention(store, {"raw_days": 3, "rollup_months": 1, "compress_after_days": 1}, now=now,
+                             tiers=("1m", "5m", "1h"))
+    assert report["status"] == {"dropped": 2, "compacted": 2}
+    names = os.listdir(tmp_path / "status")
+    # Seul le dernier jour (non clos depuis assez longtemps) reste en JSON
+    assert [n for n in names if n.endswith(".jsonl")] == [f"{day_of(T0 + 4 * DAY)}.jsonl"]
+    assert sorted(n for n in names if n.endswith(".col.gz")) == [f"{day_of(T0 + d * DAY)}.col.gz" for d in (2, 3)]
+    assert [r["data"]["result"]["rate_down"] for r in store.query("status")] == [2, 3, 4]
+    assert TimeSeriesStore(str(tmp_path)).last("status")["ts"] == T0 + 4 * DAY
+    assert store.count("status.1h") == 5
+
+def test_retention_classes(tmp_path):
+    import freebox_inventory, freebox_sync  # déclarent devices.changes, calls.log, downloads.changes
+    store = TimeSeriesStore(str(tmp_path))
+    names = ["status", "status.1m", "status.1h", "devices.changes", "calls.log", "downloads.changes", "foo.bar"]
+    for d in range(40):
+        for name in names:
+            store.append(name, {"count": 1}, ts=T0 + d * DAY)
+    retention = {"raw_days": 10, "rollup_months": 12, "tier_days": {"1m": 5}, "history_months": 1,
+                 "compress_after_days": 0}
+    apply_retention(store, retention, now=T0 + 40 * DAY, tiers=("1m", "5m", "1h"))
+    # Palier 1m : tier_days ; 1h : rollup_months ; journaux : history_months ; le reste : raw_days
+    counts = {name: store.count(name) for name in names}
+    assert counts == {"status": 10, "status.1m": 5, "status.1h": 40, "devices.changes": 31, "calls.log": 31,
+                      "downloads.changes": 31, "foo.bar": 10}
+
+def test_compact_reads_during_writes(tmp_path):
+    # Chaque échantillon ajoute un état (plus grand que le tampon d'écriture, donc aussitôt sur
+    # disque) : les lecteurs relisent le journal pendant les écritures
+    store = TimeSeriesStore(str(tmp_path), compact_series=["status"])
+    docs = [{"success": True, "result": {"state": f"s{i}" + "x" * 9000, "rate_down": i}} for i in range(500)]
+    done, errors = threading.Event(), []
+
+    def write():
+        for i, doc in enumerate(docs):
+            store.append("status", doc, ts=T0 + i)
+        done.set()
+
+    def read():
+        try:
+            while not done.is_set():
+                for record in store.query("status"):
+                    assert record["data"] == docs[record["ts"] - T0]
+        except Exception as e:
+            errors.append(e)
+
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    threads = [threading.Thread(target=read) for _ in range(3)] + [threading.Thread(target=write)]
+    try:
+        for thread in threads:
+            thread.start()
+    finally:
+        for thread in threads:
+            thread.join()
+        sys.setswitchinterval(interval)
+    assert errors == []
+    assert [r["data"] for r in store.query("status")] == docs
@@ -0,0 +1,110 @@
+# tests/test_sync.py
+# Tests des copies locales du journal d'appels et des téléchargements (freebox_sync.py)
+
+import sys, os, copy, time
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_storage import TimeSeriesStore, apply_retention
+from freebox_sync import CallLog, DownloadTasks
+from freebox_simulator import FreeboxSimulator
+from freebox_dashboard_app import create_app, generate_jwt, load_config
+
+CONFIG = load_config()
+
+def call(i, ts, kind="accepted"):
+    return {"id": i, "datetime": ts, "type": kind, "number": f"06000000{i:02d}", "name": f"Contact {i}"}
+
+def test_call_log_cursor_and_pages(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    calls = CallLog(store)
+    box = [call(3, 300, "missed"), call(2, 200), call(1, 100, "missed")]
+    assert [c["id"] for c in calls.sync(box, 1000)] == [1, 2, 3]
+    assert calls.sync(box, 1060) == []
+    # Nouveaux appels seulement ; journal remis à zéro par la box : ids repartis de 1, dates plus récentes
+    assert [c["id"] for c in calls.sync([call(4, 400)] + box, 1120)] == [4]
+    assert [c["id"] for c in calls.sync([call(1, 500, "missed")], 1180)] == [1]
+    assert [len(r["data"]["result"]) for r in store.query("calls.log")] == [3, 1, 1]
+
+    page = calls.page(page=2, per_page=2)
+    assert (page["total"], page["pages"], [c["datetime"] for c in page["items"]]) == (5, 3, [300, 200])
+    assert [c["datetime"] for c in calls.page(type="missed")["items"]] == [500, 300, 100]
+    assert [c["id"] for c in calls.page(number="contact 4", since=None)["items"]] == [4]
+    assert calls.page(page=9, per_page=2)["page"] == 3
+
+    recovered = CallLog(store)
+    assert recovered.page() == calls.page() and recovered.cursor == (500, 1)
+
+def test_download_tasks_updated_in_place(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    downloads = DownloadTasks(store)
+    task = {"id": 1, "name": "debian.iso", "status": "downloading", "rx_bytes": 0, "rx_pct": 0, "rx_rate": 10, "size": 100}
+    assert [c["change"] for c in downloads.sync([task], 100)] == ["added"]
+    # Débit seul modifié : mis à jour en mémoire, rien d'écrit
+    assert downloads.sync([dict(task, rx_rate=20)], 110) == []
+    assert downloads.page()["items"][0]["rx_rate"] == 20
+    changes = downloads.sync([dict(task, rx_bytes=100, rx_pct=10000, status="seeding", rx_rate=0)], 120)
+    assert changes == [{"id": 1, "status": "seeding", "rx_bytes": 100, "rx_pct": 10000, "change": "updated"}]
+    assert downloads.sync([], 130) == [{"id": 1, "change": "removed"}]
+    assert len(list(store.query("downloads.changes"))) == 3
+
+    recovered = DownloadTasks(store)
+    row = recovered.page(status="removed")["items"][0]
+    assert (row["status"], row["rx_pct"], row["first_seen"], row["updated"]) == ("seeding", 10000, 100, 130)
+    assert recovered.page(status="seeding")["total"] == 0
+
+def test_download_tasks_replayed_after_retention(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    downloads = DownloadTasks(store)
+    day = 86400
+    t0 = 1_700_000_000 - 1_700_000_000 % day
+    seeding = {"id": 1, "name": "debian.iso", "status": "seeding", "size": 100, "rx_pct": 10000}
+    gone = {"id": 2, "name": "old.iso", "status": "done", "size": 10}
+    downloads.sync([seeding, gone], t0)
+    downloads.sync([seeding], t0 + day)
+    downloads.sync([dict(seeding, tx_bytes=50)], t0 + 40 * day)
+    retention = {"raw_days": 30, "history_months": 1, "compress_after_days": 0}
+    report = apply_retention(store, retention, now=t0 + 41 * day,
+                             checkpoints={downloads.series: downloads.checkpoint})
+    assert report["downloads.changes"]["dropped"] == 2
+    # Tâche ajoutée avant la purge : tous ses champs reviennent au rejeu ; tâche supprimée depuis longtemps oubliée
+    recovered = DownloadTasks(store)
+    assert recovered.page()["items"] == downloads.page()["items"]
+    row = recovered.page()["items"][0]
+    assert (recovered.page()["total"], row["name"], row["size"], row["tx_bytes"], row["first_seen"]) == \
+        (1, "debian.iso", 100, 50, t0)
+    # Rien d'ancien à purger : pas de nouveau checkpoint
+    apply_retention(store, retention, now=t0 + 41 * day, checkpoints={downloads.series: downloads.checkpoint})
+    assert sum(1 for r in store.query("downloads.changes") if r["data"].get("checkpoint")) == 1
+
+def test_category_pages_from_local_copy(tmp_path):
+    with FreeboxSimulator(seed=1) as sim:
+        config = copy.deepcopy(CONFIG)
+        config.update(freebox_url=sim.url, data_dir=str(tmp_path))
+        config["polling"]["lock_file"] = str(tmp_path / "poller.lock")
+        config["polling"]["adaptive"]["enabled"] = False
+        app = create_app(config)
+        fb = app.extensions["freebox"]
+        client = app.test_client()
+        client.set_cookie("jwt", generate_jwt("admin", config))
+        try:
+            fb.poller.run("calls")
+            fb.poller.run("downloads")
+            sim.generator.add_call(type="missed", name="Livreur")
+            sim.generator.add_download("tiny.iso", 1000)
+            time.sleep(0.01)
+            fb.poller.run("calls")
+            fb.poller.run("downloads")
+            assert [len(r["data"]["result"]) for r in fb.store.query("calls.log")] == [30, 1]
+            requests = sim.stats["requests"]
+            page = client.get('/api/calls?type=missed&per_page=5').get_json()
+            assert (page["total"], page["pages"], page["items"][0]["name"]) == (11, 3, "Livreur")
+            tiny = client.get('/api/downloads?name=tiny').get_json()["items"][0]
+            assert (tiny["status"], tiny["rx_pct"]) == ("seeding", 10000)
+            html = client.get('/category/calls?type=missed&page=2&per_page=5').data.decode()
+            assert "Page 2 / 3" in html and "?type=missed&per_page=5&page=3" in html
+            assert "debian-12.iso" in client.get('/category/downloads').data.decode()
+            # Pages servies sans appel à la Freebox
+            assert sim.stats["requests"] == requests
+            assert 'freebox_sync_items{list="calls"} 31' in client.get('/metrics').data.decode()
+        finally:
+            fb.store.close()
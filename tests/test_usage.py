@@ -0,0 +1,59 @@
+# tests/test_usage.py
+# Tests du débit dérivé des compteurs d'octets et des volumes jour / mois (freebox_usage.py)
+
+import sys, os
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from freebox_storage import TimeSeriesStore
+from freebox_usage import UsageTracker
+
+T0 = 1793490600  # 2026-10-31 23:50 UTC : fin de jour et de mois
+
+def status(bytes_down, bytes_up=0):
+    return {"success": True, "result": {"rate_down": 1, "rate_up": 1, "bytes_down": bytes_down, "bytes_up": bytes_up}}
+
+def feed(store, tracker, samples):
+    records = []
+    for ts, bytes_down in samples:
+        store.append("status", status(bytes_down, bytes_down // 10), ts=ts)
+        records.append(tracker.ingest("status", ts, status(bytes_down, bytes_down // 10)))
+    return records
+
+def test_average_rate_between_polls(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    tracker = UsageTracker(store)
+    records = feed(store, tracker, [(T0, 1000), (T0 + 30, 4000), (T0 + 90, 10000)])
+    assert records[0] is None
+    assert records[1]["result"] == {"rate_down": 100, "rate_up": 10, "bytes_down": 3000, "bytes_up": 300, "interval": 30}
+    assert records[2]["result"]["rate_down"] == 100
+    assert [r["ts"] for r in store.query("throughput")] == [T0 + 30, T0 + 90]
+    assert tracker.ingest("wifi", T0, {"result": {}}) is None
+
+def test_counter_reset_and_gap_are_skipped(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    tracker = UsageTracker(store, max_gap=300)
+    records = feed(store, tracker, [(T0, 5000), (T0 + 30, 200), (T0 + 60, 800), (T0 + 1000, 900)])
+    assert records[1] is None and records[3] is None
+    assert records[2]["result"]["bytes_down"] == 600
+    assert tracker.current()["day_down"] == 600
+
+def test_daily_and_monthly_totals_roll_over(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    tracker = UsageTracker(store)
+    # 23:50 -> 00:10 le lendemain, 1er novembre
+    feed(store, tracker, [(T0 + i * 300, i * 1000) for i in range(5)])
+    days = tracker.report("day")
+    assert [(d["period"], d["bytes_down"]) for d in days] == [("2026-10-31", 1000), ("2026-11-01", 3000)]
+    assert days[-1]["open"] is True
+    months = tracker.report("month")
+    assert [(m["period"], m["bytes_down"]) for m in months] == [("2026-10", 1000), ("2026-11", 3000)]
+
+def test_totals_survive_restart(tmp_path):
+    store = TimeSeriesStore(str(tmp_path))
+    feed(store, UsageTracker(store), [(T0, 0), (T0 + 30, 1000)])
+    # Nouveau processus : reprise des cumuls et du dernier compteur depuis le stockage
+    tracker = UsageTracker(store)
+    assert tracker.current()["day_down"] == 1000
+    record = feed(store, tracker, [(T0 + 60, 1500)])[0]
+    assert record["result"]["bytes_down"] == 500
+    assert tracker.current()["day_down"] == 1500
@@ -0,0 +1,61 @@
+# tests/test_writer.py
+# Tests de l'écriture groupée par série (freebox_writer.py)
+
+import sys, os, json, threading
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import pytest
+from freebox_storage import TimeSeriesStore, day_of
+from freebox_writer import BufferedStore
+
+T0 = 1766742802  # 2025-12-26
+
+def sample(i):
+    return {"success": True, "result": {"producer": i // 1000, "n": i % 1000}}
+
+def test_parallel_producers_group_commit(tmp_path):
+    store = BufferedStore(TimeSeriesStore(str(tmp_path), compact_series=()), flush_interval=0.05)
+    threads = [threading.Thread(target=lambda p=p: [store.append("lan_hosts", sample(p * 1000 + n), ts=T0)
+                                                     for n in range(250)]) for p in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    # La lecture attend l'écriture de la file
+    assert store.count("lan_hosts") == 2000
+    stats = store.stats
+    assert stats["records"] == 2000 and stats["commits"] < 2000 and stats["pending"] == 0
+    # Aucune ligne entrelacée ou partielle
+    path = store._segment("lan_hosts", day_of(T0)).data_path
+    with open(path, "rb") as f:
+        rows = [json.loads(line) for line in f]
+    for p in range(8):
+        assert [r["data"]["result"]["n"] for r in rows if r["data"]["result"]["producer"] == p] == list(range(250))
+    store.close()
+
+def test_close_flushes_pending_records(tmp_path):
+    store = BufferedStore(TimeSeriesStore(str(tmp_path)), flush_interval=60, fsync="batch")
+    for i in range(10):
+        store.append("status", sample(i), ts=T0 + i)
+    store.close()
+    reopened = TimeSeriesStore(str(tmp_path))
+    assert [r["ts"] for r in reopened.query("status")] == [T0 + i for i in range(10)]
+    assert store.stats["fsyncs"] >= 1
+    # Après close : écriture directe
+    store.append("status", sample(10), ts=T0 + 10)
+    assert reopened.count("status") == 11
+
+def test_reads_see_queued_records(tmp_path):
+    store = BufferedStore(TimeSeriesStore(str(tmp_path)), flush_interval=60)
+    store.append("wifi", {"result": {"enabled": True}}, ts=T0)
+    assert store.last("wifi")["data"] == {"result": {"enabled": True}}
+    assert store.has_series("wifi")
+    store.close()
+
+def test_invalid_policy_and_series(tmp_path):
+    with pytest.raises(ValueError):
+        BufferedStore(TimeSeriesStore(str(tmp_path)), fsync="always")
+    store = BufferedStore(TimeSeriesStore(str(tmp_path)))
+    with pytest.raises(ValueError):
+        store.append("../config", {})
+    store.close()